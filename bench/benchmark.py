@@ -0,0 +1,370 @@
+"""压测脚本：用多个并发的模拟操作员驱动 EmailService / AsyncEmailService / Gradio 事件处理函数
+
+上游为进程内启动的模拟 SiteGround API（见 mock_siteground.py），不会访问真实的 SiteGround。
+结束后按操作类型输出吞吐量与 p50/p95/p99 延迟，以及模拟服务器收到的上游请求数。
+
+示例:
+    python bench/benchmark.py --target handlers --operators 50 --duration 30
+    python bench/benchmark.py --target service --latency 0.3 --error-rate 0.05 --json result.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+import yaml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+from mock_siteground import add_arguments, start_mock_server, state_from_arguments  # noqa: E402
+from services.email_service import SORT_KEYS  # noqa: E402
+
+SITE_NAME = 'bench'
+SITE_ID = 'BENCH'
+
+# 模拟操作员的操作比例
+OPERATION_WEIGHTS = {
+    'list': 45,
+    'search': 15,
+    'page': 10,
+    'refresh': 5,
+    'report': 10,
+    'create': 8,
+    'delete': 7
+}
+
+
+class Recorder:
+    """收集每次操作的耗时与结果"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+
+    def record(self, operation: str, duration: float, ok: bool):
+        with self._lock:
+            self.samples.setdefault(operation, []).append(duration)
+            if not ok:
+                self.errors[operation] = self.errors.get(operation, 0) + 1
+
+    def summary(self, elapsed: float) -> Dict[str, Dict]:
+        result = {}
+        all_samples = []
+        for operation in sorted(self.samples):
+            samples = self.samples[operation]
+            all_samples.extend(samples)
+            result[operation] = self._stats(samples, self.errors.get(operation, 0), elapsed)
+        result['total'] = self._stats(all_samples, sum(self.errors.values()), elapsed)
+        return result
+
+    @staticmethod
+    def _stats(samples: List[float], errors: int, elapsed: float) -> Dict:
+        values = np.array(samples) * 1000 if samples else np.zeros(1)
+        p50, p95, p99 = np.percentile(values, [50, 95, 99]).tolist()
+        return {
+            'count': len(samples),
+            'errors': errors,
+            'throughput': len(samples) / elapsed if elapsed else 0.0,
+            'p50_ms': p50,
+            'p95_ms': p95,
+            'p99_ms': p99,
+            'max_ms': float(values.max())
+        }
+
+
+class Operator:
+    """一个模拟操作员的状态（自己创建、稍后删除的邮箱）"""
+
+    def __init__(self, index: int, seed: Optional[int]):
+        self.index = index
+        self.random = random.Random(None if seed is None else seed + index)
+        self.created: List[str] = []
+        self._counter = 0
+
+    def next_operation(self) -> str:
+        operation = self.random.choices(
+            list(OPERATION_WEIGHTS), weights=list(OPERATION_WEIGHTS.values())
+        )[0]
+        if operation == 'delete' and not self.created:
+            return 'create'
+        return operation
+
+    def new_username(self) -> str:
+        self._counter += 1
+        return f"b{self.index:03d}x{self._counter:06d}"
+
+    def view(self) -> Dict:
+        """随机的列表视图条件"""
+        return {
+            'page': self.random.randint(1, 5),
+            'page_size': 50,
+            'sort_by': self.random.choice([None] + list(SORT_KEYS)),
+            'descending': self.random.random() < 0.5
+        }
+
+    def search_term(self) -> str:
+        return f"user{self.random.randint(1, 999):03d}"
+
+
+class ServiceTarget:
+    """直接调用同步的 EmailService（每个操作员一个线程）"""
+
+    def __init__(self):
+        from services.email_service import EmailService
+        self.service = EmailService()
+
+    def run(self, operator: Operator, operation: str) -> bool:
+        service = self.service
+        if operation in ('list', 'page'):
+            service.query_email_addresses(**operator.view())
+        elif operation == 'search':
+            service.query_email_addresses(search=operator.search_term())
+        elif operation == 'refresh':
+            service.query_email_addresses(force_refresh=True)
+        elif operation == 'report':
+            service.get_usage_report()
+        elif operation == 'create':
+            created = service.create_email(operator.new_username(), 'bench123')
+            operator.created.append(str(created['id']))
+        elif operation == 'delete':
+            service.delete_email(operator.created.pop())
+        return True
+
+    def close(self):
+        self.service.close()
+
+
+class AsyncServiceTarget:
+    """调用 AsyncEmailService（所有操作员共享一个事件循环；创建与删除在线程中调用同步版本）"""
+
+    def __init__(self):
+        from services.async_email_service import AsyncEmailService
+        self.service = AsyncEmailService()
+
+    async def run(self, operator: Operator, operation: str) -> bool:
+        service = self.service
+        if operation in ('list', 'page'):
+            await service.query_email_addresses(**operator.view())
+        elif operation == 'search':
+            await service.query_email_addresses(search=operator.search_term())
+        elif operation == 'refresh':
+            await service.query_email_addresses(force_refresh=True)
+        elif operation == 'report':
+            await service.get_usage_report()
+        elif operation == 'create':
+            created = await asyncio.to_thread(service.service.create_email, operator.new_username(), 'bench123')
+            operator.created.append(str(created['id']))
+        elif operation == 'delete':
+            await asyncio.to_thread(service.service.delete_email, operator.created.pop())
+        return True
+
+    async def aclose(self):
+        await self.service.aclose()
+
+
+class HandlerTarget:
+    """调用 create_app() 中注册的 Gradio 事件处理函数，与浏览器触发的调用路径一致"""
+
+    def __init__(self):
+        from ui.app import create_app
+        self.demo = create_app()
+        self.fns = {fn.fn.__name__: fn.fn for fn in self.demo.fns.values()}
+
+    @staticmethod
+    async def final(updates):
+        """创建与删除处理函数以生成器流式输出任务进度，取任务结束后的最后一次输出"""
+        result = None
+        async for result in updates:
+            pass
+        return result
+
+    async def run(self, operator: Operator, operation: str) -> bool:
+        fns = self.fns
+        if operation in ('list', 'page'):
+            view = operator.view()
+            result = await fns['list_addresses'](
+                SITE_NAME, "", view['sort_by'], view['descending'], view['page'], view['page_size']
+            )
+            return not str(result[1]).startswith('⚠️')
+        if operation == 'search':
+            result = await fns['first_page'](SITE_NAME, operator.search_term(), None, False, 1, 50)
+            return not str(result[1]).startswith('⚠️')
+        if operation == 'refresh':
+            result = await fns['refresh_addresses'](SITE_NAME, "", None, False, 1, 50)
+            return not str(result[1]).startswith('⚠️')
+        if operation == 'report':
+            summary, _, _ = await fns['usage_report'](SITE_NAME, 10)
+            return not summary.startswith('获取用量分析失败')
+        if operation == 'create':
+            username = operator.new_username()
+            message, _ = await self.final(fns['add_address'](SITE_NAME, username, 'bench123'))
+            if message.startswith('邮件地址创建成功'):
+                operator.created.append(username)
+                return True
+            return False
+        if operation == 'delete':
+            # 与操作员的实际流程一致：先搜索到邮箱，再删除
+            username = operator.created.pop()
+            rows = (await fns['list_addresses'](SITE_NAME, username, None, False, 1, 50))[0]
+            if not isinstance(rows, list) or not rows:
+                return False
+            message, _, _ = await self.final(fns['bulk_delete_addresses'](SITE_NAME, [str(rows[0][0])]))
+            return message.startswith('成功删除 1 个')
+        return True
+
+    async def aclose(self):
+        pass
+
+
+def prepare_workdir(base_url: str, args) -> str:
+    """在临时目录中写入指向模拟服务器的配置与认证文件，并切换到该目录"""
+    with open(os.path.join(ROOT, 'config', 'config.yaml'), 'r', encoding='utf-8') as f:
+        config = yaml.safe_load(f) or {}
+
+    config['sites'] = [{
+        'name': SITE_NAME,
+        'site_id': SITE_ID,
+        'base_url': f"{base_url}/api-sgcp/v00",
+        'domain_id': 1,
+        'domain': args.domain
+    }]
+    token_config = config.setdefault('token', {})
+    token_config['client_token_url'] = f"{base_url}/v1/auth/client-token"
+    token_config['site_token_url'] = f"{base_url}/v1/auth/sites/{{site_id}}/token"
+    config.setdefault('store', {})['enabled'] = not args.no_store
+    config.setdefault('prefetch', {})['enabled'] = not args.no_prefetch
+    config.setdefault('metrics', {})['enabled'] = False
+
+    workdir = tempfile.mkdtemp(prefix='sg-bench-')
+    os.makedirs(os.path.join(workdir, 'config'))
+    with open(os.path.join(workdir, 'config', 'config.yaml'), 'w', encoding='utf-8') as f:
+        yaml.safe_dump(config, f, allow_unicode=True)
+    with open(os.path.join(workdir, 'config', 'auth.json'), 'w', encoding='utf-8') as f:
+        # 模拟服务器不认识的令牌：第一次请求会触发完整的令牌交换
+        json.dump({'api_token': 'bench-invalid-token', 'refresh_token': 'bench-refresh-token'}, f, indent=4)
+    os.chdir(workdir)
+    return workdir
+
+
+def run_threaded(target: ServiceTarget, operators: List[Operator], recorder: Recorder, args) -> float:
+    deadline = time.monotonic() + args.duration
+
+    def loop(operator: Operator):
+        while time.monotonic() < deadline:
+            operation = operator.next_operation()
+            start = time.perf_counter()
+            try:
+                ok = target.run(operator, operation)
+            except Exception:
+                ok = False
+            recorder.record(operation, time.perf_counter() - start, ok)
+            if args.think_time:
+                time.sleep(operator.random.uniform(0, 2 * args.think_time))
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=len(operators)) as pool:
+        list(pool.map(loop, operators))
+    return time.monotonic() - start
+
+
+async def run_async(target, operators: List[Operator], recorder: Recorder, args) -> float:
+    deadline = time.monotonic() + args.duration
+
+    async def loop(operator: Operator):
+        while time.monotonic() < deadline:
+            operation = operator.next_operation()
+            start = time.perf_counter()
+            try:
+                ok = await target.run(operator, operation)
+            except Exception:
+                ok = False
+            recorder.record(operation, time.perf_counter() - start, ok)
+            if args.think_time:
+                await asyncio.sleep(operator.random.uniform(0, 2 * args.think_time))
+
+    start = time.monotonic()
+    await asyncio.gather(*(loop(operator) for operator in operators))
+    return time.monotonic() - start
+
+
+def print_report(summary: Dict[str, Dict], upstream: Dict[str, int], args, elapsed: float):
+    print(f"\n目标: {args.target}，操作员: {args.operators}，时长: {elapsed:.1f} 秒，"
+          f"上游延迟: {args.latency}±{args.jitter} 秒")
+    header = f"{'操作':<10}{'次数':>8}{'失败':>8}{'吞吐(次/秒)':>14}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'max(ms)':>10}"
+    print(header)
+    print('-' * len(header))
+    for operation, stats in summary.items():
+        print(
+            f"{operation:<10}{stats['count']:>8}{stats['errors']:>8}{stats['throughput']:>14.1f}"
+            f"{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}{stats['max_ms']:>10.1f}"
+        )
+    print("\n模拟服务器收到的请求: " + "，".join(f"{k} {v}" for k, v in sorted(upstream.items())))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='邮件地址管理面板压测')
+    parser.add_argument('--target', choices=['service', 'async', 'handlers'], default='handlers',
+                        help='压测对象：同步服务 / 异步服务 / Gradio事件处理函数')
+    parser.add_argument('--operators', type=int, default=20, help='并发的模拟操作员数量')
+    parser.add_argument('--duration', type=float, default=20, help='压测时长（秒）')
+    parser.add_argument('--think-time', type=float, default=0.0, help='操作员两次操作之间的平均间隔（秒）')
+    parser.add_argument('--no-warmup', action='store_true', help='不预热（计入冷启动的令牌交换与首次拉取）')
+    parser.add_argument('--no-store', action='store_true', help='关闭本地索引')
+    parser.add_argument('--no-prefetch', action='store_true', help='关闭后台预取（仅影响 handlers）')
+    parser.add_argument('--json', help='将结果写入JSON文件，便于对比不同版本')
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    state = state_from_arguments(args)
+    server = start_mock_server(state)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    output_path = os.path.abspath(args.json) if args.json else None
+    prepare_workdir(base_url, args)
+
+    operators = [Operator(i, args.seed) for i in range(args.operators)]
+    recorder = Recorder()
+
+    if args.target == 'service':
+        target = ServiceTarget()
+        if not args.no_warmup:
+            target.run(operators[0], 'list')
+        elapsed = run_threaded(target, operators, recorder, args)
+        target.close()
+    else:
+        async def run() -> float:
+            target = AsyncServiceTarget() if args.target == 'async' else HandlerTarget()
+            if not args.no_warmup:
+                await target.run(operators[0], 'list')
+            try:
+                return await run_async(target, operators, recorder, args)
+            finally:
+                await target.aclose()
+        elapsed = asyncio.run(run())
+
+    server.shutdown()
+    summary = recorder.summary(elapsed)
+    print_report(summary, state.counters, args, elapsed)
+
+    if output_path:
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'target': args.target,
+                'operators': args.operators,
+                'duration': elapsed,
+                'upstream': state.counters,
+                'operations': summary
+            }, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
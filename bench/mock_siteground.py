@@ -0,0 +1,322 @@
+"""本地模拟的 SiteGround API（用于离线开发与压测）
+
+实现令牌交换（client_token -> site_token）以及 /email 的列表、创建、修改、删除接口，
+支持配置响应延迟、错误注入（5xx、429）和 site_token 的有效期。
+
+单独运行:
+    python bench/mock_siteground.py --port 8081 --latency 0.2 --error-rate 0.05
+
+然后在 config.yaml 中将站点的 base_url 与 token 的两个接口地址指向该服务器，例如:
+    base_url: "http://127.0.0.1:8081/api-sgcp/v00"
+    client_token_url: "http://127.0.0.1:8081/v1/auth/client-token"
+    site_token_url: "http://127.0.0.1:8081/v1/auth/sites/{site_id}/token"
+"""
+import argparse
+import json
+import random
+import re
+import secrets
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlparse
+
+SITE_TOKEN_PATH = re.compile(r'^/v1/auth/sites/(?P<site_id>[^/]+)/token$')
+EMAIL_PATH = re.compile(r'^.*/email(?:/(?P<id>\d+))?$')
+
+
+class MockSiteGround:
+    """模拟服务器的状态与行为参数"""
+
+    def __init__(
+        self,
+        mailboxes: int = 500,
+        domain: str = 'example.jp',
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        token_ttl: float = 3600,
+        seed: Optional[int] = None
+    ):
+        self.domain = domain
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.token_ttl = token_ttl
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._next_id = 1
+        self.mailboxes: Dict[int, dict] = {}
+        self.client_tokens = set()
+        # site_token -> 过期时间
+        self.site_tokens: Dict[str, float] = {}
+        # 各类请求的计数，便于压测结束后核对
+        self.counters: Dict[str, int] = {}
+        for i in range(mailboxes):
+            self._add_mailbox(f"user{i + 1:05d}")
+
+    def _add_mailbox(self, name: str) -> dict:
+        mailbox_id = self._next_id
+        self._next_id += 1
+        record = {
+            'id': mailbox_id,
+            'name': name,
+            'domain_name': self.domain,
+            'n_emails': self._random.randint(0, 5000),
+            'used_size': self._random.randint(0, 2 << 30),
+            'suspended': int(self._random.random() < 0.05)
+        }
+        self.mailboxes[mailbox_id] = record
+        return record
+
+    def count(self, key: str):
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + 1
+
+    def delay(self):
+        """模拟上游响应时间"""
+        with self._lock:
+            delay = self.latency + self._random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+    def injected_failure(self) -> Optional[int]:
+        """按配置的比例返回需要注入的HTTP状态码（429 或 503）"""
+        with self._lock:
+            roll = self._random.random()
+        if roll < self.rate_limit_rate:
+            return 429
+        if roll < self.rate_limit_rate + self.error_rate:
+            return 503
+        return None
+
+    def issue_client_token(self) -> str:
+        token = secrets.token_hex(16)
+        with self._lock:
+            self.client_tokens.add(token)
+        return token
+
+    def issue_site_token(self, client_token: str) -> Optional[str]:
+        with self._lock:
+            if client_token not in self.client_tokens:
+                return None
+            self.client_tokens.discard(client_token)
+            token = secrets.token_hex(24)
+            self.site_tokens[token] = time.time() + self.token_ttl
+            return token
+
+    def check_token(self, authorization: str) -> Optional[dict]:
+        """校验 Bearer 令牌，失败时返回与 SiteGround 一致的错误响应体"""
+        token = authorization[len('Bearer '):] if authorization.startswith('Bearer ') else ''
+        if not token:
+            return {'status': 401, 'message': 'No authorization'}
+        with self._lock:
+            expires_at = self.site_tokens.get(token)
+        if expires_at is None:
+            return {'status': 401, 'message': 'Can not verify token'}
+        if time.time() >= expires_at:
+            return {'status': 403, 'message': 'Token is expired'}
+        return None
+
+    def list_mailboxes(self) -> list:
+        with self._lock:
+            return [dict(record) for record in self.mailboxes.values()]
+
+    def create_mailbox(self, name: str) -> Optional[dict]:
+        with self._lock:
+            if any(record['name'] == name for record in self.mailboxes.values()):
+                return None
+            return dict(self._add_mailbox(name), n_emails=0, used_size=0, suspended=0)
+
+    def update_mailbox(self, mailbox_id: int, changes: dict) -> Optional[dict]:
+        with self._lock:
+            record = self.mailboxes.get(mailbox_id)
+            if record is None:
+                return None
+            if 'suspended' in changes:
+                record['suspended'] = int(bool(changes['suspended']))
+            return dict(record)
+
+    def delete_mailbox(self, mailbox_id: int) -> bool:
+        with self._lock:
+            return self.mailboxes.pop(mailbox_id, None) is not None
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # 保持长连接，与真实上游的连接复用行为一致
+    protocol_version = 'HTTP/1.1'
+    state: MockSiteGround = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, http_status: int, body: dict, headers: Optional[dict] = None):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(http_status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _body(self) -> dict:
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        try:
+            return json.loads(self.rfile.read(length))
+        except json.JSONDecodeError:
+            return {}
+
+    def _handle(self, method: str):
+        state = self.state
+        url = urlparse(self.path)
+        body = self._body() if method in ('POST', 'PUT') else {}
+        state.delay()
+
+        failure = state.injected_failure()
+        if failure == 429:
+            state.count('rate_limited')
+            self._reply(429, {'status': 429, 'message': 'Too many requests'}, {'Retry-After': '1'})
+            return
+        if failure is not None:
+            state.count('errors')
+            self._reply(failure, {'status': failure, 'message': 'Service unavailable'})
+            return
+
+        # 令牌交换
+        if method == 'POST' and url.path == '/v1/auth/client-token':
+            state.count('client_token')
+            if not body.get('refresh_token'):
+                self._reply(200, {'status': 401, 'message': 'Invalid refresh token'})
+                return
+            self._reply(200, {'status': 200, 'data': {'client_token': state.issue_client_token()}})
+            return
+        if method == 'GET' and SITE_TOKEN_PATH.match(url.path):
+            state.count('site_token')
+            client_token = (parse_qs(url.query).get('_client_token') or [''])[0]
+            site_token = state.issue_site_token(client_token)
+            if site_token is None:
+                self._reply(200, {'status': 401, 'message': 'Invalid client token'})
+                return
+            self._reply(200, {'status': 200, 'data': {'site_token': site_token}})
+            return
+
+        match = EMAIL_PATH.match(url.path)
+        if match is None:
+            self._reply(404, {'status': 404, 'message': 'Not found'})
+            return
+
+        error = state.check_token(self.headers.get('Authorization', ''))
+        if error is not None:
+            state.count('unauthorized')
+            self._reply(200, error)
+            return
+
+        mailbox_id = match.group('id')
+        if method == 'GET' and mailbox_id is None:
+            state.count('list')
+            self._reply(200, {'status': 200, 'data': state.list_mailboxes()})
+        elif method == 'POST' and mailbox_id is None:
+            state.count('create')
+            name = str(body.get('name') or '').strip()
+            if not name or not body.get('password'):
+                self._reply(200, {'status': 400, 'message': 'name and password are required'})
+                return
+            created = state.create_mailbox(name)
+            if created is None:
+                self._reply(200, {'status': 409, 'message': 'Email account already exists'})
+                return
+            self._reply(200, {'status': 200, 'data': created})
+        elif method == 'PUT' and mailbox_id is not None:
+            state.count('update')
+            if 'password' in body and not body['password']:
+                self._reply(200, {'status': 400, 'message': 'password is required'})
+                return
+            updated = state.update_mailbox(int(mailbox_id), body)
+            if updated is None:
+                self._reply(200, {'status': 404, 'message': 'Email account not found'})
+                return
+            self._reply(200, {'status': 200, 'data': updated})
+        elif method == 'DELETE' and mailbox_id is not None:
+            state.count('delete')
+            if not state.delete_mailbox(int(mailbox_id)):
+                self._reply(200, {'status': 404, 'message': 'Email account not found'})
+                return
+            self._reply(200, {'status': 200, 'data': {}})
+        else:
+            self._reply(405, {'status': 405, 'message': 'Method not allowed'})
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_PUT(self):
+        self._handle('PUT')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+
+def start_mock_server(
+    state: MockSiteGround,
+    port: int = 0,
+    host: str = '127.0.0.1'
+) -> ThreadingHTTPServer:
+    """在后台线程中启动模拟服务器（port 为 0 时自动分配端口）"""
+    handler = type('MockHandler', (_Handler,), {'state': state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="mock-siteground", daemon=True)
+    thread.start()
+    return server
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    """模拟服务器的命令行参数（压测脚本复用）"""
+    parser.add_argument('--mailboxes', type=int, default=500, help='初始邮箱数量')
+    parser.add_argument('--domain', default='example.jp', help='邮箱域名')
+    parser.add_argument('--latency', type=float, default=0.05, help='平均响应延迟（秒）')
+    parser.add_argument('--jitter', type=float, default=0.02, help='延迟的随机波动范围（秒）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='返回 503 的请求比例')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='返回 429 的请求比例')
+    parser.add_argument('--token-ttl', type=float, default=3600, help='site_token 的有效期（秒）')
+    parser.add_argument('--seed', type=int, default=None, help='随机数种子')
+
+
+def state_from_arguments(args) -> MockSiteGround:
+    return MockSiteGround(
+        mailboxes=args.mailboxes,
+        domain=args.domain,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        token_ttl=args.token_ttl,
+        seed=args.seed
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地模拟的 SiteGround API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    server = start_mock_server(state_from_arguments(args), args.port, args.host)
+    print(f"模拟 SiteGround API 已启动: http://{args.host}:{server.server_address[1]}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
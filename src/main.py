@@ -1,16 +1,63 @@
+import argparse
+import multiprocessing
+
 from ui.app import create_app
-import json
+from services.config_store import get_config_store
+from services.metrics import start_metrics_server
+from services.shared_state import open_shared_state
+from services.structured_logging import setup_logging
 
-def main():
-    app = create_app()
+def serve(worker_index: int = 0, workers: int = 1):
+    """启动一个工作进程（多进程部署时第 N 个进程监听 port + N，指标端口同样依次加 N）"""
+    # 配置与凭据只解析一次，之后由后台线程监视文件变化并热加载
+    config_store = get_config_store()
+    # 结构化日志：请求线程只写入内存队列，由后台线程输出JSON
+    setup_logging(config_store.config.get('logging'))
+    config_store.start_watching()
+    # 多个工作进程时令牌、邮箱列表与任务通过共享状态协调，避免重复访问上游
+    shared_state = open_shared_state(config_store.config.get('shared_state'), workers)
+    app = create_app(shared_state)
     # read username and password from config/auth.json
     # 从auth.json读取认证信息
-    with open('config/auth.json', 'r', encoding='utf-8') as f:
-        auth_config = json.load(f)
-        username = auth_config['ui_auth'].get('username', 'admin')
-        password = auth_config['ui_auth'].get('password', 'admin')
-    
-    app.launch(server_name="0.0.0.0", server_port=7860, auth=(username, password))
+    ui_auth = config_store.auth.get('ui_auth') or {}
+    username = ui_auth.get('username', 'admin')
+    password = ui_auth.get('password', 'admin')
+
+    # 在独立端口上提供 Prometheus 指标（/metrics）
+    metrics_config = config_store.config.get('metrics') or {}
+    if metrics_config.get('enabled', True):
+        start_metrics_server(port=metrics_config.get('port', 9100) + worker_index)
+
+    deployment_config = config_store.config.get('deployment') or {}
+    port = deployment_config.get('port', 7860) + worker_index
+    app.launch(server_name="0.0.0.0", server_port=port, auth=(username, password))
+
+def main():
+    parser = argparse.ArgumentParser(description='SiteGround 邮箱管理面板')
+    parser.add_argument('--workers', type=int, default=None, help='工作进程数（默认读取 deployment.workers）')
+    args = parser.parse_args()
+
+    workers = args.workers or (get_config_store().config.get('deployment') or {}).get('workers', 1)
+    if workers <= 1:
+        serve()
+        return
+
+    # 每个工作进程独立运行一个界面（前面需要按会话固定转发的负载均衡，见 README）
+    context = multiprocessing.get_context('spawn')
+    processes = [
+        context.Process(target=serve, args=(index, workers), name=f"worker-{index}")
+        for index in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
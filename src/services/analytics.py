@@ -0,0 +1,106 @@
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# 用量直方图的区间边界（字节）
+SIZE_BUCKETS = [0, 1 << 20, 10 << 20, 100 << 20, 1 << 30, 5 << 30, np.inf]
+SIZE_BUCKET_LABELS = ['<1MB', '1-10MB', '10-100MB', '100MB-1GB', '1-5GB', '>5GB']
+
+# 汇总中报告的用量百分位
+PERCENTILES = [50, 90, 95, 99]
+
+
+class MailboxFrame:
+    """邮箱记录的列式表示（NumPy数组），所有统计均在数组上向量化计算"""
+
+    def __init__(self, records: List[dict]):
+        count = len(records)
+        self.ids = np.fromiter((record['id'] for record in records), dtype=np.int64, count=count)
+        self.used_size = np.fromiter(
+            (record.get('used_size') or 0 for record in records), dtype=np.int64, count=count
+        )
+        self.n_emails = np.fromiter(
+            (record.get('n_emails') or 0 for record in records), dtype=np.int64, count=count
+        )
+        self.suspended = np.fromiter(
+            (bool(record.get('suspended')) for record in records), dtype=bool, count=count
+        )
+        self.addresses = np.array(
+            [f"{record['name']}@{record['domain_name']}" for record in records], dtype=object
+        )
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def summary(self) -> Dict:
+        """总量、均值、百分位与停用数量"""
+        if len(self) == 0:
+            return {
+                'count': 0,
+                'suspended': 0,
+                'total_size': 0,
+                'total_emails': 0,
+                'mean_size': 0.0,
+                'percentiles': {p: 0.0 for p in PERCENTILES}
+            }
+        values = np.percentile(self.used_size, PERCENTILES)
+        return {
+            'count': len(self),
+            'suspended': int(np.count_nonzero(self.suspended)),
+            'total_size': int(self.used_size.sum()),
+            'total_emails': int(self.n_emails.sum()),
+            'mean_size': float(self.used_size.mean()),
+            'percentiles': dict(zip(PERCENTILES, values.tolist()))
+        }
+
+    def top_n(self, n: int) -> List[Dict]:
+        """已用空间最大的 n 个邮箱（argpartition 选取后只对前 n 个排序）"""
+        n = min(max(int(n), 0), len(self))
+        if n == 0:
+            return []
+        candidates = np.argpartition(self.used_size, -n)[-n:]
+        order = candidates[np.argsort(self.used_size[candidates])[::-1]]
+        return [
+            {
+                'id': int(self.ids[i]),
+                'email': self.addresses[i],
+                'n_emails': int(self.n_emails[i]),
+                'used_size': int(self.used_size[i]),
+                'suspended': bool(self.suspended[i])
+            }
+            for i in order
+        ]
+
+    def size_histogram(self) -> List[Dict]:
+        """按用量区间统计邮箱数量"""
+        counts, _ = np.histogram(self.used_size, bins=SIZE_BUCKETS)
+        return [
+            {'bucket': label, 'count': int(count)}
+            for label, count in zip(SIZE_BUCKET_LABELS, counts)
+        ]
+
+
+class MailboxAnalytics:
+    """基于缓存内容的用量分析，缓存版本不变时复用已构建的列式数据"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._frame: Optional[MailboxFrame] = None
+        self._version = None
+
+    def frame(self, records: List[dict], version: int) -> MailboxFrame:
+        with self._lock:
+            if self._frame is None or self._version != version:
+                self._frame = MailboxFrame(records)
+                self._version = version
+            return self._frame
+
+    def report(self, records: List[dict], version: int, top_n: int = 10) -> Dict:
+        """生成分析报告：汇总、Top N 与用量分布"""
+        frame = self.frame(records, version)
+        return {
+            'summary': frame.summary(),
+            'top': frame.top_n(top_n),
+            'histogram': frame.size_histogram()
+        }
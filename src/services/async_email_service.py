@@ -0,0 +1,164 @@
+import asyncio
+import functools
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from services.metrics import endpoint_label, observe_upstream
+from services.resilience import RetryableError
+from services.email_service import EmailService
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncEmailService:
+    """EmailService 的异步版本（基于 httpx.AsyncClient）
+
+    与同步版本共享配置、令牌状态和邮箱缓存，供 Gradio 的 async 事件处理函数使用，
+    上游响应慢时不会占用 Gradio 的工作线程。
+    只提供列表查询与用量分析；创建、删除等写操作由 JobManager 在工作线程中调用同步版本执行。
+    """
+
+    def __init__(self, service: Optional[EmailService] = None):
+        self.service = service or EmailService()
+
+        api_config = self.service.config.get('api') or {}
+        connect_timeout, read_timeout = self.service.timeout
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(
+                max_connections=api_config.get('pool_maxsize', 20),
+                max_keepalive_connections=api_config.get('pool_maxsize', 20)
+            )
+        )
+        self._background_refresh: Optional[asyncio.Task] = None
+
+    async def aclose(self):
+        """关闭连接池"""
+        await self.client.aclose()
+
+    def generate_simple_password(self) -> str:
+        """生成简单的6位随机密码（字母数字组合）"""
+        return self.service.generate_simple_password()
+
+    def parse_bulk_input(self, text: str) -> List[Tuple[str, Optional[str]]]:
+        """解析批量创建输入"""
+        return self.service.parse_bulk_input(text)
+
+    async def refresh_token(self, seen_version: Optional[int] = None) -> bool:
+        """刷新API令牌（在线程中执行同步版本）
+
+        版本检查、_token_lock 与失败冷却只在同步版本中实现一次，与预取、任务线程中的刷新
+        互斥，保证同一时刻只有一个令牌交换；等待该锁也不会阻塞事件循环。
+        """
+        if seen_version is None:
+            seen_version = self.service._token_version
+        return await asyncio.to_thread(self.service.refresh_token, seen_version)
+
+    async def _request(self, method: str, url: str, endpoint: str, **kwargs) -> httpx.Response:
+        """发送请求并记录耗时与状态码"""
+        start = time.perf_counter()
+        status = 'error'
+        try:
+            response = await self.client.request(method, url, **kwargs)
+            status = response.status_code
+            return response
+        finally:
+            observe_upstream(method, endpoint, status, time.perf_counter() - start)
+
+    def _refresh_token_in_background(self):
+        """令牌即将过期时在后台任务中提前刷新"""
+        if self.service._token_lock.locked():
+            return
+        if self._background_refresh is not None and not self._background_refresh.done():
+            return
+        self._background_refresh = asyncio.create_task(self.refresh_token())
+
+    async def _send(self, method: str, url: str, endpoint: str, idempotent: bool, **kwargs) -> dict:
+        """发送一次请求并解析响应（不含重试），可重试的失败抛出 RetryableError"""
+        try:
+            response = await self._request(method, url, endpoint, **kwargs)
+        except httpx.TimeoutException as e:
+            if idempotent or isinstance(e, httpx.ConnectTimeout):
+                raise RetryableError(f"请求超时: {str(e)}")
+            raise
+        except httpx.TransportError as e:
+            # 只有建立连接失败时请求一定未发出；读取阶段的错误对非幂等请求不重试
+            if idempotent or isinstance(e, httpx.ConnectError):
+                raise RetryableError(f"连接失败: {str(e)}")
+            raise
+        return self.service._parse_response(response, idempotent)
+
+    async def _call_api(self, method: str, path: str, **kwargs) -> dict:
+        """调用SiteGround API并返回解析后的响应
+
+        请求经由统一执行器发送（限流/5xx退避重试，接口熔断）；令牌失效时刷新后重试一次。
+        """
+        service = self.service
+        if service.token_age() > service.token_refresh_after:
+            self._refresh_token_in_background()
+
+        endpoint = endpoint_label(path)
+        for attempt in range(2):
+            token_version = service._token_version
+            response_data = await service.executor.execute_async(
+                f"{method} {endpoint}",
+                lambda: self._send(
+                    method,
+                    f"{service.base_url}{path}",
+                    endpoint,
+                    idempotent=method != 'POST',
+                    headers=dict(service.headers),
+                    **kwargs
+                )
+            )
+
+            if attempt == 0 and service._check_token_expired(response_data):
+                logger.info("令牌已过期或无效，尝试刷新", extra={'site': service.site_name})
+                if not await self.refresh_token(seen_version=token_version):
+                    raise Exception("令牌刷新失败")
+                continue
+
+            return response_data
+
+    async def list_email_addresses(self, force_refresh: bool = False) -> List[List]:
+        """获取邮件地址列表（上游不可用时返回过期缓存，无任何数据时抛出异常）"""
+        records = await self.service.cache.aget(self._loader(force_refresh), force=force_refresh)
+        return [self.service._to_row(email) for email in records]
+
+    async def query_email_addresses(
+        self,
+        page: int = 1,
+        page_size: int = 50,
+        sort_by: Optional[str] = None,
+        descending: bool = False,
+        search: Optional[str] = None,
+        force_refresh: bool = False
+    ) -> Tuple[List[List], int, int]:
+        """分页查询邮件地址列表，返回 (当前页表格行, 匹配总数, 实际页码)"""
+        records = await self.service.cache.aget(self._loader(force_refresh), force=force_refresh)
+        return self.service._query_records(records, page, page_size, sort_by, descending, search)
+
+    async def get_usage_report(self, top_n: int = 10, force_refresh: bool = False) -> Dict:
+        """邮箱用量分析报告"""
+        records = await self.service.cache.aget(self._loader(force_refresh), force=force_refresh)
+        snapshot, version = self.service.cache.snapshot()
+        return self.service.analytics.report(records if snapshot is None else snapshot, version, top_n)
+
+    def _loader(self, force: bool = False) -> Callable[[], Awaitable[List[dict]]]:
+        """缓存未命中时的拉取函数（多进程部署时优先复用其他工作进程刚拉取的列表）"""
+        shared = self.service.shared
+        if shared is None:
+            return self._fetch_email_records
+        max_age = shared.fill_window if force else self.service.cache.ttl
+        return functools.partial(shared.aload, self._fetch_email_records, max_age)
+
+    async def _fetch_email_records(self) -> List[dict]:
+        response_data = await self._call_api('GET', '/email')
+
+        if response_data['status'] != 200:
+            raise Exception(f"API错误: {response_data.get('message', '未知错误')}")
+
+        return response_data['data']
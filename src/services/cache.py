@@ -0,0 +1,266 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from services.metrics import CACHE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+
+class _Flight:
+    """一次正在进行中的上游拉取"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Optional[List[dict]] = None
+        self.error: Optional[BaseException] = None
+        self.patches: List[Callable[[List[dict]], None]] = []
+        self.future: Optional[asyncio.Future] = None
+
+
+class MailboxCache:
+    """邮箱列表缓存（TTL过期 + 单飞合并 + 写穿透修补）
+
+    - 缓存未过期时直接返回内存中的记录
+    - 多个并发请求同时未命中时，只有一个线程访问上游，其余线程等待其结果
+    - 新增/删除成功后直接修补缓存，不需要重新拉取整个列表
+    - 订阅者（如本地索引）会收到每次全量快照以及逐条的新增/删除通知
+    - 拉取失败（上游故障、熔断中）时返回最近一次的数据，并通过 last_error 标记为过期
+    - 设置 revalidator 后，过期不超过 stale_ttl 秒的数据直接返回，同时调用 revalidator
+      请求后台重新拉取（stale-while-revalidate）
+    """
+
+    def __init__(self, ttl: float = 60, stale_ttl: float = 0):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        # 后台重新拉取的触发函数（由预取调度器设置），未设置时过期即同步拉取
+        self.revalidator: Optional[Callable[[], None]] = None
+        self._lock = threading.Lock()
+        self._records: Optional[List[dict]] = None
+        self._fetched_at = 0.0
+        self._inflight: Optional[_Flight] = None
+        self._async_inflight: Optional[_Flight] = None
+        self._listeners: List = []
+        # 每次缓存内容变化时递增，供派生数据（如统计分析）判断是否需要重建
+        self.version = 0
+        # 最近一次拉取失败的原因；非 None 时表示当前数据可能已过期
+        self.last_error: Optional[BaseException] = None
+
+    def subscribe(self, listener):
+        """注册变更订阅者
+
+        订阅者需实现 on_snapshot(records)、on_upsert(record)、on_remove(record_id)
+        """
+        self._listeners.append(listener)
+
+    def _notify(self, event: str, *args):
+        for listener in self._listeners:
+            try:
+                getattr(listener, event)(*args)
+            except Exception as e:
+                logger.exception("缓存订阅者处理 %s 失败: %s", event, e)
+
+    def peek(self) -> Optional[List[dict]]:
+        """读取当前缓存的记录（不论是否过期，不触发拉取）"""
+        with self._lock:
+            return None if self._records is None else list(self._records)
+
+    def snapshot(self) -> Tuple[Optional[List[dict]], int]:
+        """在同一把锁内读取当前缓存的记录及其版本号，供按版本复用的派生数据使用"""
+        with self._lock:
+            return (None if self._records is None else list(self._records)), self.version
+
+    def seed(self, records: List[dict], fetched_at: Optional[float] = None):
+        """用已有数据（如本地索引）预热缓存，不通知订阅者
+
+        fetched_at 为数据最初拉取时的时间戳（time.time()），缓存年龄按其回推，
+        很久以前保存的数据不会被当作刚拉取的数据；未知时视为已过期，首次读取即重新拉取。
+        """
+        age = time.time() - fetched_at if fetched_at else float('inf')
+        with self._lock:
+            if self._records is None:
+                self._records = list(records)
+                self._fetched_at = time.monotonic() - max(0.0, age)
+                self.version += 1
+
+    def _lookup(self, force: bool) -> Tuple[Optional[List[dict]], bool]:
+        """查找可直接返回的数据（需持有锁），返回 (记录, 是否需要后台重新拉取)"""
+        if force or self._records is None:
+            return None, False
+        age = time.monotonic() - self._fetched_at
+        if age < self.ttl:
+            CACHE_REQUESTS.inc(result='hit')
+            return list(self._records), False
+        if self.revalidator is not None and age < self.ttl + self.stale_ttl:
+            CACHE_REQUESTS.inc(result='revalidate')
+            return list(self._records), True
+        return None, False
+
+    def _revalidate(self):
+        try:
+            self.revalidator()
+        except Exception as e:
+            logger.warning("触发后台刷新失败: %s", e)
+
+    def get(self, loader: Callable[[], List[dict]], force: bool = False) -> List[dict]:
+        """读取缓存，未命中或强制刷新时通过 loader 拉取上游数据"""
+        with self._lock:
+            records, revalidate = self._lookup(force)
+            if records is None:
+                flight = self._inflight
+                leader = flight is None
+                if leader:
+                    flight = self._inflight = _Flight()
+                CACHE_REQUESTS.inc(result='miss' if leader else 'coalesced')
+
+        if records is not None:
+            if revalidate:
+                self._revalidate()
+            return records
+
+        if not leader:
+            # 等待正在进行的拉取完成，共享其结果
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return list(flight.result)
+
+        try:
+            records = list(loader())
+            self._store(flight, records)
+            return list(records)
+        except Exception as e:
+            stale = self._fallback(e)
+            if stale is None:
+                flight.error = e
+                raise
+            flight.result = stale
+            return list(stale)
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight = None
+            flight.event.set()
+
+    async def aget(self, loader: Callable[[], Awaitable[List[dict]]], force: bool = False) -> List[dict]:
+        """get 的异步版本，loader 为返回记录列表的协程函数"""
+        with self._lock:
+            records, revalidate = self._lookup(force)
+            if records is None:
+                flight = self._async_inflight
+                leader = flight is None
+                if leader:
+                    flight = self._async_inflight = _Flight()
+                    flight.future = asyncio.get_running_loop().create_future()
+                CACHE_REQUESTS.inc(result='miss' if leader else 'coalesced')
+
+        if records is not None:
+            if revalidate:
+                self._revalidate()
+            return records
+
+        if not leader:
+            return list(await asyncio.shield(flight.future))
+
+        try:
+            records = list(await loader())
+            self._store(flight, records)
+            flight.future.set_result(records)
+            return list(records)
+        except Exception as e:
+            stale = self._fallback(e)
+            if stale is None:
+                flight.future.set_exception(e)
+                # 没有等待者时避免 "exception was never retrieved" 警告
+                flight.future.exception()
+                raise
+            flight.future.set_result(stale)
+            return list(stale)
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                flight.future.cancel()
+            else:
+                flight.future.set_exception(e)
+                # 没有等待者时避免 "exception was never retrieved" 警告
+                flight.future.exception()
+            raise
+        finally:
+            with self._lock:
+                self._async_inflight = None
+
+    def _fallback(self, error: Exception) -> Optional[List[dict]]:
+        """拉取失败时返回过期数据（没有任何数据时返回 None）"""
+        with self._lock:
+            self.last_error = error
+            if self._records is None:
+                return None
+            CACHE_REQUESTS.inc(result='stale')
+            logger.warning("拉取邮件列表失败，使用缓存数据: %s", error)
+            return list(self._records)
+
+    @property
+    def is_stale(self) -> bool:
+        """当前数据是否因最近一次拉取失败而可能过期"""
+        return self.last_error is not None
+
+    def _store(self, flight: _Flight, records: List[dict]):
+        with self._lock:
+            self.last_error = None
+            # 拉取期间发生的新增/删除需要重新应用到新快照上
+            for patch in flight.patches:
+                patch(records)
+            self._records = records
+            self._fetched_at = time.monotonic()
+            self.version += 1
+            flight.result = records
+            snapshot = list(records)
+        self._notify('on_snapshot', snapshot)
+
+    def put(self, records: List[dict]):
+        """用外部获取的全量快照（如其他工作进程发布的列表）替换缓存，并通知订阅者"""
+        with self._lock:
+            self.last_error = None
+            self._records = list(records)
+            self._fetched_at = time.monotonic()
+            self.version += 1
+            snapshot = list(records)
+        self._notify('on_snapshot', snapshot)
+
+    def _patch(self, patch: Callable[[List[dict]], None]):
+        with self._lock:
+            if self._records is not None:
+                patch(self._records)
+                self.version += 1
+            for flight in (self._inflight, self._async_inflight):
+                if flight is not None:
+                    flight.patches.append(patch)
+
+    def upsert(self, record: dict):
+        """新增或替换一条记录"""
+        def patch(records: List[dict]):
+            key = str(record.get('id'))
+            for i, item in enumerate(records):
+                if str(item.get('id')) == key:
+                    records[i] = record
+                    return
+            records.append(record)
+        self._patch(patch)
+        self._notify('on_upsert', record)
+
+    def remove(self, record_id):
+        """按ID移除一条记录"""
+        key = str(record_id)
+
+        def patch(records: List[dict]):
+            records[:] = [item for item in records if str(item.get('id')) != key]
+        self._patch(patch)
+        self._notify('on_remove', record_id)
+
+    def invalidate(self):
+        """使缓存失效，下次读取时重新拉取"""
+        with self._lock:
+            self._fetched_at = 0.0
@@ -0,0 +1,197 @@
+import copy
+import json
+import logging
+import os
+import stat
+import tempfile
+import threading
+from typing import Callable, Dict, List, Optional, Sequence
+
+import yaml
+
+logger = logging.getLogger(__name__)
+
+
+def _merge(target: dict, updates: dict):
+    """将 updates 递归合并到 target（嵌套字典逐层合并，其他值直接覆盖）"""
+    for key, value in updates.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            _merge(target[key], value)
+        else:
+            target[key] = copy.deepcopy(value)
+
+
+class _WatchedFile:
+    """一个被监视的配置文件及其当前内容"""
+
+    def __init__(self, path: str, parse: Callable, dump: Optional[Callable] = None):
+        self.path = path
+        self.parse = parse
+        self.dump = dump
+        self.data: dict = {}
+        self.mtime: Optional[float] = None
+
+    def stat_mtime(self) -> Optional[float]:
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def read(self):
+        mtime = self.stat_mtime()
+        with open(self.path, 'r', encoding='utf-8') as f:
+            self.data = self.parse(f) or {}
+        self.mtime = mtime
+
+
+class ConfigStore:
+    """配置（config.yaml）与凭据（auth.json）的统一存储
+
+    - 启动时解析一次，之后所有读取都来自内存，请求路径上没有磁盘读取
+    - 后台线程按间隔检查文件修改时间，文件被外部修改时重新加载并通知订阅者
+    - 写入 auth.json 时在锁内将更新合并到最新内容，通过临时文件 + 原子替换写回，
+      不会丢失其他字段，也不会留下写了一半的文件
+    - 读取方拿到的是不可变快照：每次更新都生成新的字典再替换引用
+    """
+
+    def __init__(self, config_dir: str = 'config'):
+        self.config_dir = config_dir
+        self._lock = threading.RLock()
+        self._listeners: List = []
+        self._watcher: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._config = _WatchedFile(os.path.join(config_dir, 'config.yaml'), yaml.safe_load)
+        self._auth = _WatchedFile(
+            os.path.join(config_dir, 'auth.json'),
+            json.load,
+            lambda data, f: json.dump(data, f, indent=4, ensure_ascii=False)
+        )
+        self._config.read()
+        try:
+            self._auth.read()
+        except FileNotFoundError:
+            raise Exception("认证配置文件不存在，请确保 config/auth.json 文件存在")
+        except json.JSONDecodeError:
+            raise Exception("认证配置文件格式错误，请确保是有效的JSON格式")
+
+    @property
+    def config(self) -> dict:
+        """config.yaml 的当前内容（只读）"""
+        return self._config.data
+
+    @property
+    def auth(self) -> dict:
+        """auth.json 的当前内容（只读）"""
+        return self._auth.data
+
+    @property
+    def auth_path(self) -> str:
+        return self._auth.path
+
+    def subscribe(self, listener):
+        """注册重新加载的订阅者
+
+        订阅者可实现 on_config_reload(config) 与 on_auth_reload(auth)，
+        仅在文件被外部修改时调用，本存储自身的写入不会触发通知。
+        """
+        self._listeners.append(listener)
+
+    def _notify(self, event: str, data: dict):
+        for listener in self._listeners:
+            handler = getattr(listener, event, None)
+            if handler is None:
+                continue
+            try:
+                handler(data)
+            except Exception as e:
+                logger.exception("配置订阅者处理 %s 失败: %s", event, e)
+
+    def update_auth(self, updates: dict, path: Sequence[str] = ()):
+        """将 updates 合并到 auth.json 中 path 指定的位置并原子写回
+
+        例如 update_auth({'api_token': 'x'}, ('sites', 'shop')) 只修改 sites.shop.api_token。
+        """
+        for key in reversed(path):
+            updates = {key: updates}
+        with self._lock:
+            # 其他进程在上次检查之后修改过文件时，先合并其最新内容，避免覆盖
+            if self._auth.stat_mtime() != self._auth.mtime:
+                self._reload(self._auth, 'on_auth_reload')
+            data = copy.deepcopy(self._auth.data)
+            _merge(data, updates)
+            self._write(self._auth, data)
+
+    @staticmethod
+    def _write(watched: _WatchedFile, data: dict):
+        directory = os.path.dirname(watched.path) or '.'
+        fd, tmp_path = tempfile.mkstemp(prefix='.tmp-', dir=directory)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                watched.dump(data, f)
+                f.flush()
+                os.fsync(f.fileno())
+            try:
+                os.chmod(tmp_path, stat.S_IMODE(os.stat(watched.path).st_mode))
+            except OSError:
+                pass
+            os.replace(tmp_path, watched.path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+        watched.data = data
+        watched.mtime = watched.stat_mtime()
+
+    def _reload(self, watched: _WatchedFile, event: str) -> bool:
+        """重新读取文件（需持有锁），解析失败时保留原内容"""
+        try:
+            watched.read()
+        except Exception as e:
+            # 文件可能正在被编辑，保留旧内容，下次检查时再试
+            logger.warning("重新加载 %s 失败，继续使用原配置: %s", watched.path, e)
+            return False
+        logger.info("已重新加载 %s", watched.path)
+        self._notify(event, watched.data)
+        return True
+
+    def check_for_changes(self) -> Dict[str, bool]:
+        """检查文件是否被外部修改，修改过则重新加载"""
+        reloaded = {}
+        with self._lock:
+            for watched, event in ((self._config, 'on_config_reload'), (self._auth, 'on_auth_reload')):
+                mtime = watched.stat_mtime()
+                if mtime is not None and mtime != watched.mtime:
+                    reloaded[watched.path] = self._reload(watched, event)
+        return reloaded
+
+    def start_watching(self, interval: Optional[float] = None):
+        """启动后台监视线程（interval 默认取 config.yaml 中的 config_reload.interval）"""
+        reload_config = self.config.get('config_reload') or {}
+        if not reload_config.get('enabled', True) or self._watcher is not None:
+            return
+        interval = interval or reload_config.get('interval', 2)
+
+        def run():
+            while not self._stopped.wait(interval):
+                self.check_for_changes()
+
+        self._watcher = threading.Thread(target=run, name="config-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self):
+        self._stopped.set()
+
+
+_default_store: Optional[ConfigStore] = None
+_default_lock = threading.Lock()
+
+
+def get_config_store() -> ConfigStore:
+    """进程内共享的配置存储（首次调用时加载）"""
+    global _default_store
+    with _default_lock:
+        if _default_store is None:
+            _default_store = ConfigStore()
+        return _default_store
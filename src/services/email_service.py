@@ -1,142 +1,467 @@
 import requests
-from typing import List, Dict, Optional
-import yaml
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+from typing import Callable, List, Dict, Optional, Tuple
+import functools
 import json
+import logging
 import os
+import csv
+import io
+import math
+import threading
+import time
+
+from services.analytics import MailboxAnalytics
+from services.cache import MailboxCache
+from services.config_store import ConfigStore, get_config_store
+from services.mailbox_store import MailboxStore
+from services.search_index import MailboxSearchIndex
+from services.shared_state import SharedSite, SharedState
+from services.resilience import RequestExecutor, RetryableError, RetryPolicy
+from services.metrics import (
+    TOKEN_REFRESH_LATENCY,
+    TOKEN_REFRESHES,
+    endpoint_label,
+    observe_upstream,
+)
+
+logger = logging.getLogger(__name__)
+
+
+# 令牌交换接口
+CLIENT_TOKEN_URL = "https://client-token.siteground.com/v1/auth/client-token"
+SITE_TOKEN_URL = "https://st.siteground.com/v1/auth/sites/{site_id}/token"
+
+# 未配置 sites 时使用的默认站点
+DEFAULT_SITE = {
+    'name': 'default',
+    'site_id': 'S0EzeVpuNEpJUT09',
+    'base_url': 'https://gsgp5.siteground.asia/api-sgcp/v00',
+    'domain_id': 1,
+    'domain': 'yszw-shoji.co.jp'
+}
+
+# sites 中每个站点必须配置的字段
+SITE_KEYS = tuple(DEFAULT_SITE)
+
+# 令牌交换使用的通用请求头
+TOKEN_EXCHANGE_HEADERS = {
+    'Content-Type': 'application/json',
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36',
+    'Accept': 'application/json',
+    'Accept-Language': 'en-US,en;q=0.9',
+    'Origin': 'https://my.siteground.com',
+    'Referer': 'https://my.siteground.com/'
+}
+
+# 邮件列表可排序的字段
+SORT_KEYS = {
+    'id': lambda email: email['id'],
+    'email': lambda email: f"{email['name']}@{email['domain_name']}".lower(),
+    'name': lambda email: email['name'].lower(),
+    'n_emails': lambda email: email.get('n_emails') or 0,
+    'used_size': lambda email: email.get('used_size') or 0,
+    'suspended': lambda email: bool(email['suspended'])
+}
+
+
+class ApiError(Exception):
+    """SiteGround API返回的业务错误"""
+    
+    def __init__(self, status, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def _is_connect_failure(error: requests.ConnectionError) -> bool:
+    """连接阶段的失败（建立连接失败或超时，请求尚未发出），非幂等请求也可以安全重试"""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    reason = error.args[0] if error.args else None
+    # requests 将 urllib3 的 MaxRetryError 包装在 ConnectionError 中，真正的原因在 reason 上
+    reason = getattr(reason, 'reason', reason)
+    return isinstance(reason, (NewConnectionError, ConnectTimeoutError))
+
+
+def load_sites(config: dict) -> List[dict]:
+    """从配置中读取站点列表（第一个站点为默认站点，其令牌沿用 auth.json 顶层的 api_token）
+
+    未配置 sites 时使用内置的默认站点；配置了 sites 时每个站点必须写全 SITE_KEYS，
+    不会从默认站点补全，避免拼写错误的站点在另一个名字下操作默认站点的邮箱。
+    """
+    configured = config.get('sites') or []
+    if not configured:
+        return [dict(DEFAULT_SITE, default=True)]
+    
+    sites = []
+    names = set()
+    for index, site in enumerate(configured):
+        missing = [key for key in SITE_KEYS if site.get(key) in (None, '')]
+        if missing:
+            raise ValueError(f"config.yaml 中第 {index + 1} 个站点缺少配置项: {', '.join(missing)}")
+        if site['name'] in names:
+            raise ValueError(f"config.yaml 中的站点名称重复: {site['name']}")
+        names.add(site['name'])
+        sites.append(dict(site, default=index == 0))
+    return sites
+
 
 class EmailService:
-    def __init__(self):
-        self.config = self._load_config()
-        self.auth = self._load_auth()
-        self.base_url = "https://gsgp5.siteground.asia/api-sgcp/v00"
+    def __init__(
+        self,
+        site: Optional[dict] = None,
+        config_store: Optional[ConfigStore] = None,
+        shared_state: Optional[SharedState] = None
+    ):
+        """site 由 SiteRegistry 传入；单独使用时为配置中的默认站点。配置与凭据来自进程内共享的 ConfigStore
+
+        shared_state 不为空时（多进程部署），令牌刷新与邮箱列表拉取在各工作进程之间协调
+        """
+        self.config_store = config_store or get_config_store()
+        self.site = site or load_sites(self.config)[0]
+        self.site_name = self.site['name']
+        self.base_url = self.site['base_url']
+        # 令牌交换接口地址（可在配置中替换，如指向本地模拟服务器）
+        token_config = self.config.get('token') or {}
+        self.client_token_url = token_config.get('client_token_url', CLIENT_TOKEN_URL)
+        self.site_token_url = token_config.get('site_token_url', SITE_TOKEN_URL).format(
+            site_id=self.site['site_id']
+        )
         self.headers = {
             'Content-Type': 'application/json',
-            'Authorization': f"Bearer {self.auth['api_token']}",
+            'Authorization': f"Bearer {self._site_auth().get('api_token', '')}",
             'User-Agent':"Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36"
         }
+        
+        # 共享的连接池会话（保持长连接，避免每次请求重新握手）
+        api_config = self.config.get('api') or {}
+        self.timeout = (
+            api_config.get('connect_timeout', 5),
+            api_config.get('timeout', 30)
+        )
+        self.session = self._create_session(
+            pool_connections=api_config.get('pool_connections', 4),
+            pool_maxsize=api_config.get('pool_maxsize', 20)
+        )
+        
+        # 邮箱列表缓存
+        cache_config = self.config.get('cache') or {}
+        self.cache = MailboxCache(
+            ttl=cache_config.get('ttl', 60),
+            stale_ttl=cache_config.get('stale_ttl', 600)
+        )
+        
+        self.analytics = MailboxAnalytics()
+        
+        # 搜索索引：随缓存增量更新，搜索与输入联想不再扫描整个列表
+        self.search_index = MailboxSearchIndex()
+        self.cache.subscribe(self.search_index)
+        
+        # 本地持久化索引：重启后直接预热缓存，并随每次拉取/新增/删除增量同步
+        store_config = self.config.get('store') or {}
+        self.store = None
+        if store_config.get('enabled', True):
+            store_path = store_config.get('path', os.path.join('config', 'mailboxes.db'))
+            if not self.site['default']:
+                # 其他站点使用独立的索引文件，如 config/mailboxes-<站点名>.db
+                root, ext = os.path.splitext(store_path)
+                store_path = f"{root}-{self.site_name}{ext}"
+            self.store = MailboxStore(store_path)
+            records = self.store.load()
+            if records:
+                self.cache.seed(records, self.store.last_synced_at())
+                self.search_index.on_snapshot(records)
+            self.cache.subscribe(self.store)
+        
+        # 令牌刷新协调：同一时刻只允许一个刷新在进行
+        self.token_refresh_after = token_config.get('refresh_after', 3000)
+        self.token_retry_cooldown = token_config.get('retry_cooldown', 10)
+        self._token_lock = threading.Lock()
+        self._token_version = 0
+        self._token_refreshed_at = self._initial_token_time()
+        self._token_failed_at = 0.0
+        self._background_refresh = None
+        
+        # 批量操作设置
+        bulk_config = self.config.get('bulk') or {}
+        self.bulk_concurrency = bulk_config.get('concurrency', 5)
+        
+        # 统一的请求执行器：退避重试 + 按接口熔断
+        retry_config = self.config.get('retry') or {}
+        breaker_config = self.config.get('circuit_breaker') or {}
+        self.executor = RequestExecutor(
+            policy=RetryPolicy(
+                max_retries=retry_config.get('max_retries', 3),
+                base_delay=retry_config.get('base_delay', 0.5),
+                max_delay=retry_config.get('max_delay', 8)
+            ),
+            failure_threshold=breaker_config.get('failure_threshold', 5),
+            reset_timeout=breaker_config.get('reset_timeout', 30)
+        )
+        
+        # 多进程部署：与其他工作进程共享令牌、邮箱列表与增量变更
+        self.shared = None
+        if shared_state is not None:
+            shared_config = self.config.get('shared_state') or {}
+            self.shared = SharedSite(
+                self,
+                shared_state,
+                lease_ttl=shared_config.get('lease_ttl', 30),
+                fill_window=shared_config.get('fill_window', 5)
+            )
+        
+        self.config_store.subscribe(self)
     
-    def _load_config(self) -> dict:
-        """加载配置文件"""
-        config_path = os.path.join('config', 'config.yaml')
-        with open(config_path, 'r', encoding='utf-8') as f:
-            return yaml.safe_load(f)
+    def _create_session(self, pool_connections: int, pool_maxsize: int) -> requests.Session:
+        """创建带连接池的HTTP会话"""
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=True  # 连接耗尽时等待空闲连接，而不是新建后丢弃
+        )
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers['Connection'] = 'keep-alive'
+        return session
     
-    def _load_auth(self) -> dict:
-        """加载认证信息"""
-        auth_path = os.path.join('config', 'auth.json')
+    def _request(self, method: str, url: str, endpoint: str = '', **kwargs) -> requests.Response:
+        """通过共享会话发送请求（统一超时设置，并记录耗时与状态码）"""
+        kwargs.setdefault('timeout', self.timeout)
+        start = time.perf_counter()
+        status = 'error'
         try:
-            with open(auth_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except FileNotFoundError:
-            raise Exception("认证配置文件不存在，请确保 config/auth.json 文件存在")
-        except json.JSONDecodeError:
-            raise Exception("认证配置文件格式错误，请确保是有效的JSON格式")
+            response = self.session.request(method, url, **kwargs)
+            status = response.status_code
+            return response
+        finally:
+            observe_upstream(method, endpoint or url, status, time.perf_counter() - start)
+    
+    def close(self):
+        """关闭连接池"""
+        self.session.close()
+    
+    @property
+    def config(self) -> dict:
+        """当前配置（内存中的快照，文件修改后自动更新）"""
+        return self.config_store.config
+    
+    @property
+    def auth(self) -> dict:
+        """当前认证信息（内存中的快照，只读；写入请使用 _save_site_auth）"""
+        return self.config_store.auth
+    
+    def _site_auth_path(self) -> Tuple[str, ...]:
+        """当前站点的令牌在 auth.json 中的位置（默认站点为顶层，其他站点位于 sites.<站点名> 下）"""
+        return () if self.site['default'] else ('sites', self.site_name)
+    
+    def _site_auth(self) -> dict:
+        """当前站点的令牌信息"""
+        data = self.auth
+        for key in self._site_auth_path():
+            data = data.get(key) or {}
+        return data
+    
+    def _save_site_auth(self, updates: dict):
+        """将当前站点的令牌信息合并写入 auth.json（原子写入，不影响其他字段与站点）"""
+        self.config_store.update_auth(updates, self._site_auth_path())
+    
+    def on_auth_reload(self, auth: dict):
+        """auth.json 被外部修改（如手动更换令牌）时，立即使用文件中的新令牌"""
+        site_auth = self._site_auth()
+        token = site_auth.get('api_token', '')
+        if self.headers['Authorization'] == f"Bearer {token}":
+            return
+        # 不获取 _token_lock：写入令牌时（持有该锁）也可能触发重新加载
+        self.headers['Authorization'] = f"Bearer {token}"
+        self._token_refreshed_at = float(site_auth.get('token_refreshed_at') or time.time())
+        self._token_failed_at = 0.0
+        self._token_version += 1
+        logger.info("已使用 auth.json 中更新的令牌", extra={'site': self.site_name})
+    
+    def on_config_reload(self, config: dict):
+        """config.yaml 被修改时应用可在线调整的参数（站点、连接池等需要重启后生效）"""
+        cache_config = config.get('cache') or {}
+        self.cache.ttl = cache_config.get('ttl', 60)
+        self.cache.stale_ttl = cache_config.get('stale_ttl', 600)
+        token_config = config.get('token') or {}
+        self.token_refresh_after = token_config.get('refresh_after', 3000)
+        self.token_retry_cooldown = token_config.get('retry_cooldown', 10)
+        self.bulk_concurrency = (config.get('bulk') or {}).get('concurrency', 5)
+        retry_config = config.get('retry') or {}
+        policy = self.executor.policy
+        policy.max_retries = retry_config.get('max_retries', 3)
+        policy.base_delay = retry_config.get('base_delay', 0.5)
+        policy.max_delay = retry_config.get('max_delay', 8)
+    
+    def _initial_token_time(self) -> float:
+        """推算当前令牌的签发时间（优先使用auth.json中记录的时间）"""
+        refreshed_at = self._site_auth().get('token_refreshed_at')
+        if refreshed_at:
+            return float(refreshed_at)
+        try:
+            return os.path.getmtime(self.config_store.auth_path)
+        except OSError:
+            return time.time()
+    
+    def token_age(self) -> float:
+        """当前令牌已使用的秒数"""
+        return time.time() - self._token_refreshed_at
     
     def update_token(self, new_token: str) -> bool:
         """更新API令牌"""
         try:
-            auth_path = os.path.join('config', 'auth.json')
-            auth_data = {'api_token': new_token}
-            
-            # 保存新的令牌
-            with open(auth_path, 'w', encoding='utf-8') as f:
-                json.dump(auth_data, f, indent=4)
+            refreshed_at = time.time()
+            # 只合并写入当前站点的令牌，保留 refresh_token、ui_auth 等其他字段
+            self._save_site_auth({'api_token': new_token, 'token_refreshed_at': refreshed_at})
             
             # 更新当前实例的认证信息
-            self.auth['api_token'] = new_token
-            self.headers['Authorization'] = f"Bearer {new_token}"
+            with self._token_lock:
+                self.headers['Authorization'] = f"Bearer {new_token}"
+                self._token_refreshed_at = refreshed_at
+                self._token_version += 1
+                if self.shared is not None:
+                    self.shared.publish_token(new_token, refreshed_at)
             
             return True
         except Exception as e:
-            print(f"更新令牌失败: {str(e)}")
+            logger.warning("更新令牌失败: %s", e, extra={'site': self.site_name})
             return False
     
-    def refresh_token(self) -> bool:
-        """刷新API令牌"""
+    def refresh_token(self, seen_version: Optional[int] = None) -> bool:
+        """刷新API令牌
+        
+        同一时刻只有一个刷新在进行，并发调用方等待并共享其结果。
+        seen_version 为调用方发起请求时的令牌版本，若在等待期间令牌已被其他线程刷新，
+        则直接复用新令牌而不再重复刷新。
+        """
+        if seen_version is None:
+            seen_version = self._token_version
+        
+        with self._token_lock:
+            if self._token_version != seen_version:
+                # 其他线程已完成刷新
+                return True
+            if time.time() - self._token_failed_at < self.token_retry_cooldown:
+                # 刚刚刷新失败，避免短时间内重复请求
+                return False
+            
+            with TOKEN_REFRESH_LATENCY.time():
+                if self.shared is not None:
+                    # 跨进程只由一个工作进程交换令牌，其余进程直接使用其发布的新令牌
+                    refreshed = self.shared.exchange_token(self._exchange_token)
+                else:
+                    refreshed = self._exchange_token()
+            if refreshed:
+                TOKEN_REFRESHES.inc(result='success')
+                self._token_version += 1
+                return True
+            TOKEN_REFRESHES.inc(result='failure')
+            self._token_failed_at = time.time()
+            return False
+    
+    def _refresh_token_in_background(self):
+        """令牌即将过期时在后台线程中提前刷新，避免用户请求承担刷新耗时"""
+        if self._token_lock.locked():
+            return
+        if self._background_refresh is not None and self._background_refresh.is_alive():
+            return
+        self._background_refresh = threading.Thread(
+            target=self.refresh_token,
+            name="token-refresh",
+            daemon=True
+        )
+        self._background_refresh.start()
+    
+    def _exchange_token(self) -> bool:
+        """通过 refresh_token 换取新的 site_token（需在持有 _token_lock 时调用）"""
         try:
-            # 设置通用请求头
-            common_headers = {
-                'Content-Type': 'application/json',
-                'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36',
-                'Accept': 'application/json',
-                'Accept-Language': 'en-US,en;q=0.9',
-                'Origin': 'https://my.siteground.com',
-                'Referer': 'https://my.siteground.com/'
-            }
-            
             # 第一步：获取client_token
             refresh_token = self.auth.get('refresh_token')
             if not refresh_token:
                 raise Exception("刷新令牌不存在")
             
-            print(f"开始第一步: 获取client_token...")
-            response = requests.post(
-                "https://client-token.siteground.com/v1/auth/client-token",
-                json={"refresh_token": refresh_token},
-                headers=common_headers
+            logger.debug("开始第一步: 获取client_token", extra={'site': self.site_name})
+            response_data = self.executor.execute(
+                'POST auth/client-token',
+                lambda: self._send_token_request(
+                    'POST',
+                    self.client_token_url,
+                    'auth/client-token',
+                    json={"refresh_token": refresh_token}
+                )
             )
             
-            print(f"第一步响应状态码: {response.status_code}")
-            print(f"第一步响应内容: {response.text}")
-            
-            try:
-                response_data = response.json()
-            except json.JSONDecodeError as e:
-                print(f"解析响应JSON失败: {str(e)}")
-                print(f"原始响应内容: {response.text}")
-                raise Exception("解析响应JSON失败")
-            
             if response_data['status'] != 200:
                 raise Exception(f"获取client_token失败: {response_data.get('message')}")
             
             client_token = response_data['data']['client_token']
-            print("成功获取client_token")
             
             # 第二步：获取site_token
-            print(f"开始第二步: 获取site_token...")
-            response = requests.get(
-                "https://st.siteground.com/v1/auth/sites/S0EzeVpuNEpJUT09/token",
-                params={"_client_token": client_token},
-                headers=common_headers
+            logger.debug("开始第二步: 获取site_token", extra={'site': self.site_name})
+            response_data = self.executor.execute(
+                'GET auth/site-token',
+                lambda: self._send_token_request(
+                    'GET',
+                    self.site_token_url,
+                    'auth/site-token',
+                    params={"_client_token": client_token}
+                )
             )
             
-            print(f"第二步响应状态码: {response.status_code}")
-            print(f"第二步响应内容: {response.text}")
-            
-            try:
-                response_data = response.json()
-            except json.JSONDecodeError as e:
-                print(f"解析响应JSON失败: {str(e)}")
-                print(f"原始响应内容: {response.text}")
-                raise Exception("解析响应JSON失败")
-            
             if response_data['status'] != 200:
                 raise Exception(f"获取site_token失败: {response_data.get('message')}")
             
             site_token = response_data['data']['site_token']
-            print("成功获取site_token")
-            
-            # 更新auth.json文件
-            print("开始更新本地配置...")
-            self.auth['api_token'] = site_token
-            auth_path = os.path.join('config', 'auth.json')
-            with open(auth_path, 'w', encoding='utf-8') as f:
-                json.dump(self.auth, f, indent=4)
             
-            # 更新当前实例的headers
-            self.headers['Authorization'] = f"Bearer {site_token}"
+            self._store_token(site_token)
             
-            print("令牌刷新成功")
+            logger.info("令牌刷新成功", extra={'site': self.site_name})
             return True
             
         except Exception as e:
-            print(f"刷新令牌失败，详细错误: {str(e)}")
-            print(f"错误类型: {type(e).__name__}")
-            if hasattr(e, '__traceback__'):
-                import traceback
-                print(f"错误堆栈:\n{''.join(traceback.format_tb(e.__traceback__))}")
+            logger.warning("刷新令牌失败: %s", e, extra={'site': self.site_name}, exc_info=True)
             return False
     
+    def _send_token_request(self, method: str, url: str, endpoint: str, **kwargs) -> dict:
+        """发送一次令牌交换请求（不含重试）"""
+        try:
+            response = self._request(
+                method,
+                url,
+                endpoint=endpoint,
+                headers=TOKEN_EXCHANGE_HEADERS,
+                **kwargs
+            )
+        except (requests.ConnectionError, requests.Timeout) as e:
+            # 令牌交换不会产生副作用，超时也可以重试
+            raise RetryableError(f"连接失败: {str(e)}")
+        return self._parse_response(response)
+    
+    def _store_token(self, site_token: str):
+        """保存刷新得到的新令牌（需在持有 _token_lock 时调用）"""
+        # 更新auth.json文件
+        logger.debug("开始更新本地配置", extra={'site': self.site_name})
+        refreshed_at = time.time()
+        self._save_site_auth({'api_token': site_token, 'token_refreshed_at': refreshed_at})
+        
+        # 更新当前实例的headers
+        self.headers['Authorization'] = f"Bearer {site_token}"
+        self._token_refreshed_at = refreshed_at
+        if self.shared is not None:
+            self.shared.publish_token(site_token, refreshed_at)
+    
+    def _apply_token(self, site_token: str, refreshed_at: float):
+        """使用其他工作进程刷新的令牌（auth.json 已由该进程写入）
+        
+        与 on_auth_reload 相同，不获取 _token_lock：刷新时（持有该锁）也会调用
+        """
+        self.headers['Authorization'] = f"Bearer {site_token}"
+        self._token_refreshed_at = refreshed_at
+        self._token_failed_at = 0.0
+        self._token_version += 1
+    
     def _check_token_expired(self, response_data: dict) -> bool:
         """检查令牌是否过期或无效"""
         message = str(response_data.get('message', '')).lower()
@@ -156,50 +481,180 @@ class EmailService:
         
         # 如果满足任一条件，则认为令牌需要刷新
         if any(token_invalid_cases):
-            print(f"令牌验证失败: {response_data.get('message')} (状态码: {status})")
+            logger.info(
+                "令牌验证失败: %s", response_data.get('message'),
+                extra={'site': self.site_name, 'status': status}
+            )
             return True
         
         return False
     
-    def list_email_addresses(self) -> List[List]:
-        """获取邮件地址列表"""
+    def _parse_response(self, response, idempotent: bool = True) -> dict:
+        """解析API响应，可重试的失败（限流、5xx）抛出 RetryableError
+        
+        非幂等请求（POST）遇到5xx时不重试，避免重复创建。
+        """
+        retry_after = response.headers.get('Retry-After')
+        retry_after = float(retry_after) if retry_after and retry_after.isdigit() else None
+        
+        if response.status_code == 429:
+            raise RetryableError("请求过于频繁（429）", retry_after=retry_after, trip_breaker=False)
+        if response.status_code >= 500 and idempotent:
+            raise RetryableError(f"上游服务错误（{response.status_code}）", retry_after=retry_after)
+        
         try:
-            response = requests.get(
-                f"{self.base_url}/email",
-                headers=self.headers
+            response_data = response.json()
+        except json.JSONDecodeError:
+            logger.warning("API响应解析失败", extra={'status': response.status_code})
+            raise ApiError(response.status_code, "API响应解析失败")
+        
+        status = response_data.get('status')
+        if status == 429:
+            raise RetryableError("请求过于频繁（429）", retry_after=retry_after, trip_breaker=False)
+        if isinstance(status, int) and status >= 500 and idempotent:
+            raise RetryableError(f"API错误: {response_data.get('message', '未知错误')}")
+        return response_data
+    
+    def _send_api(self, method: str, path: str, endpoint: str, **kwargs) -> dict:
+        """发送一次API请求（不含重试）"""
+        idempotent = method != 'POST'
+        try:
+            response = self._request(
+                method,
+                f"{self.base_url}{path}",
+                endpoint=endpoint,
+                headers=dict(self.headers),
+                **kwargs
+            )
+        except requests.ConnectionError as e:
+            # 读取阶段的断开（连接被重置等）时请求可能已被执行，非幂等请求不重试
+            if idempotent or _is_connect_failure(e):
+                raise RetryableError(f"连接失败: {str(e)}")
+            raise
+        except requests.Timeout as e:
+            if idempotent:
+                raise RetryableError(f"请求超时: {str(e)}")
+            raise
+        return self._parse_response(response, idempotent)
+    
+    def _call_api(self, method: str, path: str, **kwargs) -> dict:
+        """调用SiteGround API并返回解析后的响应
+        
+        请求经由统一执行器发送（限流/5xx退避重试，接口熔断）；
+        令牌即将过期时触发后台刷新；令牌失效时等待（或发起）一次刷新后重试一次。
+        """
+        if self.token_age() > self.token_refresh_after:
+            self._refresh_token_in_background()
+        
+        endpoint = endpoint_label(path)
+        for attempt in range(2):
+            token_version = self._token_version
+            response_data = self.executor.execute(
+                f"{method} {endpoint}",
+                lambda: self._send_api(method, path, endpoint, **kwargs)
             )
             
-            try:
-                response_data = response.json()
-            except json.JSONDecodeError:
-                print(f"API响应解析失败: {response.text}")
-                return []
-            
-            # 检查令牌是否过期或无效，如果是则尝试刷新
-            if self._check_token_expired(response_data):
-                print("尝试刷新令牌...")
-                if self.refresh_token():
-                    # 刷新成功后重试请求
-                    return self.list_email_addresses()
-                else:
+            # 检查令牌是否过期或无效，如果是则刷新后重试
+            if attempt == 0 and self._check_token_expired(response_data):
+                logger.info("令牌已过期或无效，尝试刷新", extra={'site': self.site_name})
+                if not self.refresh_token(seen_version=token_version):
                     raise Exception("令牌刷新失败")
+                continue
             
-            if response_data['status'] != 200:
-                raise Exception(f"API错误: {response_data.get('message', '未知错误')}")
-            
-            # 转换为表格显示格式
-            return [[
-                email['id'],
-                f"{email['name']}@{email['domain_name']}", # 完整邮件地址
-                email['name'],                             # 用户名
-                email.get('n_emails', 0),                  # 邮件数量
-                self._format_size(email.get('used_size', 0)), # 已使用空间
-                '已停用' if email['suspended'] else '正常'    # 状态
-            ] for email in response_data['data']]
-            
-        except Exception as e:
-            print(f"获取邮件列表失败: {str(e)}")
+            return response_data
+    
+    def list_email_addresses(self, force_refresh: bool = False) -> List[List]:
+        """获取邮件地址列表（优先读取缓存，force_refresh=True 时强制从API拉取）
+        
+        上游不可用时返回最近一次成功获取的数据；从未获取成功时抛出异常，而不是返回空列表。
+        """
+        records = self.cache.get(self._loader(force_refresh), force=force_refresh)
+        # 转换为表格显示格式
+        return [self._to_row(email) for email in records]
+    
+    def query_email_addresses(
+        self,
+        page: int = 1,
+        page_size: int = 50,
+        sort_by: Optional[str] = None,
+        descending: bool = False,
+        search: Optional[str] = None,
+        force_refresh: bool = False
+    ) -> Tuple[List[List], int, int]:
+        """分页查询邮件地址列表（在缓存的记录上搜索、排序、分页，翻页不访问API）
+        
+        返回 (当前页表格行, 匹配总数, 实际页码)；上游不可用时使用过期缓存，无任何数据时抛出异常
+        """
+        records = self.cache.get(self._loader(force_refresh), force=force_refresh)
+        return self._query_records(records, page, page_size, sort_by, descending, search)
+    
+    def _query_records(
+        self,
+        records: List[dict],
+        page: int,
+        page_size: int,
+        sort_by: Optional[str],
+        descending: bool,
+        search: Optional[str]
+    ) -> Tuple[List[List], int, int]:
+        """对原始记录执行搜索、排序和分页
+        
+        搜索由索引给出按相关度排序的匹配记录（前缀、子串与模糊匹配），
+        sort_by 为 'relevance' 时保持该顺序。
+        """
+        if search and search.strip():
+            records = self.search_index.search(search)
+        
+        sort_key = SORT_KEYS.get(sort_by)
+        if sort_key:
+            records = sorted(records, key=sort_key, reverse=descending)
+        
+        total = len(records)
+        page_size = max(1, int(page_size))
+        page_count = max(1, math.ceil(total / page_size))
+        page = min(max(1, int(page)), page_count)
+        start = (page - 1) * page_size
+        return [self._to_row(email) for email in records[start:start + page_size]], total, page
+    
+    def suggest_email_addresses(self, query: str, limit: int = 10) -> List[dict]:
+        """输入联想：按相关度返回前 limit 个匹配的邮箱（只读内存中的索引，不访问API）"""
+        if not query or not query.strip():
             return []
+        return self.search_index.search(query, limit=limit)
+    
+    def get_usage_report(self, top_n: int = 10, force_refresh: bool = False) -> Dict:
+        """邮箱用量分析报告（基于缓存的原始数值字段向量化计算）"""
+        records = self.cache.get(self._loader(force_refresh), force=force_refresh)
+        # 拉取完成后再读取版本号：记录与版本号来自同一时刻的缓存，拉取期间的变更不会被错配到旧版本
+        snapshot, version = self.cache.snapshot()
+        return self.analytics.report(records if snapshot is None else snapshot, version, top_n)
+    
+    def _loader(self, force: bool = False) -> Callable[[], List[dict]]:
+        """缓存未命中时的拉取函数（多进程部署时优先复用其他工作进程刚拉取的列表）"""
+        if self.shared is None:
+            return self._fetch_email_records
+        max_age = self.shared.fill_window if force else self.cache.ttl
+        return functools.partial(self.shared.load, self._fetch_email_records, max_age)
+    
+    def _fetch_email_records(self) -> List[dict]:
+        """从API拉取原始邮件地址记录"""
+        response_data = self._call_api('GET', '/email')
+        
+        if response_data['status'] != 200:
+            raise Exception(f"API错误: {response_data.get('message', '未知错误')}")
+        
+        return response_data['data']
+    
+    def _to_row(self, email: dict) -> List:
+        """将原始记录转换为表格行"""
+        return [
+            email['id'],
+            f"{email['name']}@{email['domain_name']}", # 完整邮件地址
+            email['name'],                             # 用户名
+            email.get('n_emails', 0),                  # 邮件数量
+            self._format_size(email.get('used_size', 0)), # 已使用空间
+            '已停用' if email['suspended'] else '正常'    # 状态
+        ]
     
     def _format_size(self, size_in_bytes: int) -> str:
         """将字节转换为可读格式"""
@@ -225,67 +680,91 @@ class EmailService:
         
         return password
     
-    def add_email_address(self, username: str, password: str) -> str:
-        """添加新的邮件地址"""
-        try:
-            # 准备请求数据
-            data = {
-                'name': username.strip(),
-                'password': password,
-                'domain_id': 1
-            }
-            
-            response = requests.post(
-                f"{self.base_url}/email",
-                headers=self.headers,
-                json=data
+    def create_email(self, username: str, password: str) -> dict:
+        """调用API创建邮件地址，成功时返回新记录，失败时抛出 ApiError"""
+        # 准备请求数据
+        data = {
+            'name': username.strip(),
+            'password': password,
+            'domain_id': self.site['domain_id']
+        }
+        
+        response_data = self._call_api('POST', '/email', json=data)
+        
+        if response_data['status'] != 200:
+            raise ApiError(
+                response_data['status'],
+                f"API错误: {response_data.get('message', '未知错误')}"
             )
-            
-            response_data = response.json()
-            
-            # 检查令牌是否过期或无效
-            if self._check_token_expired(response_data):
-                print("令牌已过期或无效，尝试刷新...")
-                if self.refresh_token():
-                    # 刷新成功后重试请求
-                    return self.add_email_address(username, password)
-                else:
-                    raise Exception("令牌刷新失败")
-            
-            if response_data['status'] != 200:
-                raise Exception(f"API错误: {response_data.get('message', '未知错误')}")
-            
-            # 返回成功信息，包含创建的邮件地址
-            created_email = f"{response_data['data']['name']}@{response_data['data']['domain_name']}"
-            return f"邮件地址创建成功\n邮箱: {created_email}"
-            
-        except Exception as e:
-            print(f"添加邮件地址失败: {str(e)}")
-            return f"添加失败：{str(e)}"
+        
+        # 将新记录写入缓存，无需重新拉取列表
+        created = response_data['data']
+        if isinstance(created, dict) and 'id' in created:
+            created.setdefault('suspended', 0)
+            self.cache.upsert(created)
+        else:
+            self.cache.invalidate()
+        return created
     
-    def delete_email_address(self, email_id: str) -> str:
-        """删除邮件地址"""
-        try:
-            response = requests.delete(
-                f"{self.base_url}/email/{email_id}",
-                headers=self.headers
+    @staticmethod
+    def parse_bulk_input(text: str) -> List[Tuple[str, Optional[str]]]:
+        """解析批量创建输入（每行 "用户名" 或 "用户名,密码"，支持CSV格式）"""
+        entries = []
+        for row in csv.reader(io.StringIO(text or '')):
+            cells = [cell.strip() for cell in row]
+            if not cells or not cells[0]:
+                continue
+            # 跳过表头
+            if not entries and cells[0].lower() in ('username', 'name', '用户名'):
+                continue
+            password = cells[1] if len(cells) > 1 and cells[1] else None
+            entries.append((cells[0], password))
+        return entries
+    
+    def new_bulk_result(self, entry: Tuple[str, Optional[str]]) -> Dict:
+        """初始化批量创建的单行结果（补全密码并校验，校验失败时 message 非空）"""
+        username, password = entry
+        password = password or self.generate_simple_password()
+        result = {
+            'username': username,
+            'email': '',
+            'password': password,
+            'success': False,
+            'message': ''
+        }
+        if not (1 <= len(username) <= 16):
+            result['message'] = "用户名长度必须在1-16个字符之间"
+        elif not (6 <= len(password) <= 20):
+            result['message'] = "密码长度必须在6-20个字符之间"
+        return result
+    
+    def delete_email(self, email_id: str):
+        """调用API删除邮件地址，失败时抛出 ApiError"""
+        response_data = self._call_api('DELETE', f'/email/{email_id}')
+        
+        if response_data['status'] != 200:
+            raise ApiError(
+                response_data['status'],
+                f"API错误: {response_data.get('message', '未知错误')}"
             )
-            
-            response_data = response.json()
-            
-            # 检查令牌是否过期或无效
-            if self._check_token_expired(response_data):
-                print("令牌已过期或无效，尝试刷新...")
-                if self.refresh_token():
-                    # 刷新成功后重试请求
-                    return self.delete_email_address(email_id)
-                else:
-                    raise Exception("令牌刷新失败")
-            
-            if response_data['status'] != 200:
-                raise Exception(f"API错误: {response_data.get('message', '未知错误')}")
-            
-            return "邮件地址删除成功"
-        except Exception as e:
-            print(f"删除邮件地址失败: {str(e)}")
-            return f"删除失败：{str(e)}" 
\ No newline at end of file
+        
+        # 从缓存中移除该记录
+        self.cache.remove(email_id)
+    
+    def update_email(self, email_id: str, changes: dict) -> dict:
+        """修改邮件地址（如 {'suspended': 1}、{'password': '...'}），失败时抛出 ApiError"""
+        response_data = self._call_api('PUT', f'/email/{email_id}', json=changes)
+        
+        if response_data['status'] != 200:
+            raise ApiError(
+                response_data['status'],
+                f"API错误: {response_data.get('message', '未知错误')}"
+            )
+        
+        # 用返回的记录修补缓存（密码不在列表字段中，不需要修补）
+        updated = response_data.get('data')
+        if isinstance(updated, dict) and 'id' in updated:
+            self.cache.upsert(updated)
+        elif 'suspended' in changes:
+            self.cache.invalidate()
+        return updated
@@ -0,0 +1,552 @@
+import asyncio
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+from services.email_service import EmailService
+from services.metrics import JOB_ITEMS, JOB_QUEUE_WAIT, JOBS
+from services.shared_state import new_owner_id
+from services.structured_logging import current_request_id, request_context
+
+logger = logging.getLogger(__name__)
+
+# 任务类型 -> 显示名称
+JOB_KINDS = {
+    'create': '创建',
+    'delete': '删除',
+    'suspend': '停用',
+    'unsuspend': '启用',
+    'reset_password': '重置密码'
+}
+
+# 任务状态 -> 显示名称
+JOB_STATUSES = {
+    'queued': '排队中',
+    'running': '执行中',
+    'succeeded': '已完成',
+    'failed': '部分失败'
+}
+
+# 需要邮箱密码的任务类型（密码只保存在内存中，任务表里只有遮盖后的形式）
+SECRET_KINDS = ('create', 'reset_password')
+REDACTED_PASSWORD = '******'
+
+UNFINISHED_STATUSES = ('queued', 'running')
+
+
+class Job:
+    """一个后台任务：对同一站点的一组邮箱执行同一种操作
+
+    items 为操作对象（创建：{'username', 'password'}；其他：{'id', 'email'}），
+    results 与 items 一一对应，尚未执行的为 None。
+    items 与 results 中的密码均为遮盖后的形式；明文密码以 {下标: 密码} 保存在 secrets 中，
+    只存在于提交任务的进程内存里，不写入任务表，由提交者在进度流中显示一次。
+    version 在每次状态或结果变化时递增，供界面判断是否需要推送进度。
+    """
+
+    def __init__(
+        self,
+        site: str,
+        kind: str,
+        items: List[dict],
+        results: Optional[List[Optional[dict]]] = None,
+        concurrency: int = 1,
+        status: str = 'queued',
+        job_id: Optional[int] = None,
+        created_at: Optional[float] = None,
+        started_at: Optional[float] = None,
+        finished_at: Optional[float] = None
+    ):
+        self.id = job_id
+        self.site = site
+        self.kind = kind
+        self.items = items
+        self.results = results or [None] * len(items)
+        self.concurrency = concurrency
+        self.status = status
+        self.created_at = created_at or time.time()
+        self.started_at = started_at
+        self.finished_at = finished_at
+        self.secrets: Dict[int, str] = {}
+        self.version = 0
+        # 提交任务的请求ID，执行期间的日志沿用该ID
+        self.request_id: Optional[str] = None
+
+    @property
+    def total(self) -> int:
+        return len(self.items)
+
+    @property
+    def done(self) -> int:
+        return sum(1 for result in self.results if result is not None)
+
+    @property
+    def succeeded(self) -> int:
+        return sum(1 for result in self.results if result is not None and result['success'])
+
+    @property
+    def failed(self) -> int:
+        return self.done - self.succeeded
+
+    @property
+    def finished(self) -> bool:
+        return self.status not in UNFINISHED_STATUSES
+
+    def pending(self) -> List[int]:
+        """尚未执行的对象下标"""
+        return [index for index, result in enumerate(self.results) if result is None]
+
+
+class JobStore:
+    """任务表的持久化（SQLite）
+
+    每个对象执行完成后立即写回结果，进程重启后未完成的任务从断点继续。
+    多进程部署时各工作进程共用同一个数据库：任务记录执行者（owner）与心跳时间，
+    执行者退出后其他进程接管其未完成的任务。
+    邮箱密码不写入任务表：进程重启或被接管后，尚未执行的创建与重置密码对象记为失败，需要重新提交。
+    """
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._create_tables()
+
+    def _create_tables(self):
+        with self._lock, self._conn:
+            self._conn.executescript('''
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    site TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    concurrency INTEGER NOT NULL DEFAULT 1,
+                    items TEXT NOT NULL,
+                    results TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL
+                );
+                CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status);
+            ''')
+            # 旧版本创建的任务表补充执行者与心跳列
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+            for column, column_type in (('owner', 'TEXT'), ('heartbeat_at', 'REAL')):
+                if column not in columns:
+                    self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {column_type}")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    @staticmethod
+    def _to_job(row) -> Job:
+        job_id, site, kind, status, concurrency, items, results, created_at, started_at, finished_at = row
+        return Job(
+            site,
+            kind,
+            json.loads(items),
+            json.loads(results),
+            concurrency=concurrency,
+            status=status,
+            job_id=job_id,
+            created_at=created_at,
+            started_at=started_at,
+            finished_at=finished_at
+        )
+
+    def insert(self, job: Job, owner: Optional[str] = None) -> int:
+        """写入新任务并返回任务ID"""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO jobs (site, kind, status, concurrency, items, results, created_at, owner, heartbeat_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    job.site, job.kind, job.status, job.concurrency,
+                    json.dumps(job.items, ensure_ascii=False),
+                    json.dumps(job.results, ensure_ascii=False),
+                    job.created_at,
+                    owner,
+                    time.time()
+                )
+            )
+        return cursor.lastrowid
+
+    def save(self, job: Job):
+        """写回任务的状态与结果（同时更新心跳时间）"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, results = ?, started_at = ?, finished_at = ?, heartbeat_at = ? "
+                "WHERE id = ?",
+                (
+                    job.status,
+                    json.dumps(job.results, ensure_ascii=False),
+                    job.started_at,
+                    job.finished_at,
+                    time.time(),
+                    job.id
+                )
+            )
+
+    def get(self, job_id: int) -> Optional[Job]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, site, kind, status, concurrency, items, results, created_at, started_at, finished_at "
+                "FROM jobs WHERE id = ?",
+                (int(job_id),)
+            ).fetchone()
+        return self._to_job(row) if row else None
+
+    def unfinished(self) -> List[Job]:
+        """排队中或执行中（进程退出时被中断）的任务，按提交顺序"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, site, kind, status, concurrency, items, results, created_at, started_at, finished_at "
+                f"FROM jobs WHERE status IN ({', '.join('?' * len(UNFINISHED_STATUSES))}) ORDER BY id",
+                UNFINISHED_STATUSES
+            ).fetchall()
+        return [self._to_job(row) for row in rows]
+
+    def claim(self, job_id: int, owner: str, stale_before: float) -> bool:
+        """认领未完成的任务：没有执行者、执行者是自己或执行者的心跳早于 stale_before 时成功"""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET owner = ?, heartbeat_at = ? "
+                f"WHERE id = ? AND status IN ({', '.join('?' * len(UNFINISHED_STATUSES))}) "
+                "AND (owner IS NULL OR owner = ? OR heartbeat_at IS NULL OR heartbeat_at < ?)",
+                (owner, time.time(), int(job_id)) + UNFINISHED_STATUSES + (owner, stale_before)
+            )
+        return cursor.rowcount == 1
+
+    def touch(self, owner: str) -> int:
+        """更新该执行者所有未完成任务的心跳时间"""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET heartbeat_at = ? "
+                f"WHERE owner = ? AND status IN ({', '.join('?' * len(UNFINISHED_STATUSES))})",
+                (time.time(), owner) + UNFINISHED_STATUSES
+            )
+        return cursor.rowcount
+
+    def recent(self, limit: int = 20) -> List[Job]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, site, kind, status, concurrency, items, results, created_at, started_at, finished_at "
+                "FROM jobs ORDER BY id DESC LIMIT ?",
+                (int(limit),)
+            ).fetchall()
+        return [self._to_job(row) for row in rows]
+
+    def prune(self, older_than: float) -> int:
+        """删除在 older_than 之前结束的任务（其中可能含有密码），返回删除的数量"""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?",
+                (older_than,)
+            )
+        return cursor.rowcount
+
+
+class JobManager:
+    """后台任务管理器
+
+    界面提交任务后立即返回任务ID，由进程内的工作线程池依次执行；
+    单个任务内的对象以有限并发执行（限流由请求执行器退避重试），每完成一个就写回任务表。
+    界面通过 watch 流式获取进度，刷新浏览器后可凭任务ID重新接上进度。
+    shared 为 True 时（多进程部署）定期更新心跳，并接管心跳超过 stale_after 秒的其他进程的任务。
+    """
+
+    def __init__(
+        self,
+        services: Dict[str, EmailService],
+        store: JobStore,
+        workers: int = 4,
+        retention_days: float = 7,
+        shared: bool = False,
+        stale_after: float = 30
+    ):
+        self.services = services
+        self.store = store
+        self.workers = max(1, int(workers))
+        self.retention_days = retention_days
+        self.shared = shared
+        self.stale_after = stale_after
+        self.owner = new_owner_id()
+        self._lock = threading.Lock()
+        # 本进程内提交或恢复的任务（执行中的任务以内存中的对象为准）
+        self._jobs: Dict[int, Job] = {}
+        self._queue: queue.Queue = queue.Queue()
+        self._threads: List[threading.Thread] = []
+
+    @property
+    def running(self) -> bool:
+        return any(thread.is_alive() for thread in self._threads)
+
+    def start(self):
+        """清理过期任务，恢复上次未完成的任务，然后启动工作线程"""
+        if self._threads:
+            return
+        if self.retention_days:
+            pruned = self.store.prune(time.time() - self.retention_days * 86400)
+            if pruned:
+                logger.info("已清理过期任务", extra={'count': pruned})
+        self.resume()
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"job-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        if self.shared:
+            thread = threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def resume(self):
+        """将任务表中未完成的任务重新放入队列，只执行尚未完成的对象
+
+        多进程部署时只认领执行者心跳已超时的任务（其余任务仍由其他工作进程执行）
+        """
+        stale_before = time.time() - self.stale_after if self.shared else float('inf')
+        for job in self.store.unfinished():
+            with self._lock:
+                if job.id in self._jobs:
+                    continue
+            if not self.store.claim(job.id, self.owner, stale_before):
+                continue
+            with self._lock:
+                self._jobs[job.id] = job
+            logger.info(
+                "恢复未完成的任务",
+                extra={'job_id': job.id, 'kind': job.kind, 'site': job.site, 'remaining': len(job.pending())}
+            )
+            self._queue.put((job, time.monotonic()))
+
+    def submit(
+        self,
+        site: str,
+        kind: str,
+        targets: Iterable,
+        concurrency: Optional[int] = None
+    ) -> Job:
+        """提交任务并立即返回
+
+        创建任务的 targets 为 (用户名, 密码) 列表（密码为空时此时生成，重试时保持不变），
+        其他任务为邮箱ID列表。校验未通过的对象直接记为失败，不进入执行。
+        返回的任务对象的 secrets 中是明文密码，只在本次提交的进度中显示。
+        """
+        if kind not in JOB_KINDS:
+            raise ValueError(f"未知的任务类型: {kind}")
+        service = self.services[site]
+        items, results, secrets = self._prepare(service, kind, list(targets))
+        job = Job(
+            site,
+            kind,
+            items,
+            results,
+            concurrency=max(1, int(concurrency or service.bulk_concurrency))
+        )
+        job.secrets = secrets
+        job.request_id = current_request_id()
+        job.id = self.store.insert(job, self.owner)
+        with self._lock:
+            self._jobs[job.id] = job
+        logger.info("任务已提交", extra={'job_id': job.id, 'kind': kind, 'site': site, 'total': job.total})
+        self._queue.put((job, time.monotonic()))
+        return job
+
+    @staticmethod
+    def _prepare(service: EmailService, kind: str, targets: List):
+        """将提交的对象转换为任务表中的 items 与明文密码，并预先填入校验失败的结果"""
+        items, results, secrets = [], [], {}
+        if kind == 'create':
+            for index, entry in enumerate(targets):
+                result = service.new_bulk_result(entry)
+                secrets[index] = result['password']
+                result['password'] = REDACTED_PASSWORD
+                items.append({'username': result['username'], 'password': REDACTED_PASSWORD})
+                results.append(result if result['message'] else None)
+            return items, results, secrets
+
+        # 按ID查出邮件地址，便于在进度与任务列表中显示
+        emails = {
+            str(record['id']): f"{record['name']}@{record['domain_name']}"
+            for record in service.cache.peek() or []
+        }
+        for index, email_id in enumerate(targets):
+            item = {'id': str(email_id), 'email': emails.get(str(email_id), '')}
+            if kind == 'reset_password':
+                secrets[index] = service.generate_simple_password()
+                item['password'] = REDACTED_PASSWORD
+            items.append(item)
+            results.append(None)
+        return items, results, secrets
+
+    def get(self, job_id) -> Optional[Job]:
+        """按ID获取任务（本进程内的任务取内存对象，其余从任务表读取）"""
+        try:
+            job_id = int(job_id)
+        except (TypeError, ValueError):
+            return None
+        with self._lock:
+            job = self._jobs.get(job_id)
+        return job or self.store.get(job_id)
+
+    def recent(self, limit: int = 20) -> List[Job]:
+        """最近的任务（执行中的任务带有最新进度）"""
+        jobs = self.store.recent(limit)
+        with self._lock:
+            return [self._jobs.get(job.id, job) for job in jobs]
+
+    async def watch(self, job_id, interval: float = 0.3):
+        """异步生成器：任务每次有进展时输出一次任务对象，任务结束后输出最终状态并结束
+
+        轮询间隔从 20 毫秒逐步加倍到 interval，单个邮箱的操作几乎没有额外等待。
+        由其他工作进程执行的任务每次轮询从任务表重新读取。
+        """
+        job = self.get(job_id)
+        if job is None:
+            return
+        version = None
+        delay = min(0.02, interval)
+        while True:
+            with self._lock:
+                local = self._jobs.get(job.id)
+            if local is not None:
+                job = local
+                current = job.version
+            else:
+                job = await asyncio.to_thread(self.store.get, job.id) or job
+                current = (job.status, job.done)
+            # 先读取是否结束，保证结束后的最终状态一定被输出
+            finished = job.finished
+            if current != version:
+                version = current
+                yield job
+            if finished:
+                return
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, interval)
+
+    def _heartbeat(self):
+        """多进程部署：定期更新本进程任务的心跳，并接管已退出的工作进程留下的任务"""
+        while True:
+            time.sleep(max(1.0, self.stale_after / 3))
+            try:
+                self.store.touch(self.owner)
+                self.resume()
+            except Exception as e:
+                logger.warning("更新任务心跳失败: %s", e)
+
+    def _worker(self):
+        while True:
+            job, queued_at = self._queue.get()
+            JOB_QUEUE_WAIT.observe(time.monotonic() - queued_at)
+            with request_context(job.request_id):
+                try:
+                    self._run(job)
+                except Exception as e:
+                    logger.exception("任务执行失败: %s", e, extra={'job_id': job.id})
+                    self._finish(job, 'failed')
+            self._queue.task_done()
+
+    def _run(self, job: Job):
+        service = self.services.get(job.site)
+        pending = job.pending()
+        if service is None:
+            # 站点已从配置中移除
+            for index in pending:
+                job.results[index] = {'success': False, 'message': f"站点 {job.site} 不存在"}
+            self._finish(job, 'failed')
+            return
+
+        with self._lock:
+            job.status = 'running'
+            job.started_at = job.started_at or time.time()
+            job.version += 1
+        self.store.save(job)
+        logger.info("任务开始执行", extra={'job_id': job.id, 'kind': job.kind, 'site': job.site})
+
+        request_id = current_request_id()
+
+        def run_one(index: int):
+            with request_context(request_id):
+                result = self._execute(service, job.kind, job.items[index], job.secrets.get(index))
+            JOB_ITEMS.inc(kind=job.kind, result='succeeded' if result['success'] else 'failed')
+            with self._lock:
+                job.results[index] = result
+                job.version += 1
+            self.store.save(job)
+
+        if pending:
+            workers = max(1, min(job.concurrency, len(pending)))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"job-{job.id}") as pool:
+                list(pool.map(run_one, pending))
+        self._finish(job, 'failed' if job.failed else 'succeeded')
+
+    def _finish(self, job: Job, status: str):
+        with self._lock:
+            job.status = status
+            job.finished_at = time.time()
+            job.version += 1
+        self.store.save(job)
+        JOBS.inc(kind=job.kind, status=status)
+        logger.info(
+            "任务执行结束",
+            extra={
+                'job_id': job.id, 'kind': job.kind, 'site': job.site, 'status': status,
+                'succeeded': job.succeeded, 'failed': job.failed
+            }
+        )
+
+    @staticmethod
+    def _execute(service: EmailService, kind: str, item: dict, password: Optional[str] = None) -> dict:
+        """执行单个对象，返回结果（不抛出异常）"""
+        if kind == 'create':
+            result = {
+                'username': item['username'],
+                'email': '',
+                'password': REDACTED_PASSWORD,
+                'success': False,
+                'message': ''
+            }
+        else:
+            result = {'email': item['email'], 'success': False, 'message': ''}
+
+        if kind in SECRET_KINDS and password is None:
+            # 明文密码只在提交任务的进程内存中，重启或被其他进程接管后无法继续
+            result['message'] = "密码未保存，进程重启后无法继续，请重新提交"
+            return result
+
+        try:
+            if kind == 'create':
+                created = service.create_email(item['username'], password)
+                result['email'] = f"{created['name']}@{created['domain_name']}"
+                result['message'] = "创建成功"
+            elif kind == 'delete':
+                service.delete_email(item['id'])
+                result['message'] = "删除成功"
+            elif kind in ('suspend', 'unsuspend'):
+                service.update_email(item['id'], {'suspended': int(kind == 'suspend')})
+                result['message'] = f"{JOB_KINDS[kind]}成功"
+            elif kind == 'reset_password':
+                service.update_email(item['id'], {'password': password})
+                result['password'] = REDACTED_PASSWORD
+                result['message'] = "密码已重置"
+            result['success'] = True
+        except Exception as e:
+            logger.warning(
+                "任务对象执行失败: %s", e,
+                extra={'site': service.site_name, 'kind': kind, 'target': item.get('email') or item.get('username') or item.get('id')}
+            )
+            result['message'] = str(e)
+        return result
@@ -0,0 +1,182 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 本地索引中保存的字段（与 /email 接口返回的字段对应）
+FIELDS = ('name', 'domain_name', 'n_emails', 'used_size', 'suspended')
+
+
+class MailboxStore:
+    """邮箱清单的本地持久化索引（SQLite）
+
+    作为 MailboxCache 的订阅者：每次上游全量快照只写入有变化的行，
+    新增/删除逐条写入，并记录每个邮箱的用量变化历史。
+    进程重启后可直接用索引中的数据预热缓存，无需冷启动拉取。
+    """
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._create_tables()
+
+    def _create_tables(self):
+        with self._lock, self._conn:
+            self._conn.executescript('''
+                CREATE TABLE IF NOT EXISTS mailboxes (
+                    id INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    domain_name TEXT NOT NULL,
+                    n_emails INTEGER NOT NULL DEFAULT 0,
+                    used_size INTEGER NOT NULL DEFAULT 0,
+                    suspended INTEGER NOT NULL DEFAULT 0,
+                    updated_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS usage_history (
+                    mailbox_id INTEGER NOT NULL,
+                    recorded_at REAL NOT NULL,
+                    n_emails INTEGER NOT NULL,
+                    used_size INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_usage_history_mailbox
+                    ON usage_history (mailbox_id, recorded_at);
+                CREATE TABLE IF NOT EXISTS sync_state (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                );
+            ''')
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    @staticmethod
+    def _to_values(record: dict) -> Tuple:
+        """将API记录转换为数据库字段值"""
+        return (
+            record['name'],
+            record['domain_name'],
+            int(record.get('n_emails') or 0),
+            int(record.get('used_size') or 0),
+            int(bool(record.get('suspended')))
+        )
+
+    def load(self) -> List[dict]:
+        """读取索引中的全部邮箱（字段格式与API返回一致）"""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, {', '.join(FIELDS)} FROM mailboxes ORDER BY id"
+            ).fetchall()
+        return [dict(zip(('id',) + FIELDS, row)) for row in rows]
+
+    def last_synced_at(self) -> Optional[float]:
+        """最近一次全量同步的时间"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM sync_state WHERE key = 'last_synced_at'"
+            ).fetchone()
+        return float(row[0]) if row else None
+
+    def sync(self, records: List[dict]) -> Dict[str, int]:
+        """将上游快照与索引比较，只写入新增、变化和删除的行
+
+        返回各类变更的数量 {'inserted': n, 'updated': n, 'deleted': n}
+        """
+        now = time.time()
+        incoming = {int(record['id']): self._to_values(record) for record in records}
+
+        with self._lock, self._conn:
+            stored = {
+                row[0]: tuple(row[1:])
+                for row in self._conn.execute(
+                    f"SELECT id, {', '.join(FIELDS)} FROM mailboxes"
+                )
+            }
+
+            inserted = [
+                (mailbox_id,) + values + (now,)
+                for mailbox_id, values in incoming.items()
+                if mailbox_id not in stored
+            ]
+            updated = [
+                values + (now, mailbox_id)
+                for mailbox_id, values in incoming.items()
+                if mailbox_id in stored and stored[mailbox_id] != values
+            ]
+            deleted = [(mailbox_id,) for mailbox_id in stored if mailbox_id not in incoming]
+
+            # 仅在用量变化时记录历史
+            history = [
+                (mailbox_id, now, values[2], values[3])
+                for mailbox_id, values in incoming.items()
+                if mailbox_id not in stored or stored[mailbox_id][2:4] != values[2:4]
+            ]
+
+            self._conn.executemany(
+                "INSERT INTO mailboxes (id, name, domain_name, n_emails, used_size, suspended, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                inserted
+            )
+            self._conn.executemany(
+                "UPDATE mailboxes SET name = ?, domain_name = ?, n_emails = ?, used_size = ?, "
+                "suspended = ?, updated_at = ? WHERE id = ?",
+                updated
+            )
+            self._conn.executemany("DELETE FROM mailboxes WHERE id = ?", deleted)
+            self._conn.executemany(
+                "INSERT INTO usage_history (mailbox_id, recorded_at, n_emails, used_size) "
+                "VALUES (?, ?, ?, ?)",
+                history
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sync_state (key, value) VALUES ('last_synced_at', ?)",
+                (str(now),)
+            )
+
+        return {'inserted': len(inserted), 'updated': len(updated), 'deleted': len(deleted)}
+
+    def upsert(self, record: dict):
+        """写入单个邮箱（新增或更新）"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO mailboxes "
+                "(id, name, domain_name, n_emails, used_size, suspended, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (int(record['id']),) + self._to_values(record) + (time.time(),)
+            )
+
+    def remove(self, mailbox_id):
+        """删除单个邮箱"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM mailboxes WHERE id = ?", (int(mailbox_id),))
+
+    def usage_history(self, mailbox_id) -> List[Tuple[float, int, int]]:
+        """邮箱的用量历史 [(记录时间, 邮件数量, 已用空间), ...]"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT recorded_at, n_emails, used_size FROM usage_history "
+                "WHERE mailbox_id = ? ORDER BY recorded_at",
+                (int(mailbox_id),)
+            ).fetchall()
+
+    # MailboxCache 订阅接口
+    def on_snapshot(self, records: List[dict]):
+        changes = self.sync(records)
+        if any(changes.values()):
+            logger.info("本地索引已同步", extra=changes)
+
+    def on_upsert(self, record: dict):
+        self.upsert(record)
+
+    def on_remove(self, record_id):
+        self.remove(record_id)
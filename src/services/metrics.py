@@ -0,0 +1,357 @@
+import abc
+import asyncio
+import functools
+import inspect
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, Optional, Tuple
+
+from services.structured_logging import current_request_id, request_context
+
+upstream_logger = logging.getLogger('services.upstream')
+handler_logger = logging.getLogger('ui.handlers')
+
+# 延迟直方图的默认分桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+INF_LABEL = 'le="+Inf"'
+
+
+def _escape_label(value) -> str:
+    """按 Prometheus 文本格式转义标签值中的反斜杠、双引号与换行"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _escape_help(text: str) -> str:
+    """HELP 行只转义反斜杠与换行"""
+    return text.replace('\\', '\\\\').replace('\n', '\\n')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    pairs = [
+        f'{name}="{_escape_label(value)}"'
+        for name, value in zip(names, values)
+    ]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Metric(abc.ABC):
+    type_name = ''
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, '')) for name in self.label_names)
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {_escape_help(self.documentation)}",
+            f"# TYPE {self.name} {self.type_name}"
+        ]
+        lines.extend(self._samples())
+        return '\n'.join(lines)
+
+    @abc.abstractmethod
+    def _samples(self) -> Iterable[str]:
+        """逐行输出样本（不含 HELP 与 TYPE 行）"""
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """单调递增计数器"""
+
+    type_name = 'counter'
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.label_names, key)} {value}"
+
+
+class Histogram(_Metric):
+    """累积分桶直方图"""
+
+    type_name = 'histogram'
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Iterable[str] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [各分桶计数..., 总数, 总和]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * len(self.buckets) + [0, 0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += 1
+            state[-1] += value
+
+    def time(self, **labels):
+        """计时上下文管理器"""
+        return _Timer(self, labels)
+
+    def _samples(self):
+        with self._lock:
+            items = sorted((key, list(state)) for key, state in self._values.items())
+        for key, state in items:
+            for bound, count in zip(self.buckets, state):
+                le = f'le="{bound}"'
+                yield f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {count}"
+            yield f"{self.name}_bucket{_format_labels(self.label_names, key, INF_LABEL)} {state[-2]}"
+            yield f"{self.name}_count{_format_labels(self.label_names, key)} {state[-2]}"
+            yield f"{self.name}_sum{_format_labels(self.label_names, key)} {state[-1]}"
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: Dict[str, str]):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class Registry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """以 Prometheus 文本格式输出全部指标"""
+        return '\n'.join(metric.render() for metric in self._metrics) + '\n'
+
+
+REGISTRY = Registry()
+
+UPSTREAM_LATENCY = REGISTRY.register(Histogram(
+    'sg_upstream_request_duration_seconds',
+    'SiteGround API request latency in seconds',
+    labels=('method', 'endpoint')
+))
+UPSTREAM_RESPONSES = REGISTRY.register(Counter(
+    'sg_upstream_responses_total',
+    'SiteGround API responses by HTTP status code (status="error" for transport errors)',
+    labels=('method', 'endpoint', 'status')
+))
+TOKEN_REFRESHES = REGISTRY.register(Counter(
+    'sg_token_refresh_total',
+    'Token refresh attempts by result',
+    labels=('result',)
+))
+TOKEN_REFRESH_LATENCY = REGISTRY.register(Histogram(
+    'sg_token_refresh_duration_seconds',
+    'Duration of the client_token -> site_token exchange in seconds'
+))
+CACHE_REQUESTS = REGISTRY.register(Counter(
+    'sg_cache_requests_total',
+    'Mailbox cache lookups by result (hit, revalidate, miss, coalesced, stale)',
+    labels=('result',)
+))
+HANDLER_LATENCY = REGISTRY.register(Histogram(
+    'sg_handler_duration_seconds',
+    'Gradio event handler latency in seconds',
+    labels=('handler',)
+))
+HANDLER_ERRORS = REGISTRY.register(Counter(
+    'sg_handler_errors_total',
+    'Gradio event handlers that raised an exception',
+    labels=('handler',)
+))
+
+VIEW_UPDATES = REGISTRY.register(Counter(
+    'sg_view_updates_total',
+    'UI component updates per session, sent or skipped because nothing changed',
+    labels=('component', 'result')
+))
+VIEW_ROW_CHANGES = REGISTRY.register(Counter(
+    'sg_view_row_changes_total',
+    'Table rows that changed between two renders of the same session view',
+    labels=('change',)
+))
+JOBS = REGISTRY.register(Counter(
+    'sg_jobs_total',
+    'Background jobs by kind and final status',
+    labels=('kind', 'status')
+))
+JOB_ITEMS = REGISTRY.register(Counter(
+    'sg_job_items_total',
+    'Items processed by background jobs by kind and result',
+    labels=('kind', 'result')
+))
+SHARED_FILLS = REGISTRY.register(Counter(
+    'sg_shared_fills_total',
+    'Mailbox list loads in multi-worker mode by how they were served '
+    '(fetched, reused, waited, fallback)',
+    labels=('result',)
+))
+SHARED_SYNCS = REGISTRY.register(Counter(
+    'sg_shared_syncs_total',
+    'State published by other workers and applied locally (token, snapshot, change)',
+    labels=('kind',)
+))
+JOB_QUEUE_WAIT = REGISTRY.register(Histogram(
+    'sg_job_queue_wait_seconds',
+    'Time a background job waited in the queue before a worker picked it up'
+))
+
+
+def endpoint_label(path: str) -> str:
+    """将API路径归一化为指标标签（去掉路径中的ID）"""
+    parts = [
+        '{id}' if part.isdigit() else part
+        for part in path.split('?', 1)[0].split('/')
+    ]
+    return '/'.join(parts) or '/'
+
+
+def observe_upstream(method: str, endpoint: str, status, duration: float):
+    """记录一次上游请求"""
+    UPSTREAM_LATENCY.observe(duration, method=method, endpoint=endpoint)
+    UPSTREAM_RESPONSES.inc(method=method, endpoint=endpoint, status=status)
+    upstream_logger.info(
+        "上游请求完成",
+        extra={'method': method, 'endpoint': endpoint, 'status': status, 'duration_ms': round(duration * 1000, 1)}
+    )
+
+
+def _observe_handler(label: str, start: float, failed: bool):
+    duration = time.perf_counter() - start
+    HANDLER_LATENCY.observe(duration, handler=label)
+    if failed:
+        HANDLER_ERRORS.inc(handler=label)
+    handler_logger.log(
+        logging.WARNING if failed else logging.INFO,
+        "事件处理失败" if failed else "事件处理完成",
+        extra={'handler': label, 'duration_ms': round(duration * 1000, 1)},
+        exc_info=failed
+    )
+
+
+def timed_handler(name: Optional[str] = None):
+    """为 Gradio 事件处理函数记录耗时与日志（同时支持同步、async 与 async 生成器函数）
+
+    每次调用分配一个请求ID（嵌套调用沿用外层的ID），期间的所有日志都带有该ID。
+    生成器函数记录的是到第一次输出的耗时（用户看到响应的时间），之后的流式输出不计入。
+    """
+    def decorator(func):
+        label = name or func.__name__
+
+        if inspect.isasyncgenfunction(func):
+            @functools.wraps(func)
+            async def async_gen_wrapper(*args, **kwargs):
+                with request_context(current_request_id()):
+                    start = time.perf_counter()
+                    observed = False
+                    try:
+                        async for value in func(*args, **kwargs):
+                            if not observed:
+                                observed = True
+                                _observe_handler(label, start, failed=False)
+                            yield value
+                    except Exception:
+                        if observed:
+                            # 已经记录过首次输出的耗时，这里只记录失败
+                            HANDLER_ERRORS.inc(handler=label)
+                            handler_logger.warning("事件处理失败", extra={'handler': label}, exc_info=True)
+                        else:
+                            _observe_handler(label, start, failed=True)
+                        raise
+                    if not observed:
+                        _observe_handler(label, start, failed=False)
+            return async_gen_wrapper
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with request_context(current_request_id()):
+                    start = time.perf_counter()
+                    try:
+                        result = await func(*args, **kwargs)
+                    except Exception:
+                        _observe_handler(label, start, failed=True)
+                        raise
+                    _observe_handler(label, start, failed=False)
+                    return result
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with request_context(current_request_id()):
+                start = time.perf_counter()
+                try:
+                    result = func(*args, **kwargs)
+                except Exception:
+                    _observe_handler(label, start, failed=True)
+                    raise
+                _observe_handler(label, start, failed=False)
+                return result
+        return wrapper
+
+    return decorator
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?', 1)[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # 抓取请求很频繁，不输出访问日志
+        pass
+
+
+def start_metrics_server(port: int = 9100, host: str = '0.0.0.0') -> ThreadingHTTPServer:
+    """在后台线程中启动 /metrics 端点"""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True)
+    thread.start()
+    return server
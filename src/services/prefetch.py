@@ -0,0 +1,109 @@
+import functools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Iterable, Optional
+
+from services.email_service import EmailService
+from services.structured_logging import request_context
+
+logger = logging.getLogger(__name__)
+
+
+class PrefetchScheduler:
+    """后台预取调度器
+
+    按固定间隔为每个站点刷新邮箱列表，并在令牌到期前提前续期，
+    使页面加载和刷新按钮始终由内存中的数据响应。
+    缓存过期但仍在 stale_ttl 窗口内时，读取方直接拿到旧数据，
+    并通过 trigger 请求调度器立即重新拉取（stale-while-revalidate）。
+    revalidate 为 False 时只按间隔同步（如未启用预取时的本地索引同步），不接管缓存过期后的读取。
+    """
+
+    def __init__(self, services: Iterable[EmailService], interval: float = 45, revalidate: bool = True):
+        self.services = list(services)
+        self.interval = interval
+        self.revalidate = revalidate
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopped.clear()
+        # 只有调度器运行时缓存才使用 stale-while-revalidate，否则过期即同步拉取
+        if self.revalidate:
+            for service in self.services:
+                service.cache.revalidator = functools.partial(self.trigger, service)
+        # 各站点并行刷新，慢站点不会推迟其他站点
+        self._pool = ThreadPoolExecutor(
+            max_workers=max(1, len(self.services)),
+            thread_name_prefix="prefetch"
+        )
+        self._thread = threading.Thread(
+            target=self._run,
+            name="prefetch-scheduler" if self.revalidate else "store-sync",
+            daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        if self.revalidate:
+            for service in self.services:
+                service.cache.revalidator = None
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+
+    def trigger(self, service: Optional[EmailService] = None):
+        """请求尽快刷新指定站点（未指定时刷新全部站点）"""
+        with self._lock:
+            self._pending.update([service] if service is not None else self.services)
+        self._wakeup.set()
+
+    def _run(self):
+        # 启动后立即执行第一轮，之后每 interval 秒一轮；trigger 可随时插入单个站点的刷新
+        due = 0.0
+        while not self._stopped.is_set():
+            now = time.monotonic()
+            with self._lock:
+                if now >= due:
+                    targets = list(self.services)
+                    due = now + self.interval
+                else:
+                    targets = [service for service in self.services if service in self._pending]
+                self._pending.clear()
+                self._wakeup.clear()
+
+            if targets:
+                wait([self._pool.submit(self._refresh, service) for service in targets])
+            self._wakeup.wait(max(0.0, due - time.monotonic()))
+
+    def _refresh(self, service: EmailService):
+        """续期令牌并重新拉取一个站点的邮箱列表"""
+        with request_context():
+            # 下一轮之前就会超过刷新阈值时，本轮提前续期
+            if service.token_age() > service.token_refresh_after - self.interval:
+                service.refresh_token()
+            loader = service._fetch_email_records
+            if service.shared is not None:
+                # 其他工作进程本轮已经拉取过时直接复用，各进程合计每轮只访问一次上游
+                loader = functools.partial(service.shared.load, loader, self.interval * 0.9)
+            try:
+                service.cache.get(loader, force=True)
+            except Exception as e:
+                logger.warning("后台预取邮箱列表失败: %s", e, extra={'site': service.site_name})
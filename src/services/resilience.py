@@ -0,0 +1,206 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+from services.metrics import REGISTRY, Counter
+
+T = TypeVar('T')
+
+logger = logging.getLogger(__name__)
+
+RETRIES = REGISTRY.register(Counter(
+    'sg_upstream_retries_total',
+    'SiteGround API calls retried after a retryable failure',
+    labels=('endpoint',)
+))
+BREAKER_REJECTIONS = REGISTRY.register(Counter(
+    'sg_circuit_breaker_rejections_total',
+    'SiteGround API calls rejected because the endpoint circuit breaker is open',
+    labels=('endpoint',)
+))
+
+
+class CircuitOpenError(Exception):
+    """熔断器处于打开状态，请求未发送"""
+
+
+class RetryableError(Exception):
+    """可重试的上游错误（429、5xx、连接失败等）
+
+    retry_after 为上游建议的等待秒数（来自 Retry-After 响应头）；
+    trip_breaker 为 False 时（如限流）不计入熔断器的失败次数。
+    """
+
+    def __init__(self, message: str, retry_after: Optional[float] = None, trip_breaker: bool = True):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.trip_breaker = trip_breaker
+
+
+class RetryPolicy:
+    """带抖动的指数退避重试策略"""
+
+    def __init__(self, max_retries: int = 3, base_delay: float = 0.5, max_delay: float = 8.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """第 attempt 次重试前的等待时间（full jitter）"""
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """单个接口的熔断器
+
+    连续失败达到 failure_threshold 次后打开，reset_timeout 秒内直接拒绝请求；
+    之后进入半开状态，只放行一个探测请求，成功则关闭，失败则重新打开。
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        """是否允许发送请求"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self._state = self.HALF_OPEN
+                self._probe_in_flight = False
+            # 半开状态只放行一个探测请求
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    logger.warning("熔断器打开：连续失败 %d 次", self._failures)
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+    def release(self):
+        """请求以非上游故障的方式结束（如业务错误），释放半开状态的探测名额"""
+        with self._lock:
+            self._probe_in_flight = False
+
+
+class RequestExecutor:
+    """所有SiteGround API调用的统一执行器
+
+    - 对可重试错误（RetryableError）按策略退避重试，重试次数有上限
+    - 每个接口一个熔断器，熔断期间直接抛出 CircuitOpenError，由调用方降级（如返回过期缓存）
+    """
+
+    def __init__(
+        self,
+        policy: Optional[RetryPolicy] = None,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30
+    ):
+        self.policy = policy or RetryPolicy()
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def breaker(self, endpoint: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(endpoint)
+            if breaker is None:
+                breaker = self._breakers[endpoint] = CircuitBreaker(
+                    self.failure_threshold, self.reset_timeout
+                )
+            return breaker
+
+    def _before_attempt(self, endpoint: str) -> CircuitBreaker:
+        breaker = self.breaker(endpoint)
+        if not breaker.allow():
+            BREAKER_REJECTIONS.inc(endpoint=endpoint)
+            raise CircuitOpenError(f"{endpoint} 暂时不可用（熔断中），请稍后重试")
+        return breaker
+
+    def _after_failure(self, endpoint: str, breaker: CircuitBreaker, error: BaseException, attempt: int) -> float:
+        """记录失败并返回重试前的等待时间；不再重试时重新抛出异常"""
+        if getattr(error, 'trip_breaker', True):
+            breaker.record_failure()
+        else:
+            breaker.release()
+        if attempt >= self.policy.max_retries:
+            raise error
+        RETRIES.inc(endpoint=endpoint)
+        delay = self.policy.delay(attempt, getattr(error, 'retry_after', None))
+        logger.info(
+            "%s 调用失败（%s），%.2f 秒后第 %d 次重试", endpoint, error, delay, attempt + 1,
+            extra={'endpoint': endpoint, 'attempt': attempt + 1, 'delay': round(delay, 3)}
+        )
+        return delay
+
+    def execute(self, endpoint: str, func: Callable[[], T]) -> T:
+        """同步执行一次API调用"""
+        attempt = 0
+        while True:
+            breaker = self._before_attempt(endpoint)
+            try:
+                result = func()
+            except RetryableError as e:
+                time.sleep(self._after_failure(endpoint, breaker, e, attempt))
+                attempt += 1
+                continue
+            except BaseException:
+                breaker.release()
+                raise
+            breaker.record_success()
+            return result
+
+    async def execute_async(self, endpoint: str, func: Callable[[], Awaitable[T]]) -> T:
+        """异步执行一次API调用"""
+        attempt = 0
+        while True:
+            breaker = self._before_attempt(endpoint)
+            try:
+                result = await func()
+            except RetryableError as e:
+                await asyncio.sleep(self._after_failure(endpoint, breaker, e, attempt))
+                attempt += 1
+                continue
+            except BaseException:
+                breaker.release()
+                raise
+            breaker.record_success()
+            return result
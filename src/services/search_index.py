@@ -0,0 +1,281 @@
+import bisect
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Set, Tuple
+
+# 查询中表示状态筛选的词（其余部分按邮件地址匹配）
+STATUS_WORDS = {
+    '停用': True,
+    '已停用': True,
+    'suspended': True,
+    '正常': False,
+    'active': False
+}
+
+# 模糊匹配的最低相似度（查询的三元组中出现在用户名里的比例）
+FUZZY_THRESHOLD = 0.5
+
+# 覆盖超过该比例邮箱的三元组区分度太低，模糊匹配时忽略
+COMMON_TRIGRAM_RATIO = 0.5
+
+# 三元组相似度不足时按编辑距离兜底：关键字每 4 个字符允许一处编辑（至少一处）
+FUZZY_EDIT_CHARS = 4
+
+
+def _trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _prefix_edit_distance(query: str, name: str, limit: int) -> int:
+    """query 与 name 的某个前缀之间的最小编辑距离（增、删、改、相邻交换各算一次）
+
+    超过 limit 时提前结束并返回 limit + 1。
+    """
+    # rows[i][j]: query[:i] 与 name[:j] 的编辑距离，逐行计算，只保留最近两行
+    before, previous = None, list(range(len(name) + 1))
+    for i in range(1, len(query) + 1):
+        current = [i] + [0] * len(name)
+        for j in range(1, len(name) + 1):
+            cost = query[i - 1] != name[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and query[i - 1] == name[j - 2] and query[i - 2] == name[j - 1]:
+                current[j] = min(current[j], before[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        before, previous = previous, current
+    return min(previous)
+
+
+class MailboxSearchIndex:
+    """邮箱的内存搜索索引（邮件地址、用户名、状态）
+
+    作为 MailboxCache 的订阅者增量维护：全量快照只更新有变化的邮箱，新增/删除逐条更新。
+    - 前缀：按用户名排序的列表上二分查找
+    - 子串：用户名三元组倒排表求交集后校验
+    - 模糊：按查询三元组的命中比例排序，比例不足时按编辑距离兜底，容忍输入错误
+    - 域名：按域名排序的列表上二分查找前缀，域名三元组倒排表查找子串
+    - 状态：停用邮箱单独维护集合
+    只有状态词或域名的查询，匹配的邮箱不到一半时只对匹配集合排序；
+    否则（如单域名站点按域名筛选）按用户名顺序遍历，凑够 limit 个即停止。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # 邮箱ID -> 原始记录
+        self._records: Dict[str, dict] = {}
+        # 按 (用户名, ID) 排序，用于前缀查找
+        self._names: List[Tuple[str, str]] = []
+        # 三元组 -> 用户名包含该三元组的邮箱ID
+        self._trigrams: Dict[str, Set[str]] = {}
+        # 域名 -> 邮箱ID
+        self._domains: Dict[str, Set[str]] = {}
+        # 排序后的域名，用于域名前缀查找
+        self._domain_names: List[str] = []
+        # 三元组 -> 包含该三元组的域名，用于域名子串查找
+        self._domain_trigrams: Dict[str, Set[str]] = {}
+        self._suspended: Set[str] = set()
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    @staticmethod
+    def _fields(record: dict) -> Tuple[str, str, bool]:
+        return record['name'].lower(), record['domain_name'].lower(), bool(record.get('suspended'))
+
+    def _add(self, key: str, record: dict):
+        name, domain, suspended = self._fields(record)
+        self._records[key] = record
+        bisect.insort(self._names, (name, key))
+        for trigram in _trigrams(name):
+            self._trigrams.setdefault(trigram, set()).add(key)
+        if domain not in self._domains:
+            self._domains[domain] = set()
+            bisect.insort(self._domain_names, domain)
+            for trigram in _trigrams(domain):
+                self._domain_trigrams.setdefault(trigram, set()).add(domain)
+        self._domains[domain].add(key)
+        if suspended:
+            self._suspended.add(key)
+
+    def _remove(self, key: str):
+        record = self._records.pop(key, None)
+        if record is None:
+            return
+        name, domain, _ = self._fields(record)
+        index = bisect.bisect_left(self._names, (name, key))
+        if index < len(self._names) and self._names[index] == (name, key):
+            del self._names[index]
+        for trigram in _trigrams(name):
+            postings = self._trigrams.get(trigram)
+            if postings is not None:
+                postings.discard(key)
+                if not postings:
+                    del self._trigrams[trigram]
+        postings = self._domains.get(domain)
+        if postings is not None:
+            postings.discard(key)
+            if not postings:
+                del self._domains[domain]
+                del self._domain_names[bisect.bisect_left(self._domain_names, domain)]
+                for trigram in _trigrams(domain):
+                    domains = self._domain_trigrams[trigram]
+                    domains.discard(domain)
+                    if not domains:
+                        del self._domain_trigrams[trigram]
+        self._suspended.discard(key)
+
+    def _replace(self, key: str, record: dict):
+        previous = self._records.get(key)
+        if previous is not None and self._fields(previous) == self._fields(record):
+            # 只有用量等非索引字段变化：只替换记录
+            self._records[key] = record
+            return
+        self._remove(key)
+        self._add(key, record)
+
+    # MailboxCache 订阅接口
+    def on_snapshot(self, records: List[dict]):
+        incoming = {str(record['id']): record for record in records}
+        with self._lock:
+            for key in [key for key in self._records if key not in incoming]:
+                self._remove(key)
+            for key, record in incoming.items():
+                self._replace(key, record)
+
+    def on_upsert(self, record: dict):
+        with self._lock:
+            self._replace(str(record['id']), record)
+
+    def on_remove(self, record_id):
+        with self._lock:
+            self._remove(str(record_id))
+
+    @staticmethod
+    def parse_query(query: str) -> Tuple[str, Optional[bool]]:
+        """拆分查询中的状态词，返回 (地址关键字, 是否停用；None 表示不筛选)"""
+        status = None
+        terms = []
+        for term in (query or '').lower().split():
+            if term in STATUS_WORDS:
+                status = STATUS_WORDS[term]
+            else:
+                terms.append(term)
+        return ' '.join(terms), status
+
+    def search(self, query: str, limit: Optional[int] = None, fuzzy: bool = True) -> List[dict]:
+        """按相关度返回匹配的邮箱记录
+
+        排序依次为：地址或用户名完全一致、用户名前缀、子串（含域名）、模糊匹配。
+        查询中可包含状态词（如 "停用 shop"）；少于3个字符的关键字只做前缀匹配。
+        """
+        keyword, status = self.parse_query(query)
+        with self._lock:
+            ranked = self._match(keyword, status, limit, fuzzy)
+            return [self._records[key] for key in ranked[:limit]]
+
+    def _domains_with_prefix(self, prefix: str) -> List[str]:
+        index = bisect.bisect_left(self._domain_names, prefix)
+        domains = []
+        while index < len(self._domain_names) and self._domain_names[index].startswith(prefix):
+            domains.append(self._domain_names[index])
+            index += 1
+        return domains
+
+    @staticmethod
+    def _trigrams_match(index: Dict[str, Set[str]], trigrams: Set[str]) -> Set[str]:
+        """所有三元组都命中的候选（仍需校验是否真的包含关键字）"""
+        postings = sorted((index.get(t, set()) for t in trigrams), key=len)
+        return set.intersection(*postings) if postings and postings[0] else set()
+
+    def _match(self, keyword: str, status: Optional[bool], limit: Optional[int], fuzzy: bool) -> List[str]:
+        local, _, domain = keyword.partition('@')
+        domain_keys = None
+        if domain:
+            # 带 @ 时域名部分按前缀匹配
+            domain_keys = set().union(*(self._domains[name] for name in self._domains_with_prefix(domain)))
+
+        ranked: List[str] = []
+        seen: Set[str] = set()
+
+        def add(keys):
+            for key in keys:
+                if (
+                    key not in seen
+                    and (domain_keys is None or key in domain_keys)
+                    and (status is None or (key in self._suspended) == status)
+                ):
+                    seen.add(key)
+                    ranked.append(key)
+
+        def full() -> bool:
+            return limit is not None and len(ranked) >= limit
+
+        if not local:
+            # 只有状态词或只有域名：按用户名顺序列出
+            subsets = [keys for keys in (domain_keys, self._suspended if status else None) if keys is not None]
+            smallest = min(subsets, key=len) if subsets else None
+            if smallest is not None and len(smallest) * 2 < len(self._records):
+                add(sorted(smallest, key=lambda key: (self._records[key]['name'].lower(), key)))
+                return ranked
+            for _, key in self._names:
+                if full():
+                    break
+                add((key,))
+            return ranked
+
+        # 前缀（按用户名排序，完全一致的自然排在最前）
+        index = bisect.bisect_left(self._names, (local, ''))
+        while index < len(self._names) and not full():
+            name, key = self._names[index]
+            if not name.startswith(local):
+                break
+            add((key,))
+            index += 1
+
+        if len(local) < 3 or full():
+            return ranked
+
+        # 子串：所有三元组都命中的邮箱再校验一次
+        trigrams = _trigrams(local)
+        candidates = self._trigrams_match(self._trigrams, trigrams)
+        add(sorted(
+            (key for key in candidates if local in self._records[key]['name'].lower()),
+            key=lambda key: self._records[key]['name']
+        ))
+        # 关键字是域名的一部分时，该域名下的邮箱都匹配
+        if domain_keys is None:
+            domains = sorted(self._trigrams_match(self._domain_trigrams, trigrams))
+            for name in domains:
+                if local in name:
+                    add(sorted(self._domains[name], key=lambda key: self._records[key]['name']))
+
+        if not fuzzy or full():
+            return ranked
+
+        # 模糊：按查询三元组的命中比例排序（忽略几乎所有邮箱都有的三元组）
+        common = COMMON_TRIGRAM_RATIO * len(self._records)
+        informative = [t for t in trigrams if len(self._trigrams.get(t, ())) <= common] or list(trigrams)
+        counts = Counter()
+        for trigram in informative:
+            counts.update(self._trigrams.get(trigram, ()))
+        add(
+            key for key, count in sorted(
+                counts.items(),
+                key=lambda item: (-item[1], self._records[item[0]]['name'])
+            )
+            if count / len(informative) >= FUZZY_THRESHOLD
+        )
+        if full():
+            return ranked
+
+        # 编辑距离兜底：短用户名中的一处输入错误会破坏大部分三元组（如 "yamda" 与 "yamada"），
+        # 对至少命中一个三元组的其余邮箱，比较关键字与用户名前缀的编辑距离
+        max_edits = max(1, len(local) // FUZZY_EDIT_CHARS)
+        distances = {}
+        for key in counts:
+            if key not in seen:
+                distance = _prefix_edit_distance(local, self._records[key]['name'].lower(), max_edits)
+                if distance <= max_edits:
+                    distances[key] = distance
+        add(sorted(distances, key=lambda key: (distances[key], self._records[key]['name'])))
+        return ranked
@@ -0,0 +1,577 @@
+import abc
+import asyncio
+import contextlib
+import copy
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from services.metrics import SHARED_FILLS, SHARED_SYNCS
+
+logger = logging.getLogger(__name__)
+
+
+def new_owner_id() -> str:
+    """当前进程在共享状态中的标识（主机名:进程号:随机后缀）"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class SharedState(abc.ABC):
+    """跨工作进程共享的状态后端
+
+    - 带版本号的键值（令牌、邮箱列表快照）
+    - 带有效期的租约（同一时刻只有一个进程刷新令牌或拉取列表，持有者崩溃后租约自动过期）
+    - 按流追加的增量变更（邮箱的新增/删除）
+    值需可以序列化为JSON。
+    """
+
+    def __init__(self, owner: Optional[str] = None):
+        self.owner = owner or new_owner_id()
+
+    @abc.abstractmethod
+    def info(self, key: str) -> Optional[Tuple[int, float]]:
+        """键的 (版本号, 更新时间)，不存在时返回 None"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get(self, key: str) -> Optional[Tuple[Any, int, float]]:
+        """键的 (值, 版本号, 更新时间)，不存在时返回 None"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def put(self, key: str, value: Any) -> int:
+        """写入值并返回新的版本号"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def acquire(self, name: str, ttl: float) -> bool:
+        """获取租约（已由本进程持有时续期），被其他进程持有且未过期时返回 False"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def release(self, name: str):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def held(self, name: str) -> bool:
+        """租约当前是否被某个进程持有（未过期）"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def append(self, stream: str, value: Any) -> int:
+        """追加一条变更并返回其序号（全局递增）"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def read(self, stream: str, after: int) -> List[Tuple[int, Any]]:
+        """序号大于 after 的变更，按序号排列"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def last_seq(self, stream: str) -> int:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def trim(self, stream: str, up_to: int):
+        """删除序号不大于 up_to 的变更"""
+        raise NotImplementedError
+
+    @contextlib.contextmanager
+    def lease(self, name: str, ttl: float):
+        """尝试获取租约，with 块内得到是否获取成功，退出时释放"""
+        acquired = self.acquire(name, ttl)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                self.release(name)
+
+
+class LocalSharedState(SharedState):
+    """进程内的共享状态实现（单进程开发调试时代替 SQLite 后端，行为一致）"""
+
+    def __init__(self, owner: Optional[str] = None):
+        super().__init__(owner)
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Tuple[Any, int, float]] = {}
+        self._leases: Dict[str, Tuple[str, float]] = {}
+        self._streams: Dict[str, List[Tuple[int, Any]]] = {}
+        self._seq = 0
+
+    def info(self, key: str) -> Optional[Tuple[int, float]]:
+        with self._lock:
+            entry = self._entries.get(key)
+        return None if entry is None else entry[1:]
+
+    def get(self, key: str) -> Optional[Tuple[Any, int, float]]:
+        with self._lock:
+            entry = self._entries.get(key)
+        return None if entry is None else (copy.deepcopy(entry[0]),) + entry[1:]
+
+    def put(self, key: str, value: Any) -> int:
+        value = copy.deepcopy(value)
+        with self._lock:
+            version = self._entries[key][1] + 1 if key in self._entries else 1
+            self._entries[key] = (value, version, time.time())
+        return version
+
+    def acquire(self, name: str, ttl: float) -> bool:
+        now = time.time()
+        with self._lock:
+            holder = self._leases.get(name)
+            if holder is not None and holder[0] != self.owner and holder[1] > now:
+                return False
+            self._leases[name] = (self.owner, now + ttl)
+            return True
+
+    def release(self, name: str):
+        with self._lock:
+            holder = self._leases.get(name)
+            if holder is not None and holder[0] == self.owner:
+                del self._leases[name]
+
+    def held(self, name: str) -> bool:
+        with self._lock:
+            holder = self._leases.get(name)
+        return holder is not None and holder[1] > time.time()
+
+    def append(self, stream: str, value: Any) -> int:
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._seq += 1
+            self._streams.setdefault(stream, []).append((self._seq, value))
+            return self._seq
+
+    def read(self, stream: str, after: int) -> List[Tuple[int, Any]]:
+        with self._lock:
+            changes = [change for change in self._streams.get(stream, []) if change[0] > after]
+        return copy.deepcopy(changes)
+
+    def last_seq(self, stream: str) -> int:
+        with self._lock:
+            changes = self._streams.get(stream)
+            return changes[-1][0] if changes else 0
+
+    def trim(self, stream: str, up_to: int):
+        with self._lock:
+            if stream in self._streams:
+                self._streams[stream] = [change for change in self._streams[stream] if change[0] > up_to]
+
+
+class SQLiteSharedState(SharedState):
+    """基于 SQLite 的共享状态（多个工作进程打开同一个数据库文件）
+
+    数据库文件需位于所有工作进程都能访问的本地磁盘或共享卷上（WAL 模式不支持网络文件系统）。
+    其中保存了站点令牌，应与 auth.json 一样妥善保管。
+    """
+
+    def __init__(self, path: str, owner: Optional[str] = None):
+        super().__init__(owner)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        # 自动提交模式，需要原子读写时显式开启 IMMEDIATE 事务
+        self._conn = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._create_tables()
+
+    def _create_tables(self):
+        with self._lock:
+            self._conn.executescript('''
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    version INTEGER NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS leases (
+                    name TEXT PRIMARY KEY,
+                    owner TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS changes (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    stream TEXT NOT NULL,
+                    value TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_changes_stream ON changes (stream, seq);
+            ''')
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+
+    def _query(self, sql: str, params: Tuple = ()) -> List[Tuple]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def info(self, key: str) -> Optional[Tuple[int, float]]:
+        rows = self._query("SELECT version, updated_at FROM entries WHERE key = ?", (key,))
+        return tuple(rows[0]) if rows else None
+
+    def get(self, key: str) -> Optional[Tuple[Any, int, float]]:
+        rows = self._query("SELECT value, version, updated_at FROM entries WHERE key = ?", (key,))
+        if not rows:
+            return None
+        value, version, updated_at = rows[0]
+        return json.loads(value), version, updated_at
+
+    def put(self, key: str, value: Any) -> int:
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO entries (key, value, version, updated_at) VALUES (?, ?, 1, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value, "
+                "version = entries.version + 1, updated_at = excluded.updated_at",
+                (key, json.dumps(value, ensure_ascii=False), time.time())
+            )
+            return conn.execute("SELECT version FROM entries WHERE key = ?", (key,)).fetchone()[0]
+
+    def acquire(self, name: str, ttl: float) -> bool:
+        now = time.time()
+        with self._transaction() as conn:
+            # 租约不存在、已过期或本来就由本进程持有时写入，否则不修改任何行
+            cursor = conn.execute(
+                "INSERT INTO leases (name, owner, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+                "WHERE leases.expires_at < ? OR leases.owner = ?",
+                (name, self.owner, now + ttl, now, self.owner)
+            )
+            return cursor.rowcount == 1
+
+    def release(self, name: str):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, self.owner))
+
+    def held(self, name: str) -> bool:
+        rows = self._query(
+            "SELECT 1 FROM leases WHERE name = ? AND expires_at > ?",
+            (name, time.time())
+        )
+        return bool(rows)
+
+    def append(self, stream: str, value: Any) -> int:
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "INSERT INTO changes (stream, value) VALUES (?, ?)",
+                (stream, json.dumps(value, ensure_ascii=False))
+            )
+            return cursor.lastrowid
+
+    def read(self, stream: str, after: int) -> List[Tuple[int, Any]]:
+        rows = self._query(
+            "SELECT seq, value FROM changes WHERE stream = ? AND seq > ? ORDER BY seq",
+            (stream, after)
+        )
+        return [(seq, json.loads(value)) for seq, value in rows]
+
+    def last_seq(self, stream: str) -> int:
+        rows = self._query("SELECT COALESCE(MAX(seq), 0) FROM changes WHERE stream = ?", (stream,))
+        return rows[0][0]
+
+    def trim(self, stream: str, up_to: int):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM changes WHERE stream = ? AND seq <= ?", (stream, up_to))
+
+
+class SharedSite:
+    """一个站点在各工作进程之间共享的令牌与邮箱列表
+
+    - 令牌：刷新在跨进程租约内进行，新令牌发布后其他进程直接使用，不会各自重复刷新
+    - 邮箱列表：其他进程刚发布的列表直接复用；需要拉取时只有持有租约的进程访问上游，其余进程等待其发布
+    - 新增/删除：作为增量变更发布，其他进程由同步线程应用到各自的缓存（及本地索引、搜索索引）
+    """
+
+    def __init__(self, service, state: SharedState, lease_ttl: float = 30, fill_window: float = 5):
+        self.service = service
+        self.state = state
+        self.lease_ttl = lease_ttl
+        # 手动刷新时，其他进程在该秒数内刚拉取的列表直接复用
+        self.fill_window = fill_window
+        site = service.site_name
+        self.token_key = f"token:{site}"
+        self.mailboxes_key = f"mailboxes:{site}"
+        self.fill_lease = f"fill:{site}"
+        # 本进程已经应用（或自己发布）的共享版本
+        self._token_version = 0
+        self._snapshot_version = 0
+        self._seq = 0
+        # 本进程发布、尚未被同步线程读到的变更序号（读到时跳过，不再重复应用）
+        self._own_seqs: Set[int] = set()
+        self._lock = threading.Lock()
+        # 正在应用其他进程的变更时不再重新发布
+        self._applying = threading.local()
+        service.cache.subscribe(self)
+
+    # 令牌
+    def adopt_token(self) -> bool:
+        """其他进程发布了更新的令牌时切换到该令牌，返回是否切换"""
+        entry = self.state.get(self.token_key)
+        if entry is None:
+            return False
+        value, version, _ = entry
+        if version == self._token_version:
+            return False
+        self._token_version = version
+        if value['refreshed_at'] <= self.service._token_refreshed_at:
+            return False
+        self.service._apply_token(value['api_token'], value['refreshed_at'])
+        SHARED_SYNCS.inc(kind='token')
+        logger.info("已使用其他工作进程刷新的令牌", extra={'site': self.service.site_name})
+        return True
+
+    def publish_token(self, token: str, refreshed_at: float):
+        self._token_version = self.state.put(self.token_key, {'api_token': token, 'refreshed_at': refreshed_at})
+
+    def exchange_token(self, exchange: Callable[[], bool]) -> bool:
+        """在跨进程租约内执行令牌交换；其他进程正在刷新时等待其发布新令牌"""
+        with self.state.lease(self.token_key, self.lease_ttl) as acquired:
+            if acquired:
+                # 获得租约之前其他进程可能刚完成刷新
+                if self.adopt_token():
+                    return True
+                return exchange()
+
+        deadline = time.monotonic() + self.lease_ttl
+        while time.monotonic() < deadline:
+            time.sleep(0.1)
+            if self.adopt_token():
+                return True
+            if not self.state.held(self.token_key):
+                # 持有者已结束但没有发布新令牌（刷新失败）
+                break
+        return self.adopt_token()
+
+    # 邮箱列表
+    def _apply_changes(self, records: List[dict], after: int) -> Tuple[List[dict], int]:
+        """将序号大于 after 的增量变更应用到快照上，返回 (记录, 最后一条变更的序号)"""
+        changes = self.state.read(self.mailboxes_key, after)
+        if not changes:
+            return records, after
+        by_id = {str(record['id']): record for record in records}
+        for seq, change in changes:
+            if change['op'] == 'upsert':
+                by_id[str(change['record']['id'])] = change['record']
+            else:
+                by_id.pop(str(change['id']), None)
+            after = seq
+        return list(by_id.values()), after
+
+    def _snapshot(self, max_age: float) -> Optional[List[dict]]:
+        """max_age 秒内发布的共享列表（已应用其后的增量变更），没有时返回 None"""
+        info = self.state.info(self.mailboxes_key)
+        if info is None or time.time() - info[1] > max_age:
+            return None
+        entry = self.state.get(self.mailboxes_key)
+        if entry is None:
+            return None
+        value, version, _ = entry
+        records, seq = self._apply_changes(value['records'], value['base_seq'])
+        with self._lock:
+            self._snapshot_version = version
+            self._advance(seq)
+        return records
+
+    def _advance(self, seq: int):
+        """将已应用的变更序号设为 seq（需持有 _lock），其前的本进程变更不再需要跳过"""
+        self._seq = seq
+        self._own_seqs = {own for own in self._own_seqs if own > seq}
+
+    def _publish(self, records: List[dict], base_seq: int):
+        version = self.state.put(self.mailboxes_key, {'records': records, 'base_seq': base_seq})
+        # 拉取开始前的变更已包含在上游数据中
+        self.state.trim(self.mailboxes_key, base_seq)
+        with self._lock:
+            self._snapshot_version = version
+            # 拉取期间其他进程的变更需要重新应用到新快照上（由同步线程完成）
+            self._advance(base_seq)
+
+    def load(self, fetch: Callable[[], List[dict]], max_age: float) -> List[dict]:
+        """获取邮箱列表：max_age 秒内其他进程发布的列表直接复用，否则由持有租约的进程拉取并发布"""
+        records = self._snapshot(max_age)
+        if records is not None:
+            SHARED_FILLS.inc(result='reused')
+            return records
+
+        with self.state.lease(self.fill_lease, self.lease_ttl) as acquired:
+            if acquired:
+                records = self._snapshot(max_age)
+                if records is not None:
+                    SHARED_FILLS.inc(result='reused')
+                    return records
+                base_seq = self.state.last_seq(self.mailboxes_key)
+                records = fetch()
+                self._publish(records, base_seq)
+                SHARED_FILLS.inc(result='fetched')
+                return records
+
+        # 其他进程正在拉取：等待其发布，超时或对方失败时自行拉取
+        deadline = time.monotonic() + self.lease_ttl
+        while self.state.held(self.fill_lease) and time.monotonic() < deadline:
+            time.sleep(0.1)
+        records = self._snapshot(max_age)
+        if records is not None:
+            SHARED_FILLS.inc(result='waited')
+            return records
+        SHARED_FILLS.inc(result='fallback')
+        return fetch()
+
+    async def aload(self, fetch: Callable[[], Awaitable[List[dict]]], max_age: float) -> List[dict]:
+        """load 的异步版本（数据库访问在线程中执行，不阻塞事件循环）"""
+        records = await asyncio.to_thread(self._snapshot, max_age)
+        if records is not None:
+            SHARED_FILLS.inc(result='reused')
+            return records
+
+        if await asyncio.to_thread(self.state.acquire, self.fill_lease, self.lease_ttl):
+            try:
+                records = await asyncio.to_thread(self._snapshot, max_age)
+                if records is not None:
+                    SHARED_FILLS.inc(result='reused')
+                    return records
+                base_seq = await asyncio.to_thread(self.state.last_seq, self.mailboxes_key)
+                records = await fetch()
+                await asyncio.to_thread(self._publish, records, base_seq)
+                SHARED_FILLS.inc(result='fetched')
+                return records
+            finally:
+                await asyncio.to_thread(self.state.release, self.fill_lease)
+
+        deadline = time.monotonic() + self.lease_ttl
+        while await asyncio.to_thread(self.state.held, self.fill_lease) and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        records = await asyncio.to_thread(self._snapshot, max_age)
+        if records is not None:
+            SHARED_FILLS.inc(result='waited')
+            return records
+        SHARED_FILLS.inc(result='fallback')
+        return await fetch()
+
+    # MailboxCache 订阅接口：本进程的新增/删除发布给其他进程（全量快照在 load 中发布）
+    def on_snapshot(self, records: List[dict]):
+        pass
+
+    def on_upsert(self, record: dict):
+        if not getattr(self._applying, 'active', False):
+            self._append({'op': 'upsert', 'record': record})
+
+    def on_remove(self, record_id):
+        if not getattr(self._applying, 'active', False):
+            self._append({'op': 'remove', 'id': str(record_id)})
+
+    def _append(self, change: dict):
+        """发布本进程的变更并记下其序号（与同步线程的读取互斥，保证读到时已记下）"""
+        with self._lock:
+            self._own_seqs.add(self.state.append(self.mailboxes_key, change))
+
+    @contextlib.contextmanager
+    def _applying_remote(self):
+        self._applying.active = True
+        try:
+            yield
+        finally:
+            self._applying.active = False
+
+    def sync(self):
+        """应用其他进程发布的令牌、列表快照与增量变更（由同步线程定期调用）"""
+        self.adopt_token()
+        cache = self.service.cache
+
+        info = self.state.info(self.mailboxes_key)
+        with self._lock:
+            snapshot_changed = info is not None and info[0] != self._snapshot_version
+            seq = self._seq
+        if snapshot_changed:
+            entry = self.state.get(self.mailboxes_key)
+            value, version, updated_at = entry
+            records, seq = self._apply_changes(value['records'], value['base_seq'])
+            with self._lock:
+                self._snapshot_version = version
+                self._advance(seq)
+            # 过旧的快照（如上次运行留下的）不安装，由正常的拉取流程获取
+            if time.time() - updated_at <= cache.ttl:
+                with self._applying_remote():
+                    cache.put(records)
+                SHARED_SYNCS.inc(kind='snapshot')
+            return
+
+        changes = self.state.read(self.mailboxes_key, seq)
+        if not changes:
+            return
+        # 本进程自己的变更已在发布前应用到缓存，跳过以免重复写入和触发整表重新推送
+        with self._lock:
+            remote = [(seq, change) for seq, change in changes if seq not in self._own_seqs]
+            self._own_seqs.difference_update(seq for seq, _ in changes)
+        if remote:
+            with self._applying_remote():
+                for _, change in remote:
+                    if change['op'] == 'upsert':
+                        cache.upsert(change['record'])
+                    else:
+                        cache.remove(change['id'])
+            SHARED_SYNCS.inc(len(remote), kind='change')
+        with self._lock:
+            self._seq = max(self._seq, changes[-1][0])
+
+
+class SharedStateSync:
+    """同步线程：按间隔将其他工作进程发布的令牌、列表与变更应用到本进程"""
+
+    def __init__(self, sites: Iterable[SharedSite], interval: float = 1):
+        self.sites = list(sites)
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread is not None or not self.sites:
+            return
+        self._thread = threading.Thread(target=self._run, name="shared-state-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            for site in self.sites:
+                try:
+                    site.sync()
+                except Exception as e:
+                    logger.warning("同步共享状态失败: %s", e, extra={'site': site.service.site_name})
+
+
+def open_shared_state(config: Optional[dict] = None, workers: int = 1) -> Optional[SharedState]:
+    """按 shared_state 配置创建后端；单进程且未启用时返回 None（不做跨进程协调）"""
+    config = config or {}
+    backend = config.get('backend', 'none')
+    if workers > 1 and backend != 'sqlite':
+        logger.warning("多进程部署需要跨进程共享状态，已改用 sqlite 后端", extra={'configured': backend})
+        backend = 'sqlite'
+    if backend == 'sqlite':
+        return SQLiteSharedState(config.get('path', os.path.join('config', 'shared.db')))
+    if backend == 'local':
+        return LocalSharedState()
+    return None
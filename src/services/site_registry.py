@@ -0,0 +1,140 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from services.async_email_service import AsyncEmailService
+from services.config_store import ConfigStore, get_config_store
+from services.email_service import EmailService, load_sites
+from services.jobs import JobManager, JobStore
+from services.prefetch import PrefetchScheduler
+from services.shared_state import SharedState, SharedStateSync
+
+logger = logging.getLogger(__name__)
+
+
+class SiteRegistry:
+    """多站点注册表
+
+    每个站点一个独立的服务实例（各自的令牌生命周期、缓存与本地索引），
+    配置与 auth.json 由 ConfigStore 只加载一次并在站点间共享。
+    shared_state 不为空时（多进程部署），各站点的令牌、邮箱列表与任务在工作进程之间共享。
+    """
+
+    def __init__(
+        self,
+        config_store: Optional[ConfigStore] = None,
+        shared_state: Optional[SharedState] = None
+    ):
+        self.config_store = config_store or get_config_store()
+        config = self.config_store.config
+        self.sites = load_sites(config)
+        self.default_site = self.sites[0]['name']
+
+        multi_site_config = config.get('multi_site') or {}
+        self.fanout_timeout = multi_site_config.get('timeout', 5)
+
+        self.services: Dict[str, AsyncEmailService] = {
+            site['name']: AsyncEmailService(EmailService(site, self.config_store, shared_state))
+            for site in self.sites
+        }
+
+        # 多进程部署：定期应用其他工作进程发布的令牌、列表与变更
+        self.shared_sync = None
+        if shared_state is not None:
+            self.shared_sync = SharedStateSync(
+                (service.service.shared for service in self.services.values()),
+                interval=(config.get('shared_state') or {}).get('poll_interval', 1)
+            )
+
+        prefetch_config = config.get('prefetch') or {}
+        self.prefetch_enabled = prefetch_config.get('enabled', True)
+        self.push_interval = prefetch_config.get('push_interval', 5)
+        self.prefetcher = PrefetchScheduler(
+            (service.service for service in self.services.values()),
+            interval=prefetch_config.get('interval', 45)
+        )
+        # 未启用预取时，由单独的线程按 store.sync_interval 同步有本地索引的站点
+        # （预取开启时每次拉取都会同步索引，不需要该线程）
+        self.store_sync = PrefetchScheduler(
+            (service.service for service in self.services.values() if service.service.store is not None),
+            interval=(config.get('store') or {}).get('sync_interval', 300),
+            revalidate=False
+        )
+
+        # 创建、删除、停用、重置密码等操作作为后台任务执行
+        jobs_config = config.get('jobs') or {}
+        self.job_poll_interval = jobs_config.get('poll_interval', 0.3)
+        self.jobs = JobManager(
+            {name: service.service for name, service in self.services.items()},
+            JobStore(jobs_config.get('path', 'config/jobs.db')),
+            workers=jobs_config.get('workers', 4),
+            retention_days=jobs_config.get('retention_days', 7),
+            shared=shared_state is not None,
+            stale_after=jobs_config.get('stale_after', 30)
+        )
+        self.config_store.subscribe(self)
+
+    def on_config_reload(self, config: dict):
+        """config.yaml 修改后更新可在线调整的参数（增删站点需要重启）"""
+        self.fanout_timeout = (config.get('multi_site') or {}).get('timeout', 5)
+        self.prefetcher.interval = (config.get('prefetch') or {}).get('interval', 45)
+        self.store_sync.interval = (config.get('store') or {}).get('sync_interval', 300)
+        self.job_poll_interval = (config.get('jobs') or {}).get('poll_interval', 0.3)
+        if self.shared_sync is not None:
+            self.shared_sync.interval = (config.get('shared_state') or {}).get('poll_interval', 1)
+
+    def get(self, name: Optional[str] = None) -> AsyncEmailService:
+        """按站点名获取服务，未指定时返回默认站点"""
+        return self.services.get(name or self.default_site) or self.services[self.default_site]
+
+    def site_names(self) -> List[str]:
+        return [site['name'] for site in self.sites]
+
+    def start_prefetch(self):
+        """启动后台预取调度器；配置中关闭预取时只启动本地索引的定期同步"""
+        if self.prefetch_enabled:
+            self.prefetcher.start()
+        elif self.store_sync.services:
+            self.store_sync.start()
+
+    def start_jobs(self):
+        """恢复上次未完成的任务并启动任务工作线程"""
+        self.jobs.start()
+
+    def start_shared_sync(self):
+        """启动共享状态同步线程（仅多进程部署）"""
+        if self.shared_sync is not None:
+            self.shared_sync.start()
+
+    def revalidate(self, name: Optional[str] = None):
+        """请求后台立即重新拉取指定站点"""
+        self.prefetcher.trigger(self.get(name).service)
+
+    async def list_all(self, force_refresh: bool = False) -> Tuple[List[List], Dict[str, str]]:
+        """并行查询所有站点并合并结果（每行首列为站点名）
+
+        单个站点超过 fanout_timeout 秒未响应时先使用其缓存数据，拉取在后台继续完成，
+        不会阻塞其他站点。返回 (合并后的表格行, {站点名: 状态说明})。
+        """
+        async def fetch(name: str, service: AsyncEmailService) -> Tuple[str, List[List], str]:
+            task = asyncio.ensure_future(service.list_email_addresses(force_refresh=force_refresh))
+            try:
+                rows = await asyncio.wait_for(asyncio.shield(task), self.fanout_timeout)
+                if service.service.cache.is_stale:
+                    return name, rows, "上游不可用，显示缓存数据"
+                return name, rows, "正常"
+            except asyncio.TimeoutError:
+                cached = service.service.cache.peek()
+                if cached is None:
+                    return name, [], "响应超时，稍后刷新"
+                return name, [service.service._to_row(email) for email in cached], "响应超时，显示缓存数据"
+            except Exception as e:
+                logger.warning("获取邮件列表失败: %s", e, extra={'site': name})
+                return name, [], f"失败: {str(e)}"
+
+        results = await asyncio.gather(*(
+            fetch(name, service) for name, service in self.services.items()
+        ))
+        rows = [[name] + row for name, site_rows, _ in results for row in site_rows]
+        statuses = {name: status for name, _, status in results}
+        return rows, statuses
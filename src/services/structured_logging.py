@@ -0,0 +1,202 @@
+import atexit
+import contextlib
+import contextvars
+import copy
+import json
+import logging
+import queue
+import random
+import re
+import sys
+import time
+import uuid
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+# 当前请求的ID（Gradio事件处理、后台预取等各自生成），自动附加到该请求期间的每条日志
+_request_id: contextvars.ContextVar = contextvars.ContextVar('request_id', default=None)
+
+# 值需要脱敏的字段名
+SENSITIVE_KEYS = {
+    'api_token', 'refresh_token', 'client_token', 'site_token', '_client_token',
+    'token', 'password', 'authorization'
+}
+_REDACT_PATTERNS = [
+    # Authorization: Bearer xxx
+    (re.compile(r'(Bearer\s+)[^\s"\',]+', re.IGNORECASE), r'\1***'),
+    # JSON、查询字符串与 repr 中的令牌字段，如 "api_token": "xxx"、_client_token=xxx
+    (
+        re.compile(
+            r'''((?:_client_token|api_token|refresh_token|client_token|site_token|password)'''
+            r'''["']?\s*[:=]\s*["']?)[^"'\s,&}]+''',
+            re.IGNORECASE
+        ),
+        r'\1***'
+    ),
+    # JWT
+    (re.compile(r'\beyJ[\w-]+\.[\w-]+\.[\w-]+'), '***'),
+]
+
+# LogRecord 的标准属性，其余属性（通过 extra 传入）作为结构化字段输出
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'request_id'}
+
+# 只输出 WARNING 及以上级别的第三方 logger
+QUIET_LOGGERS = ('httpx', 'httpcore', 'urllib3')
+
+_listener: Optional[QueueListener] = None
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+def current_request_id() -> Optional[str]:
+    return _request_id.get()
+
+
+@contextlib.contextmanager
+def request_context(request_id: Optional[str] = None):
+    """在 with 块内为日志附加请求ID（未指定时生成新的ID）"""
+    token = _request_id.set(request_id or new_request_id())
+    try:
+        yield _request_id.get()
+    finally:
+        _request_id.reset(token)
+
+
+def redact(value):
+    """递归脱敏字符串、字典与列表中的令牌和密码"""
+    if isinstance(value, str):
+        for pattern, replacement in _REDACT_PATTERNS:
+            value = pattern.sub(replacement, value)
+        return value
+    if isinstance(value, dict):
+        return {
+            key: '***' if str(key).lower() in SENSITIVE_KEYS else redact(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return [redact(item) for item in value]
+    return value
+
+
+class _ContextFilter(logging.Filter):
+    """在调用线程中记录请求ID（ContextVar 无法跨越队列）"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = _request_id.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """按 logger 名前缀对高频日志采样，WARNING 及以上级别始终保留"""
+
+    def __init__(self, rates: Optional[Dict[str, float]] = None):
+        super().__init__()
+        # 最长前缀优先匹配
+        self.rates = sorted((rates or {}).items(), key=lambda item: len(item[0]), reverse=True)
+        self._cache: Dict[str, float] = {}
+
+    def rate(self, name: str) -> float:
+        rate = self._cache.get(name)
+        if rate is None:
+            rate = next(
+                (value for prefix, value in self.rates if name == prefix or name.startswith(prefix + '.')),
+                1.0
+            )
+            self._cache[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rate(record.name)
+        return rate >= 1 or random.random() < rate
+
+
+class _AsyncQueueHandler(QueueHandler):
+    """只在调用线程中合并消息参数、转换异常堆栈，格式化、脱敏与输出都在后台线程完成"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出一行JSON，extra 中的字段作为顶层字段"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(record.created))
+                    + f".{int(record.msecs):03d}",
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        request_id = getattr(record, 'request_id', None)
+        if request_id:
+            entry['request_id'] = request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(redact(entry), ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """便于本地阅读的单行文本格式（同样脱敏）"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s')
+
+    def format(self, record: logging.LogRecord) -> str:
+        if not hasattr(record, 'request_id'):
+            record.request_id = None
+        text = super().format(record)
+        fields = {
+            key: value for key, value in vars(record).items()
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_')
+        }
+        if fields:
+            text += ' ' + ' '.join(f"{key}={value}" for key, value in fields.items())
+        return redact(text)
+
+
+def setup_logging(config: Optional[dict] = None):
+    """配置根 logger：调用线程只把日志放入内存队列，由后台线程格式化并写到 stdout"""
+    global _listener
+    config = config or {}
+    if _listener is not None:
+        _listener.stop()
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(TextFormatter() if config.get('format') == 'text' else JsonFormatter())
+
+    log_queue = queue.SimpleQueue()
+    handler = _AsyncQueueHandler(log_queue)
+    handler.addFilter(SamplingFilter(config.get('sampling')))
+    handler.addFilter(_ContextFilter())
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(str(config.get('level', 'INFO')).upper())
+    # HTTP 客户端库会为每个请求输出一条日志，与 services.upstream 重复
+    for name in QUIET_LOGGERS:
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    _listener = QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+
+
+@atexit.register
+def _flush_logs():
+    if _listener is not None:
+        _listener.stop()
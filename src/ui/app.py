@@ -1,14 +1,71 @@
+import logging
+import math
+import time
 import gradio as gr
-from services.email_service import EmailService
+import pandas as pd
+from services.jobs import JOB_KINDS, JOB_STATUSES
+from services.metrics import timed_handler
+from services.site_registry import SiteRegistry
+from ui.view_diff import diff_view
 
-def create_app():
-    email_service = EmailService()
+logger = logging.getLogger(__name__)
+
+def mail_settings_markdown(domain):
+    """邮箱服务器设置提示"""
+    return f"""
+        ### 邮箱服务器设置
+        
+        **收件设置**
+        - 服务器: `mail.{domain}`
+        - IMAP端口: `993`
+        
+        **发件设置**
+        - 服务器: `mail.{domain}`
+        - SMTP端口: `465`
+    """
+
+def create_app(shared_state=None):
+    # 每个站点一个服务实例；事件处理函数均为 async，等待上游响应时不占用 Gradio 的工作线程
+    # shared_state 不为空时（多进程部署）令牌、邮箱列表与任务在工作进程之间共享
+    registry = SiteRegistry(shared_state=shared_state)
+    registry.start_shared_sync()
+    # 后台预取调度器保持数据常驻内存，页面加载与刷新按钮不再等待上游
+    registry.start_prefetch()
+    # 创建、删除等操作作为后台任务执行，进程重启后继续执行未完成的任务
+    registry.start_jobs()
+    default_service = registry.get()
+    default_domain = default_service.service.site['domain']
+    
+    def bulk_choices_update(choices, keep_selection=False):
+        """批量删除的选项更新；定时推送时保留用户已勾选的邮箱"""
+        if keep_selection:
+            return gr.update(choices=choices)
+        return gr.update(choices=choices, value=[])
     
-    def list_addresses():
+    async def render_list(site, search, sort_by, descending, page, page_size, rendered, force_refresh=False, push=False):
         """
-        获取邮件列表，并在最后一列直接存储该邮箱的ID，用于删除操作
+        获取当前页的邮件列表（搜索、排序、分页均在缓存上完成，翻页不访问API），
+        并在最后一列直接存储该邮箱的ID，用于删除操作。
+        结果与该会话上次发送的内容逐行比较，没有变化的组件不再发送到浏览器。
         """
-        addresses = email_service.list_email_addresses()
+        email_service = registry.get(site)
+        cache = email_service.service.cache
+        try:
+            addresses, total, page = await email_service.query_email_addresses(
+                page=page or 1,
+                page_size=int(page_size),
+                sort_by=sort_by,
+                descending=descending,
+                search=search,
+                force_refresh=force_refresh
+            )
+        except Exception as e:
+            # 从未成功获取过数据：保留当前表格内容，只提示错误
+            logger.warning("获取邮件列表失败: %s", e, extra={'site': site})
+            # 浏览器中的分页信息已被错误提示替换，下次成功时需要重新发送
+            rendered = dict(rendered or {})
+            rendered.pop('page_info', None)
+            return gr.update(), f"⚠️ 获取邮件列表失败: {str(e)}", page, gr.update(), rendered
         for row in addresses:
             if len(row) >= 1:
                 # 给最后一列写入 "图标+ID" 的格式
@@ -16,55 +73,366 @@ def create_app():
                 # 加入后 row = [123, "test@example.com", ..., "🗑️|123"]
                 record_id = row[0]
                 row.append(f"🗑️|{record_id}")
-        return addresses
+        
+        page_count = max(1, math.ceil(total / int(page_size)))
+        page_info = f"共 {total} 个邮箱，第 {page}/{page_count} 页"
+        if cache.is_stale:
+            page_info += "（⚠️ SiteGround 暂时无法访问，显示的是最近一次获取的数据）"
+        # 批量删除的选项为当前页的邮箱（邮件地址 -> ID）
+        choices = [(row[1], str(row[0])) for row in addresses]
+        
+        updates, sent = diff_view(
+            rendered,
+            {'rows': addresses, 'page_info': page_info, 'page': page, 'choices': choices},
+            formatters={'choices': lambda value: bulk_choices_update(value, keep_selection=push)},
+            tables=('rows',),
+            # 页码输入框可能被用户改成了超出范围的值，操作触发的渲染总是回写实际页码
+            always=() if push else ('page',)
+        )
+        # 记录渲染时的缓存状态，定时推送据此判断是否有新数据
+        sent['cache'] = (site, cache.version, cache.is_stale)
+        return (*updates, sent)
+    
+    @timed_handler()
+    async def list_addresses(site=None, search="", sort_by=None, descending=False, page=1, page_size=50, rendered=None, force_refresh=False):
+        return await render_list(site, search, sort_by, descending, page, page_size, rendered, force_refresh)
     
+    @timed_handler()
+    async def refresh_addresses(site, search, sort_by, descending, page, page_size, rendered=None):
+        """刷新按钮：预取调度器运行时立即返回内存中的数据并请求后台重新拉取，
+        新数据由定时推送送达页面；否则直接从API重新拉取"""
+        if registry.prefetcher.running:
+            registry.revalidate(site)
+            return await render_list(site, search, sort_by, descending, page, page_size, rendered)
+        return await render_list(site, search, sort_by, descending, page, page_size, rendered, force_refresh=True)
+    
+    @timed_handler()
+    async def push_updates(site, search, sort_by, descending, page, page_size, rendered=None):
+        """定时推送：缓存内容变化时按当前视图条件重新渲染，只发送有变化的组件"""
+        cache = registry.get(site).service.cache
+        if rendered and rendered.get('cache') == (site, cache.version, cache.is_stale):
+            return gr.update(), gr.update(), gr.update(), gr.update(), rendered
+        return await render_list(site, search, sort_by, descending, page, page_size, rendered, push=True)
+    
+    @timed_handler()
+    async def first_page(site, search, sort_by, descending, page, page_size, rendered=None):
+        """搜索或排序条件变化时回到第一页"""
+        return await render_list(site, search, sort_by, descending, 1, page_size, rendered)
+    
+    @timed_handler()
+    async def prev_page(site, search, sort_by, descending, page, page_size, rendered=None):
+        return await render_list(site, search, sort_by, descending, (page or 1) - 1, page_size, rendered)
+    
+    @timed_handler()
+    async def next_page(site, search, sort_by, descending, page, page_size, rendered=None):
+        return await render_list(site, search, sort_by, descending, (page or 1) + 1, page_size, rendered)
+    
+    @timed_handler()
+    def suggest_addresses(site, query):
+        """输入联想：每次按键只查询内存中的搜索索引，显示最匹配的邮箱"""
+        matches = registry.get(site).service.suggest_email_addresses(query)
+        choices = [(
+            f"{record['name']}@{record['domain_name']}" + ("（已停用）" if record['suspended'] else ""),
+            f"{record['name']}@{record['domain_name']}"
+        ) for record in matches]
+        return gr.update(choices=choices, value=None, visible=bool(choices))
+    
+    @timed_handler()
+    def pick_suggestion(address):
+        """选中联想结果：以完整邮件地址作为搜索条件"""
+        return address, gr.update(choices=[], value=None, visible=False)
+    
+    @timed_handler()
     def generate_password():
         """生成6位随机密码"""
-        return email_service.generate_simple_password()
+        return default_service.generate_simple_password()
+    
+    def job_progress(job):
+        """任务进度的一行说明"""
+        return (
+            f"任务 #{job.id}（{JOB_KINDS[job.kind]}）{JOB_STATUSES[job.status]}："
+            f"{job.done}/{job.total}，成功 {job.succeeded} 个，失败 {job.failed} 个"
+        )
+    
+    def job_details(job, secrets=None):
+        """已完成对象中需要提示的内容（失败原因、重置后的新密码）
+
+        secrets 为提交任务时得到的明文密码，只在提交者的进度中传入，其他场合显示遮盖后的密码
+        """
+        lines = []
+        for index, (item, result) in enumerate(zip(job.items, job.results)):
+            if result is None:
+                continue
+            target = result.get('email') or item.get('email') or item.get('username') or f"ID {item.get('id')}"
+            if not result['success']:
+                lines.append(f"{target}: {result['message']}")
+            elif job.kind == 'reset_password':
+                lines.append(f"{target}: 新密码 {(secrets or {}).get(index, result['password'])}")
+        return "\n".join(lines)
+    
+    def job_summary(job, secrets=None):
+        """任务结束后的结果说明"""
+        if not job.finished:
+            return job_progress(job)
+        summary = f"{JOB_KINDS[job.kind]}成功 {job.succeeded} 个，失败 {job.failed} 个"
+        details = job_details(job, secrets)
+        return f"{summary}\n{details}" if details else summary
+    
+    async def watch_job(job):
+        """任务每次有进展时输出一次（结束时输出最终状态）"""
+        async for current in registry.jobs.watch(job.id, registry.job_poll_interval):
+            yield current
     
-    def delete_address(evt: gr.SelectData):
-        """删除邮件地址（仅基于ID，不使用行索引）"""
+    @timed_handler()
+    async def delete_address(site, evt: gr.SelectData):
+        """删除邮件地址（仅基于ID，不使用行索引）：提交删除任务并显示进度"""
         try:
             # 获取点击的列索引
             col_index = evt.index[1]  # （evt.index[0] 为行索引，这里不再使用）
             
-            if col_index == 6:  # 点击最后一列（索引从0开始）
-                # evt.value 形如 "🗑️|123"
-                cell_data = str(evt.value)
-                if "|" not in cell_data:
-                    raise Exception("无法解析ID：单元格中无"|"分隔符")
-                email_id = cell_data.split("|", 1)[1]  # 去掉"��️|"
-                print(f"解析到的邮件ID: {email_id}")
-                
-                result = email_service.delete_email_address(email_id)
-                if "成功" in result:
-                    # 删除成功后刷新列表
-                    updated_list = list_addresses()
-                    return result, updated_list
-                return result, None
+            if col_index != 6:  # 只有点击最后一列（索引从0开始）才触发删除
+                yield gr.update(), gr.update()
+                return
             
-            # 如果不是最后一列，则不触发删除
-            return None, None
-        
+            # evt.value 形如 "🗑️|123"
+            cell_data = str(evt.value)
+            if "|" not in cell_data:
+                raise Exception("无法解析ID：单元格中无"|"分隔符")
+            email_id = cell_data.split("|", 1)[1]  # 去掉"🗑️|"
+            logger.debug("解析到的邮件ID: %s", email_id)
+            job = registry.jobs.submit(site, 'delete', [email_id])
         except Exception as e:
-            print(f"删除操作出错: {str(e)}")
-            print(f"事件数据: index={evt.index}, value={evt.value}")
-            return f"删除操作出错: {str(e)}", None
+            logger.warning("删除操作出错: %s", e, extra={'index': evt.index, 'value': evt.value})
+            yield f"删除操作出错: {str(e)}", gr.update()
+            return
+        
+        # 删除成功后缓存已更新，列表由后续的 list_addresses 重新渲染
+        async for job in watch_job(job):
+            if not job.finished:
+                yield f"已提交任务 #{job.id}，正在删除…", job.id
+            elif job.results[0]['success']:
+                yield "邮件地址删除成功", job.id
+            else:
+                yield f"删除失败：{job.results[0]['message']}", job.id
+    
+    @timed_handler()
+    def prepare_bulk_delete(selected_ids):
+        """批量删除第一步：显示确认区域"""
+        if not selected_ids:
+            return gr.update(visible=False), "请先选择要删除的邮箱"
+        return gr.update(visible=True), f"确认删除所选的 {len(selected_ids)} 个邮箱？此操作不可恢复"
+    
+    @timed_handler()
+    async def bulk_delete_addresses(site, selected_ids):
+        """批量删除第二步：提交删除任务并显示进度，完成后统一刷新一次列表"""
+        if not selected_ids:
+            yield "请先选择要删除的邮箱", gr.update(visible=False), gr.update()
+            return
+        
+        job = registry.jobs.submit(site, 'delete', selected_ids)
+        async for job in watch_job(job):
+            if not job.finished:
+                yield job_progress(job), gr.update(visible=False), job.id
+                continue
+            result = f"成功删除 {job.succeeded} 个，失败 {job.failed} 个"
+            details = job_details(job)
+            yield f"{result}\n{details}" if details else result, gr.update(visible=False), job.id
+    
+    async def update_selected(site, selected_ids, kind):
+        """对所选邮箱提交停用/启用/重置密码任务并显示进度"""
+        if not selected_ids:
+            yield "请先选择邮箱", gr.update()
+            return
+        
+        job = registry.jobs.submit(site, kind, selected_ids)
+        secrets = job.secrets
+        async for job in watch_job(job):
+            yield job_summary(job, secrets), job.id
+    
+    @timed_handler()
+    async def suspend_addresses(site, selected_ids):
+        async for update in update_selected(site, selected_ids, 'suspend'):
+            yield update
     
-    def add_address(username, password):
+    @timed_handler()
+    async def unsuspend_addresses(site, selected_ids):
+        async for update in update_selected(site, selected_ids, 'unsuspend'):
+            yield update
+    
+    @timed_handler()
+    async def reset_passwords(site, selected_ids):
+        async for update in update_selected(site, selected_ids, 'reset_password'):
+            yield update
+    
+    @timed_handler()
+    async def add_address(site, username, password):
+        """提交创建任务并显示进度"""
         if not username or not password:
-            return "用户名和密码不能为空"
+            yield "用户名和密码不能为空", gr.update()
+            return
         
         if not (1 <= len(username) <= 16):
-            return "用户名长度必须在1-16个字符之间"
+            yield "用户名长度必须在1-16个字符之间", gr.update()
+            return
             
         if not (6 <= len(password) <= 20):
-            return "密码长度必须在6-20个字符之间"
+            yield "密码长度必须在6-20个字符之间", gr.update()
+            return
+        
+        job = registry.jobs.submit(site, 'create', [(username, password)])
+        async for job in watch_job(job):
+            result = job.results[0]
+            if not job.finished:
+                yield f"已提交任务 #{job.id}，正在创建…", job.id
+            elif result['success']:
+                yield f"邮件地址创建成功\n邮箱: {result['email']}", job.id
+            else:
+                yield f"添加失败：{result['message']}", job.id
+    
+    def bulk_create_rows(job, secrets):
+        """批量创建的逐行明细（尚未执行的行显示为等待中，密码取提交时得到的明文）"""
+        rows = []
+        for index, (item, result) in enumerate(zip(job.items, job.results)):
+            password = secrets.get(index, item['password'])
+            if result is None:
+                rows.append([item['username'], '', password, '等待中', ''])
+            else:
+                rows.append([
+                    result['username'],
+                    result['email'],
+                    password,
+                    '成功' if result['success'] else '失败',
+                    result['message']
+                ])
+        return rows
+    
+    @timed_handler()
+    async def bulk_add_addresses(site, text, concurrency):
+        """提交批量创建任务并逐行显示进度，全部完成后统一刷新一次列表"""
+        entries = registry.get(site).parse_bulk_input(text)
+        if not entries:
+            yield "请输入至少一个用户名", None, gr.update()
+            return
         
-        result = email_service.add_email_address(username, password)
-        if "成功" in result:
-            return result, list_addresses()
-        return result, None
+        job = registry.jobs.submit(site, 'create', entries, concurrency=int(concurrency))
+        secrets = job.secrets
+        async for job in watch_job(job):
+            if job.finished:
+                summary = f"共 {job.total} 个，成功 {job.succeeded} 个，失败 {job.failed} 个"
+            else:
+                summary = job_progress(job)
+            yield summary, bulk_create_rows(job, secrets), job.id
+    
+    @timed_handler()
+    async def resume_job(job_id, site, search, sort_by, descending, page, page_size, rendered=None):
+        """页面加载时接上该浏览器最近提交且仍在执行的任务的进度，任务结束后刷新列表"""
+        job = registry.jobs.get(job_id) if job_id else None
+        if job is None or job.finished:
+            yield gr.update(), gr.update(), gr.update(), gr.update(), gr.update(), gr.update()
+            return
+        async for job in watch_job(job):
+            yield job_summary(job), gr.update(), gr.update(), gr.update(), gr.update(), gr.update()
+        yield (job_summary(job), *await render_list(site, search, sort_by, descending, page, page_size, rendered))
+    
+    def job_rows(jobs):
+        def format_time(timestamp):
+            return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp)) if timestamp else ''
+        
+        return [[
+            job.id,
+            job.site,
+            JOB_KINDS[job.kind],
+            JOB_STATUSES[job.status],
+            f"{job.done}/{job.total}",
+            format_time(job.created_at),
+            format_time(job.finished_at)
+        ] for job in jobs]
+    
+    @timed_handler()
+    def list_jobs():
+        """任务列表：最近提交的任务及其进度"""
+        return job_rows(registry.jobs.recent(50))
+    
+    @timed_handler()
+    async def view_job(evt: gr.SelectData):
+        """查看任务明细（执行中的任务持续更新）"""
+        job = registry.jobs.get((evt.row_value or [None])[0])
+        if job is None:
+            yield "任务不存在", None
+            return
+        async for job in watch_job(job):
+            rows = []
+            for item, result in zip(job.items, job.results):
+                target = (result or {}).get('email') or item.get('email') or item.get('username') or item.get('id')
+                if result is None:
+                    rows.append([target, '等待中', '', ''])
+                else:
+                    rows.append([
+                        target,
+                        '成功' if result['success'] else '失败',
+                        result['message'],
+                        result.get('password', '') if result['success'] else ''
+                    ])
+            yield job_progress(job), rows
+    
+    @timed_handler()
+    async def usage_report(site, top_n):
+        """用量分析：汇总、百分位、Top N 与用量分布"""
+        email_service = registry.get(site)
+        try:
+            report = await email_service.get_usage_report(top_n=int(top_n))
+        except Exception as e:
+            logger.warning("获取用量分析失败: %s", e, extra={'site': site})
+            return f"获取用量分析失败: {str(e)}", None, None
+        
+        format_size = email_service.service._format_size
+        summary = report['summary']
+        percentiles = "，".join(
+            f"P{p}: {format_size(value)}" for p, value in summary['percentiles'].items()
+        )
+        summary_text = (
+            f"**邮箱总数**: {summary['count']}（已停用 {summary['suspended']}）\n\n"
+            f"**总用量**: {format_size(summary['total_size'])}，"
+            f"平均 {format_size(summary['mean_size'])}，邮件总数 {summary['total_emails']}\n\n"
+            f"**用量百分位**: {percentiles}"
+        )
+        top_rows = [[
+            r['id'],
+            r['email'],
+            r['n_emails'],
+            format_size(r['used_size']),
+            '已停用' if r['suspended'] else '正常'
+        ] for r in report['top']]
+        histogram = pd.DataFrame(
+            [(h['bucket'], h['count']) for h in report['histogram']],
+            columns=["用量区间", "邮箱数量"]
+        )
+        return summary_text, top_rows, histogram
+    
+    @timed_handler()
+    def switch_site(site):
+        """切换站点时更新域名提示"""
+        domain = registry.get(site).service.site['domain']
+        return f"@{domain}", mail_settings_markdown(domain)
+    
+    @timed_handler()
+    async def list_all_sites(rendered=None, force_refresh=False):
+        """所有站点的邮箱合并视图（各站点并行查询，慢站点不阻塞其他站点）"""
+        rows, statuses = await registry.list_all(force_refresh=force_refresh)
+        status_text = "，".join(f"**{name}**: {status}" for name, status in statuses.items())
+        # 合并视图的行以 (站点, ID) 为键比较
+        keyed_rows = [[(row[0], row[1])] + row for row in rows]
+        (table, status), sent = diff_view(
+            rendered,
+            {'rows': keyed_rows, 'status': f"共 {len(rows)} 个邮箱。{status_text}"},
+            formatters={'rows': lambda value: [row[1:] for row in value]},
+            tables=('rows',)
+        )
+        return table, status, sent
+    
+    @timed_handler()
+    async def refresh_all_sites(rendered=None):
+        return await list_all_sites(rendered, force_refresh=True)
     
     demo = gr.Blocks(
         title="邮件地址管理面板",
@@ -88,8 +456,16 @@ def create_app():
     
     with demo:
         with gr.Row():
-            with gr.Column():
+            with gr.Column(scale=3):
                 gr.Markdown("# 邮件地址管理系统")
+            with gr.Column(scale=1):
+                # 只配置了一个站点时不显示站点选择
+                site_input = gr.Dropdown(
+                    label="站点",
+                    choices=registry.site_names(),
+                    value=registry.default_site,
+                    visible=len(registry.sites) > 1
+                )
         
         with gr.Tabs() as tabs:
             # 邮件列表标签页
@@ -105,6 +481,39 @@ def create_app():
                                 size="sm"
                             )
                     
+                    # 搜索、排序与分页
+                    with gr.Row():
+                        search_input = gr.Textbox(
+                            label="搜索",
+                            placeholder="输入邮件地址关键字（支持前缀与模糊匹配，可加“停用”或“正常”筛选状态）",
+                            scale=3
+                        )
+                        sort_by_input = gr.Dropdown(
+                            label="排序",
+                            choices=[
+                                ("ID", "id"),
+                                ("邮件地址", "email"),
+                                ("邮件数量", "n_emails"),
+                                ("已用空间", "used_size"),
+                                ("状态", "suspended"),
+                                ("匹配度", "relevance")
+                            ],
+                            value="id",
+                            scale=1
+                        )
+                        descending_input = gr.Checkbox(
+                            label="降序",
+                            value=False,
+                            scale=1
+                        )
+                    
+                    # 输入联想结果
+                    search_suggestions = gr.Radio(
+                        label="匹配的邮箱",
+                        choices=[],
+                        visible=False
+                    )
+                    
                     email_list = gr.Dataframe(
                         headers=[
                             "ID", 
@@ -118,28 +527,64 @@ def create_app():
                         label="邮件地址列表",
                         interactive=False
                     )
+                    with gr.Row():
+                        prev_page_btn = gr.Button("上一页", size="sm", scale=1)
+                        page_input = gr.Number(
+                            label="页码",
+                            value=1,
+                            precision=0,
+                            minimum=1,
+                            scale=1
+                        )
+                        page_size_input = gr.Dropdown(
+                            label="每页数量",
+                            choices=[20, 50, 100, 200],
+                            value=50,
+                            scale=1
+                        )
+                        next_page_btn = gr.Button("下一页", size="sm", scale=1)
+                    page_info = gr.Markdown()
                     list_result_text = gr.Textbox(
                         label="操作结果",
                         interactive=False,
                         visible=True
                     )
+                    
+                    # 批量操作区域（删除、停用、启用、重置密码均作为后台任务执行）
+                    with gr.Row():
+                        bulk_delete_select = gr.Dropdown(
+                            label="批量操作",
+                            choices=[],
+                            multiselect=True,
+                            scale=4
+                        )
+                        bulk_delete_btn = gr.Button(
+                            "删除所选",
+                            variant="stop",
+                            scale=1
+                        )
+                    with gr.Row():
+                        suspend_btn = gr.Button("停用所选", size="sm")
+                        unsuspend_btn = gr.Button("启用所选", size="sm")
+                        reset_password_btn = gr.Button("重置密码", size="sm")
+                    with gr.Row(visible=False) as bulk_delete_confirm:
+                        bulk_delete_prompt = gr.Markdown()
+                        bulk_delete_confirm_btn = gr.Button(
+                            "确认删除",
+                            variant="stop",
+                            size="sm"
+                        )
+                        bulk_delete_cancel_btn = gr.Button(
+                            "取消",
+                            size="sm"
+                        )
             
             # 新建邮箱标签页
             with gr.Tab("新建邮箱"):
                 with gr.Column():
                     # 添加邮箱设置提示
                     with gr.Column(elem_classes="mail-settings"):
-                        gr.Markdown("""
-                            ### 邮箱服务器设置
-                            
-                            **收件设置**
-                            - 服务器: `mail.yszw-shoji.co.jp`
-                            - IMAP端口: `993`
-                            
-                            **发件设置**
-                            - 服务器: `mail.yszw-shoji.co.jp`
-                            - SMTP端口: `465`
-                        """)
+                        mail_settings = gr.Markdown(mail_settings_markdown(default_domain))
                     
                     # 用户名输入行
                     with gr.Row():
@@ -149,8 +594,8 @@ def create_app():
                             scale=3,
                             container=False
                         )
-                        gr.Textbox(
-                            value="@yszw-shoji.co.jp",
+                        domain_text = gr.Textbox(
+                            value=f"@{default_domain}",
                             interactive=False,
                             container=False,
                             scale=2
@@ -185,32 +630,339 @@ def create_app():
                         visible=True
                     )
         
+            # 批量创建标签页
+            with gr.Tab("批量创建"):
+                with gr.Column():
+                    bulk_input = gr.Textbox(
+                        label="用户名列表",
+                        placeholder="每行一个：用户名 或 用户名,密码（未填写密码时自动生成）",
+                        lines=10
+                    )
+                    bulk_concurrency = gr.Slider(
+                        label="并发数",
+                        minimum=1,
+                        maximum=20,
+                        step=1,
+                        value=default_service.service.bulk_concurrency
+                    )
+                    bulk_add_btn = gr.Button(
+                        "批量创建",
+                        variant="primary"
+                    )
+                    bulk_add_summary = gr.Textbox(
+                        label="操作结果",
+                        interactive=False
+                    )
+                    bulk_add_results = gr.Dataframe(
+                        headers=[
+                            "用户名",
+                            "邮件地址",
+                            "密码",
+                            "结果",
+                            "说明"
+                        ],
+                        label="创建明细",
+                        interactive=False
+                    )
+            
+            # 用量分析标签页
+            with gr.Tab("用量分析") as analytics_tab:
+                with gr.Column():
+                    with gr.Row():
+                        top_n_input = gr.Slider(
+                            label="Top N",
+                            minimum=5,
+                            maximum=100,
+                            step=5,
+                            value=10,
+                            scale=3
+                        )
+                        analytics_btn = gr.Button(
+                            "🔄 刷新分析",
+                            size="sm",
+                            scale=1
+                        )
+                    analytics_summary = gr.Markdown()
+                    usage_histogram = gr.BarPlot(
+                        x="用量区间",
+                        y="邮箱数量",
+                        label="用量分布"
+                    )
+                    top_usage_list = gr.Dataframe(
+                        headers=[
+                            "ID",
+                            "邮件地址",
+                            "邮件数量",
+                            "已用空间",
+                            "状态"
+                        ],
+                        label="已用空间最大的邮箱",
+                        interactive=False
+                    )
+            
+            # 任务标签页
+            with gr.Tab("任务") as jobs_tab:
+                with gr.Column():
+                    with gr.Row(elem_classes="list-header"):
+                        gr.Column(scale=3)
+                        with gr.Column(scale=1):
+                            jobs_refresh_btn = gr.Button(
+                                "🔄 刷新",
+                                elem_classes="refresh-btn",
+                                size="sm"
+                            )
+                    jobs_list = gr.Dataframe(
+                        headers=[
+                            "ID",
+                            "站点",
+                            "类型",
+                            "状态",
+                            "进度",
+                            "提交时间",
+                            "完成时间"
+                        ],
+                        label="最近的任务（点击查看明细）",
+                        interactive=False
+                    )
+                    job_progress_text = gr.Textbox(
+                        label="任务进度",
+                        interactive=False
+                    )
+                    job_detail_list = gr.Dataframe(
+                        headers=[
+                            "对象",
+                            "结果",
+                            "说明",
+                            "密码"
+                        ],
+                        label="任务明细",
+                        interactive=False
+                    )
+            
+            # 全部站点标签页（仅在配置了多个站点时显示）
+            with gr.Tab("全部站点", visible=len(registry.sites) > 1) as all_sites_tab:
+                with gr.Column():
+                    with gr.Row(elem_classes="list-header"):
+                        gr.Column(scale=3)
+                        with gr.Column(scale=1):
+                            all_sites_refresh_btn = gr.Button(
+                                "🔄 刷新",
+                                elem_classes="refresh-btn",
+                                size="sm"
+                            )
+                    all_sites_status = gr.Markdown()
+                    all_sites_list = gr.Dataframe(
+                        headers=[
+                            "站点",
+                            "ID",
+                            "邮件地址",
+                            "用户名",
+                            "邮件数量",
+                            "已用空间",
+                            "状态"
+                        ],
+                        label="所有站点的邮件地址",
+                        interactive=False
+                    )
+        
         # 事件处理
         generate_btn.click(
             fn=generate_password,
             outputs=password_input
         )
         
+        # 列表视图：所有会改变列表的操作完成后，都按当前的搜索/排序/分页条件从缓存重新渲染
+        # view_state 为该会话上次发送到浏览器的内容，用于只发送有变化的组件
+        view_state = gr.State(None)
+        view_inputs = [site_input, search_input, sort_by_input, descending_input, page_input, page_size_input, view_state]
+        view_outputs = [email_list, page_info, page_input, bulk_delete_select, view_state]
+        # 该浏览器最近提交的任务ID，刷新页面后据此继续显示进度
+        job_state = gr.BrowserState(None, storage_key="sg_mail_dashboard_job")
+        # 显示任务进度的事件只是轮询内存中的任务状态，不限制并发，
+        # 避免一个长任务的进度流占住该事件，使其他会话的同类操作排队
+        streaming = {'concurrency_limit': None}
+        
         add_btn.click(
             fn=add_address,
-            inputs=[username_input, password_input],
-            outputs=[add_result_text, email_list]
+            inputs=[site_input, username_input, password_input],
+            outputs=[add_result_text, job_state],
+            **streaming
+        ).then(
+            fn=list_addresses,
+            inputs=view_inputs,
+            outputs=view_outputs
+        )
+        
+        bulk_add_btn.click(
+            fn=bulk_add_addresses,
+            inputs=[site_input, bulk_input, bulk_concurrency],
+            outputs=[bulk_add_summary, bulk_add_results, job_state],
+            **streaming
+        ).then(
+            fn=list_addresses,
+            inputs=view_inputs,
+            outputs=view_outputs
         )
         
         refresh_btn.click(
+            fn=refresh_addresses,
+            inputs=view_inputs,
+            outputs=view_outputs
+        )
+        
+        for trigger in (search_input.change, sort_by_input.change, descending_input.change, page_size_input.change):
+            trigger(
+                fn=first_page,
+                inputs=view_inputs,
+                outputs=view_outputs
+            )
+        
+        search_input.input(
+            fn=suggest_addresses,
+            inputs=[site_input, search_input],
+            outputs=search_suggestions,
+            trigger_mode="always_last",
+            show_progress="hidden"
+        )
+        
+        search_suggestions.input(
+            fn=pick_suggestion,
+            inputs=search_suggestions,
+            outputs=[search_input, search_suggestions]
+        )
+        
+        page_input.submit(
             fn=list_addresses,
-            outputs=email_list
+            inputs=view_inputs,
+            outputs=view_outputs
+        )
+        
+        prev_page_btn.click(
+            fn=prev_page,
+            inputs=view_inputs,
+            outputs=view_outputs
+        )
+        
+        next_page_btn.click(
+            fn=next_page,
+            inputs=view_inputs,
+            outputs=view_outputs
         )
         
         email_list.select(
             fn=delete_address,
-            outputs=[list_result_text, email_list]
+            inputs=site_input,
+            outputs=[list_result_text, job_state],
+            **streaming
+        ).then(
+            fn=list_addresses,
+            inputs=view_inputs,
+            outputs=view_outputs
+        )
+        
+        bulk_delete_btn.click(
+            fn=prepare_bulk_delete,
+            inputs=bulk_delete_select,
+            outputs=[bulk_delete_confirm, bulk_delete_prompt]
+        )
+        
+        bulk_delete_confirm_btn.click(
+            fn=bulk_delete_addresses,
+            inputs=[site_input, bulk_delete_select],
+            outputs=[list_result_text, bulk_delete_confirm, job_state],
+            **streaming
+        ).then(
+            fn=list_addresses,
+            inputs=view_inputs,
+            outputs=view_outputs
+        )
+        
+        for button, handler in (
+            (suspend_btn, suspend_addresses),
+            (unsuspend_btn, unsuspend_addresses),
+            (reset_password_btn, reset_passwords)
+        ):
+            button.click(
+                fn=handler,
+                inputs=[site_input, bulk_delete_select],
+                outputs=[list_result_text, job_state],
+                **streaming
+            ).then(
+                fn=list_addresses,
+                inputs=view_inputs,
+                outputs=view_outputs
+            )
+        
+        bulk_delete_cancel_btn.click(
+            fn=lambda: gr.update(visible=False),
+            outputs=bulk_delete_confirm
+        )
+        
+        for trigger in (analytics_tab.select, analytics_btn.click):
+            trigger(
+                fn=usage_report,
+                inputs=[site_input, top_n_input],
+                outputs=[analytics_summary, top_usage_list, usage_histogram]
+            )
+        
+        # 切换站点：更新域名提示并重新渲染列表
+        site_input.change(
+            fn=switch_site,
+            inputs=site_input,
+            outputs=[domain_text, mail_settings]
+        ).then(
+            fn=first_page,
+            inputs=view_inputs,
+            outputs=view_outputs
+        )
+        
+        all_sites_state = gr.State(None)
+        all_sites_tab.select(
+            fn=list_all_sites,
+            inputs=all_sites_state,
+            outputs=[all_sites_list, all_sites_status, all_sites_state]
+        )
+        
+        all_sites_refresh_btn.click(
+            fn=refresh_all_sites,
+            inputs=all_sites_state,
+            outputs=[all_sites_list, all_sites_status, all_sites_state]
+        )
+        
+        for trigger in (jobs_tab.select, jobs_refresh_btn.click):
+            trigger(
+                fn=list_jobs,
+                outputs=jobs_list
+            )
+        
+        jobs_list.select(
+            fn=view_job,
+            outputs=[job_progress_text, job_detail_list],
+            **streaming
         )
         
         # 页面加载时自动获取列表
         demo.load(
             fn=list_addresses,
-            outputs=email_list
+            inputs=view_inputs,
+            outputs=view_outputs
+        )
+        
+        # 刷新页面前提交的任务仍在执行时，继续显示其进度，结束后刷新列表
+        demo.load(
+            fn=resume_job,
+            inputs=[job_state] + view_inputs,
+            outputs=[list_result_text] + view_outputs,
+            **streaming
+        )
+        
+        # 定时检查缓存版本，后台预取到新数据后推送到页面
+        push_timer = gr.Timer(registry.push_interval, active=registry.prefetch_enabled)
+        push_timer.tick(
+            fn=push_updates,
+            inputs=view_inputs,
+            outputs=view_outputs,
+            show_progress="hidden"
         )
     
     return demo 
\ No newline at end of file
@@ -0,0 +1,66 @@
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import gradio as gr
+
+from services.metrics import VIEW_ROW_CHANGES, VIEW_UPDATES
+
+
+def diff_rows(previous: Optional[List[List]], current: List[List]) -> Dict:
+    """按首列（ID）比较两次发送的表格行
+
+    返回 {'inserted': [...], 'deleted': [...], 'updated': [...], 'reordered': bool}
+    """
+    previous = previous or []
+    before = {row[0]: row for row in previous}
+    after = {row[0]: row for row in current}
+    return {
+        'inserted': [key for key in after if key not in before],
+        'deleted': [key for key in before if key not in after],
+        'updated': [key for key, row in after.items() if key in before and before[key] != row],
+        'reordered': (
+            [row[0] for row in previous if row[0] in after]
+            != [row[0] for row in current if row[0] in before]
+        )
+    }
+
+
+def diff_view(
+    rendered: Optional[Dict],
+    view: Dict,
+    formatters: Optional[Dict[str, Callable]] = None,
+    tables: Iterable[str] = (),
+    always: Iterable[str] = ()
+) -> Tuple[List, Dict]:
+    """将新视图与会话上次发送到浏览器的内容比较，只为有变化的组件生成更新
+
+    rendered 为会话的 gr.State（上次发送的各组件值），view 为 组件名 -> 新值，
+    值为 None 表示本次不更新该组件。tables 中的组件按行比较（新增/删除/修改/顺序），
+    always 中的组件无论是否变化都发送。
+    返回 (与 view 顺序一致的组件更新列表, 新的会话状态)。
+    """
+    formatters = formatters or {}
+    tables = set(tables)
+    always = set(always)
+    sent = dict(rendered or {})
+    updates = []
+    for name, value in view.items():
+        if value is None:
+            updates.append(gr.update())
+            continue
+        if name in tables and name in sent:
+            changes = diff_rows(sent[name], value)
+            for change in ('inserted', 'deleted', 'updated'):
+                if changes[change]:
+                    VIEW_ROW_CHANGES.inc(len(changes[change]), change=change)
+            changed = changes['reordered'] or any(changes[c] for c in ('inserted', 'deleted', 'updated'))
+        else:
+            changed = name not in sent or sent[name] != value
+        if not changed and name not in always:
+            VIEW_UPDATES.inc(component=name, result='skipped')
+            updates.append(gr.update())
+            continue
+        VIEW_UPDATES.inc(component=name, result='sent')
+        formatter = formatters.get(name)
+        updates.append(formatter(value) if formatter else value)
+        sent[name] = value
+    return updates, sent
@@ -0,0 +1,68 @@
+"""测试公共夹具：进程内启动模拟的 SiteGround API，并在临时目录中写入指向它的配置"""
+import json
+import os
+import sys
+
+import pytest
+import yaml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+sys.path.insert(0, os.path.join(ROOT, 'bench'))
+
+from mock_siteground import MockSiteGround, start_mock_server  # noqa: E402
+from services.config_store import ConfigStore  # noqa: E402
+from services.email_service import EmailService, load_sites  # noqa: E402
+
+SITE_NAME = 'test'
+SITE_ID = 'TEST'
+
+
+@pytest.fixture
+def mock():
+    """模拟服务器的状态（默认 20 个邮箱、无延迟、无错误注入）"""
+    state = MockSiteGround(mailboxes=20, seed=1)
+    server = start_mock_server(state)
+    state.base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    yield state
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def config_store(tmp_path, mock, monkeypatch):
+    """工作目录切换到临时目录，config/ 下的配置指向模拟服务器；令牌为模拟服务器不认识的值"""
+    monkeypatch.chdir(tmp_path)
+    config_dir = tmp_path / 'config'
+    config_dir.mkdir()
+    config = {
+        'sites': [{
+            'name': SITE_NAME,
+            'site_id': SITE_ID,
+            'base_url': f"{mock.base_url}/api-sgcp/v00",
+            'domain_id': 1,
+            'domain': mock.domain
+        }],
+        'token': {
+            'client_token_url': f"{mock.base_url}/v1/auth/client-token",
+            'site_token_url': f"{mock.base_url}/v1/auth/sites/{{site_id}}/token",
+            'retry_cooldown': 0
+        },
+        'cache': {'ttl': 60, 'stale_ttl': 600},
+        'store': {'enabled': False},
+        'retry': {'max_retries': 2, 'base_delay': 0.01, 'max_delay': 0.05},
+        'circuit_breaker': {'failure_threshold': 5, 'reset_timeout': 30}
+    }
+    (config_dir / 'config.yaml').write_text(yaml.safe_dump(config), encoding='utf-8')
+    (config_dir / 'auth.json').write_text(
+        json.dumps({'api_token': 'invalid-token', 'refresh_token': 'test-refresh-token'}),
+        encoding='utf-8'
+    )
+    return ConfigStore(str(config_dir))
+
+
+@pytest.fixture
+def service(config_store):
+    service = EmailService(load_sites(config_store.config)[0], config_store)
+    yield service
+    service.close()
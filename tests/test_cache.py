@@ -0,0 +1,95 @@
+import threading
+import time
+
+import pytest
+
+from services.cache import MailboxCache
+
+RECORDS = [{'id': 1, 'name': 'a'}, {'id': 2, 'name': 'b'}]
+
+
+class Loader:
+    def __init__(self, records=RECORDS, delay=0.0):
+        self.records = records
+        self.delay = delay
+        self.calls = 0
+        self.error = None
+
+    def __call__(self):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return [dict(record) for record in self.records]
+
+
+def test_hit_within_ttl_and_refetch_after():
+    cache = MailboxCache(ttl=0.1)
+    loader = Loader()
+    assert cache.get(loader) == RECORDS
+    assert cache.get(loader) == RECORDS
+    assert loader.calls == 1
+
+    time.sleep(0.12)
+    cache.get(loader)
+    assert loader.calls == 2
+
+
+def test_concurrent_misses_share_one_fetch():
+    cache = MailboxCache(ttl=60)
+    loader = Loader(delay=0.05)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get(loader))) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert loader.calls == 1
+    assert results == [RECORDS] * 10
+
+
+def test_failed_fetch_returns_stale_records():
+    cache = MailboxCache(ttl=60)
+    loader = Loader()
+    cache.get(loader)
+
+    loader.error = RuntimeError("upstream down")
+    assert cache.get(loader, force=True) == RECORDS
+    assert cache.is_stale
+
+    loader.error = None
+    cache.get(loader, force=True)
+    assert not cache.is_stale
+
+
+def test_failed_fetch_without_data_raises():
+    loader = Loader()
+    loader.error = RuntimeError("upstream down")
+    with pytest.raises(RuntimeError):
+        MailboxCache(ttl=60).get(loader)
+
+
+def test_stale_while_revalidate():
+    cache = MailboxCache(ttl=0.05, stale_ttl=60)
+    triggered = []
+    cache.revalidator = lambda: triggered.append(True)
+    loader = Loader()
+    cache.get(loader)
+
+    time.sleep(0.06)
+    # 过期但在 stale_ttl 内：直接返回旧数据并请求后台重新拉取
+    assert cache.get(loader) == RECORDS
+    assert loader.calls == 1
+    assert triggered == [True]
+
+
+def test_writes_during_fetch_are_reapplied():
+    cache = MailboxCache(ttl=60)
+    loader = Loader(delay=0.1)
+    thread = threading.Thread(target=cache.get, args=(loader,))
+    thread.start()
+    time.sleep(0.03)
+    cache.upsert({'id': 3, 'name': 'c'})
+    cache.remove(1)
+    thread.join()
+    assert sorted(record['id'] for record in cache.peek()) == [2, 3]
@@ -0,0 +1,143 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from services.async_email_service import AsyncEmailService
+from services.cache import MailboxCache
+from services.email_service import load_sites
+from services.mailbox_store import MailboxStore
+
+
+def test_concurrent_401s_trigger_one_refresh(service, mock):
+    """令牌失效时并发请求都收到 401，只有一次令牌交换，所有请求用新令牌重试成功"""
+    mock.latency = 0.05
+    barrier = threading.Barrier(10)
+    results, errors = [], []
+
+    def call():
+        barrier.wait()
+        try:
+            results.append(service._call_api('GET', '/email'))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    assert [response['status'] for response in results] == [200] * 10
+    assert mock.counters['client_token'] == 1
+    assert mock.counters['site_token'] == 1
+
+
+def test_async_and_sync_refresh_share_one_exchange(service, mock):
+    """事件循环上的刷新与线程中的刷新（预取、任务）同时进行时也只交换一次令牌"""
+    mock.latency = 0.05
+    async_service = AsyncEmailService(service)
+    seen_version = service._token_version
+
+    async def run():
+        thread = asyncio.to_thread(service.refresh_token, seen_version)
+        results = await asyncio.gather(async_service.refresh_token(seen_version), thread)
+        await async_service.aclose()
+        return results
+
+    assert asyncio.run(run()) == [True, True]
+    assert mock.counters['client_token'] == 1
+    assert service._token_version == seen_version + 1
+
+
+def test_async_calls_refresh_once(service, mock):
+    mock.latency = 0.05
+    async_service = AsyncEmailService(service)
+
+    async def run():
+        responses = await asyncio.gather(*(async_service._call_api('GET', '/email') for _ in range(10)))
+        await async_service.aclose()
+        return responses
+
+    assert [response['status'] for response in asyncio.run(run())] == [200] * 10
+    assert mock.counters['client_token'] == 1
+
+
+def test_refreshed_token_is_saved(service, config_store):
+    assert service.refresh_token()
+    token = service.headers['Authorization'][len('Bearer '):]
+    assert config_store.auth['api_token'] == token
+    assert config_store.auth['refresh_token'] == 'test-refresh-token'
+
+
+def test_list_falls_back_to_stale_cache_when_upstream_fails(service, mock):
+    rows = service.list_email_addresses()
+    assert len(rows) == 20
+    assert not service.cache.is_stale
+
+    mock.error_rate = 1.0
+    stale_rows = service.list_email_addresses(force_refresh=True)
+    assert stale_rows == rows
+    assert service.cache.is_stale
+
+    mock.error_rate = 0.0
+    service.list_email_addresses(force_refresh=True)
+    assert not service.cache.is_stale
+
+
+def test_list_raises_without_any_data(service, mock):
+    mock.error_rate = 1.0
+    with pytest.raises(Exception):
+        service.list_email_addresses()
+
+
+def test_create_and_delete_patch_the_cache(service, mock):
+    service.list_email_addresses()
+    created = service.create_email('newbox', 'secret123')
+    assert any(row[0] == created['id'] for row in service.list_email_addresses())
+
+    service.delete_email(created['id'])
+    assert all(row[0] != created['id'] for row in service.list_email_addresses())
+    # 修补缓存，不需要重新拉取列表
+    assert mock.counters['list'] == 1
+
+
+def test_usage_report_matches_refetched_records(service, mock):
+    """强制刷新后的报告基于新拉取的列表，而不是复用刷新前版本的分析结果"""
+    service.list_email_addresses()
+    assert service.get_usage_report()['summary']['count'] == 20
+    mock._add_mailbox('newbox')
+    assert service.get_usage_report(force_refresh=True)['summary']['count'] == 21
+
+    async_service = AsyncEmailService(service)
+    mock._add_mailbox('another')
+    report = asyncio.run(async_service.get_usage_report(force_refresh=True))
+    assert report['summary']['count'] == 22
+
+
+def test_index_seed_keeps_its_age(tmp_path):
+    """本地索引中很久以前同步的数据不会被当作刚拉取的数据"""
+    store = MailboxStore(str(tmp_path / 'mailboxes.db'))
+    records = [{'id': 1, 'name': 'a', 'domain_name': 'example.jp', 'n_emails': 0, 'used_size': 0, 'suspended': 0}]
+    store.sync(records)
+
+    cache = MailboxCache(ttl=60)
+    cache.seed(store.load(), store.last_synced_at())
+    assert cache.get(lambda: pytest.fail("同步不久的数据应直接命中")) == records
+
+    cache = MailboxCache(ttl=60)
+    cache.seed(store.load(), time.time() - 3600)
+    assert cache.get(lambda: []) == []
+    store.close()
+
+
+def test_load_sites_requires_complete_unique_sites():
+    assert load_sites({})[0]['default']
+
+    site = {'name': 'a', 'site_id': 'A', 'base_url': 'http://a', 'domain_id': 1, 'domain': 'a.jp'}
+    with pytest.raises(ValueError, match='base_url'):
+        load_sites({'sites': [site, {'name': 'b', 'site_id': 'B', 'domain_id': 2, 'domain': 'b.jp'}]})
+    with pytest.raises(ValueError, match='重复'):
+        load_sites({'sites': [site, dict(site)]})
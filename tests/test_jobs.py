@@ -0,0 +1,98 @@
+import asyncio
+import time
+
+from services.jobs import REDACTED_PASSWORD, Job, JobManager, JobStore
+
+
+def wait_finished(manager: JobManager, job_id: int, timeout: float = 5) -> Job:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = manager.get(job_id)
+        if job.finished:
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"任务 {job_id} 未在 {timeout} 秒内结束")
+
+
+def test_interrupted_job_resumes_pending_items(service, mock, tmp_path):
+    """进程在任务执行中退出后，重启时只执行尚未完成的对象"""
+    path = str(tmp_path / 'jobs.db')
+    store = JobStore(path)
+    done = {'email': 'user00001@example.jp', 'success': True, 'message': "删除成功"}
+    job = Job(
+        service.site_name,
+        'delete',
+        [{'id': str(mailbox_id), 'email': ''} for mailbox_id in (1, 2, 3, 4)],
+        [done, None, None, None],
+        concurrency=2,
+        status='running'
+    )
+    job_id = store.insert(job, owner='exited-worker')
+    store.close()
+
+    # 重启：新的任务管理器打开同一个任务表
+    manager = JobManager({service.site_name: service}, JobStore(path), workers=1, retention_days=0)
+    manager.start()
+    job = wait_finished(manager, job_id)
+
+    assert job.status == 'succeeded'
+    assert job.results[0] == done
+    assert [result['success'] for result in job.results] == [True] * 4
+    assert mock.counters['delete'] == 3
+    # 已完成的对象没有重新执行
+    assert 1 in mock.mailboxes
+    assert not {2, 3, 4} & set(mock.mailboxes)
+
+    persisted = JobStore(path).get(job_id)
+    assert persisted.status == 'succeeded'
+    assert persisted.pending() == []
+
+
+def test_submit_streams_progress_until_finished(service, mock, tmp_path):
+    manager = JobManager({service.site_name: service}, JobStore(str(tmp_path / 'jobs.db')), workers=1)
+    manager.start()
+    job = manager.submit(service.site_name, 'create', [('alice', 'secret123'), ('x' * 20, None), ('bob', None)])
+
+    async def collect():
+        return [(update.status, update.done) async for update in manager.watch(job.id, interval=0.05)]
+
+    updates = asyncio.run(collect())
+    assert updates[-1] == ('failed', 3)
+    job = manager.get(job.id)
+    assert [result['success'] for result in job.results] == [True, False, True]
+    assert mock.counters['create'] == 2
+    # 明文密码只在提交返回的任务对象中，结果里是遮盖后的形式
+    assert len(job.secrets[2]) == 6
+    assert job.results[2]['password'] == REDACTED_PASSWORD
+
+
+def test_passwords_are_not_persisted(service, tmp_path):
+    path = str(tmp_path / 'jobs.db')
+    manager = JobManager({service.site_name: service}, JobStore(path), workers=1)
+    manager.start()
+    job = manager.submit(service.site_name, 'create', [('carol', 'plain-secret-1')])
+    reset = manager.submit(service.site_name, 'reset_password', ['1'])
+    wait_finished(manager, job.id)
+    wait_finished(manager, reset.id)
+
+    with open(path, 'rb') as f:
+        data = f.read()
+    assert b'plain-secret-1' not in data
+    assert reset.secrets[0].encode() not in data
+
+
+def test_resumed_job_without_password_fails(service, mock, tmp_path):
+    """重启后明文密码已不在内存中，尚未执行的创建对象记为失败而不是用遮盖后的密码创建"""
+    path = str(tmp_path / 'jobs.db')
+    store = JobStore(path)
+    job = Job(service.site_name, 'create', [{'username': 'dave', 'password': REDACTED_PASSWORD}], status='running')
+    job_id = store.insert(job, owner='exited-worker')
+    store.close()
+
+    manager = JobManager({service.site_name: service}, JobStore(path), workers=1, retention_days=0)
+    manager.start()
+    job = wait_finished(manager, job_id)
+
+    assert job.status == 'failed'
+    assert not job.results[0]['success']
+    assert 'create' not in mock.counters
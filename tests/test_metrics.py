@@ -0,0 +1,16 @@
+import pytest
+
+from services.metrics import Counter, _Metric
+
+
+def test_label_values_are_escaped():
+    counter = Counter('test_total', 'Test\\counter\nsecond line', labels=('path',))
+    counter.inc(path='a\\b"c\nd')
+    lines = counter.render().splitlines()
+    assert lines[0] == '# HELP test_total Test\\\\counter\\nsecond line'
+    assert lines[2] == 'test_total{path="a\\\\b\\"c\\nd"} 1'
+
+
+def test_metric_base_is_abstract():
+    with pytest.raises(TypeError):
+        _Metric('test', 'Test')
@@ -0,0 +1,63 @@
+import time
+
+import yaml
+
+from services.config_store import ConfigStore
+from services.prefetch import PrefetchScheduler
+from services.site_registry import SiteRegistry
+
+
+def expire(service):
+    """让缓存过期但仍在 stale_ttl 窗口内"""
+    service.cache.ttl = 0.05
+    time.sleep(0.06)
+
+
+def test_expired_cache_refetches_when_scheduler_not_running(service, mock):
+    PrefetchScheduler([service], interval=60)
+    service.list_email_addresses()
+    expire(service)
+
+    service.list_email_addresses()
+    assert mock.counters['list'] == 2
+
+
+def test_running_scheduler_revalidates_in_background(service, mock):
+    scheduler = PrefetchScheduler([service], interval=60)
+    scheduler.start()
+    try:
+        deadline = time.monotonic() + 5
+        while service.cache.peek() is None and time.monotonic() < deadline:
+            time.sleep(0.02)
+        expire(service)
+
+        # 过期数据直接返回，由调度器在后台重新拉取
+        service.list_email_addresses()
+        deadline = time.monotonic() + 5
+        while mock.counters['list'] < 2 and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert mock.counters['list'] == 2
+    finally:
+        scheduler.stop()
+    assert service.cache.revalidator is None
+
+
+def test_store_syncs_without_prefetch(config_store, mock, tmp_path):
+    """关闭预取时本地索引仍按 store.sync_interval 在后台同步，缓存过期后同步拉取"""
+    config = dict(config_store.config)
+    config['prefetch'] = {'enabled': False}
+    config['store'] = {'enabled': True, 'path': str(tmp_path / 'mailboxes.db'), 'sync_interval': 60}
+    (tmp_path / 'config' / 'config.yaml').write_text(yaml.safe_dump(config), encoding='utf-8')
+    registry = SiteRegistry(ConfigStore(str(tmp_path / 'config')))
+    service = registry.get().service
+
+    registry.start_prefetch()
+    try:
+        assert not registry.prefetcher.running
+        assert service.cache.revalidator is None
+        deadline = time.monotonic() + 5
+        while service.store.last_synced_at() is None and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert len(service.store.load()) == len(mock.mailboxes)
+    finally:
+        registry.store_sync.stop()
@@ -0,0 +1,142 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+import requests
+from urllib3.exceptions import MaxRetryError, NewConnectionError, ProtocolError
+
+from services.async_email_service import AsyncEmailService
+from services.resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    RequestExecutor,
+    RetryableError,
+    RetryPolicy,
+)
+
+
+def test_breaker_opens_after_threshold_and_half_opens():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=0.1)
+    for _ in range(3):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+    time.sleep(0.12)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # 半开状态只放行一个探测请求
+    assert breaker.allow()
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+
+
+def test_failed_probe_reopens_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.1)
+    breaker.record_failure()
+    time.sleep(0.12)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+
+def test_executor_retries_then_succeeds():
+    executor = RequestExecutor(RetryPolicy(max_retries=3, base_delay=0.001, max_delay=0.01))
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise RetryableError("503")
+        return 'ok'
+
+    assert executor.execute('GET email', flaky) == 'ok'
+    assert len(calls) == 3
+    assert executor.breaker('GET email').state == CircuitBreaker.CLOSED
+
+
+def test_rate_limits_do_not_trip_breaker():
+    executor = RequestExecutor(RetryPolicy(max_retries=0), failure_threshold=1)
+
+    def limited():
+        raise RetryableError("429", trip_breaker=False)
+
+    for _ in range(3):
+        with pytest.raises(RetryableError):
+            executor.execute('GET email', limited)
+    assert executor.breaker('GET email').state == CircuitBreaker.CLOSED
+
+
+def test_breaker_rejects_calls_against_failing_upstream(service, mock):
+    """上游持续 5xx 时熔断，之后的请求不再发送；恢复后半开探测成功即关闭"""
+    service.executor = RequestExecutor(
+        RetryPolicy(max_retries=0),
+        failure_threshold=3,
+        reset_timeout=0.2
+    )
+    mock.error_rate = 1.0
+    for _ in range(3):
+        with pytest.raises(RetryableError):
+            service._call_api('GET', '/email')
+    with pytest.raises(CircuitOpenError):
+        service._call_api('GET', '/email')
+    assert mock.counters['errors'] == 3
+
+    mock.error_rate = 0.0
+    time.sleep(0.25)
+    assert service._call_api('GET', '/email')['status'] == 200
+    assert service.executor.breaker('GET email').state == CircuitBreaker.CLOSED
+
+
+def test_post_retries_only_connect_failures(service, monkeypatch):
+    """POST 只在连接阶段失败时重试；读取阶段断开时请求可能已执行，不再重发"""
+    calls = []
+
+    def failing(error):
+        def request(*args, **kwargs):
+            calls.append(error)
+            raise error
+        return request
+
+    reset = requests.ConnectionError(ProtocolError('Connection aborted.', ConnectionResetError()))
+    monkeypatch.setattr(service, '_request', failing(reset))
+    with pytest.raises(requests.ConnectionError):
+        service._call_api('POST', '/email', json={})
+    assert len(calls) == 1
+
+    calls.clear()
+    refused = requests.ConnectionError(MaxRetryError(None, '/email', NewConnectionError(None, 'refused')))
+    monkeypatch.setattr(service, '_request', failing(refused))
+    with pytest.raises(RetryableError):
+        service._call_api('POST', '/email', json={})
+    assert len(calls) == 3
+
+
+def test_async_post_retries_only_connect_failures(service, monkeypatch):
+    async_service = AsyncEmailService(service)
+    calls = []
+
+    def failing(error):
+        async def request(*args, **kwargs):
+            calls.append(error)
+            raise error
+        return request
+
+    async def call():
+        return await async_service._call_api('POST', '/email', json={})
+
+    monkeypatch.setattr(async_service, '_request', failing(httpx.ReadError('reset')))
+    with pytest.raises(httpx.ReadError):
+        asyncio.run(call())
+    assert len(calls) == 1
+
+    calls.clear()
+    monkeypatch.setattr(async_service, '_request', failing(httpx.ConnectError('refused')))
+    with pytest.raises(RetryableError):
+        asyncio.run(call())
+    assert len(calls) == 3
@@ -0,0 +1,70 @@
+import pytest
+
+from services.search_index import MailboxSearchIndex
+
+NAMES = ['yamada', 'yamada.taro', 'yamamoto', 'suzuki', 'tanaka', 'sato', 'info', 'shop']
+
+
+@pytest.fixture
+def index():
+    index = MailboxSearchIndex()
+    index.on_snapshot([
+        {'id': i, 'name': name, 'domain_name': 'example.jp', 'suspended': int(name == 'shop')}
+        for i, name in enumerate(NAMES)
+    ])
+    return index
+
+
+def names(records):
+    return [record['name'] for record in records]
+
+
+def test_prefix_ranks_exact_match_first(index):
+    assert names(index.search('yamada'))[:2] == ['yamada', 'yamada.taro']
+    assert names(index.search('yama', limit=2)) == ['yamada', 'yamada.taro']
+
+
+def test_substring_and_domain(index):
+    assert names(index.search('taro')) == ['yamada.taro']
+    assert len(index.search('@example')) == len(NAMES)
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('yamda', 'yamada'),
+    ('suzki', 'suzuki'),
+    ('tanaak', 'tanaka'),
+    ('ymada', 'yamada'),
+])
+def test_single_typo_finds_username(index, query, expected):
+    assert names(index.search(query))[0] == expected
+
+
+def test_unrelated_query_finds_nothing(index):
+    assert index.search('zzzzz') == []
+
+
+def test_status_filter(index):
+    assert names(index.search('停用')) == ['shop']
+    assert 'shop' not in names(index.search('正常 s'))
+
+
+def test_incremental_updates(index):
+    index.on_upsert({'id': 100, 'name': 'kobayashi', 'domain_name': 'example.jp', 'suspended': 0})
+    index.on_remove(3)
+    assert names(index.search('koba')) == ['kobayashi']
+    assert index.search('suzuki') == []
+
+
+def test_domain_postings_follow_updates(index):
+    index.on_upsert({'id': 200, 'name': 'admin', 'domain_name': 'shop.example.com', 'suspended': 1})
+    index.on_upsert({'id': 201, 'name': 'sales', 'domain_name': 'shop.example.com', 'suspended': 0})
+    assert names(index.search('@shop.')) == ['admin', 'sales']
+    assert names(index.search('停用 @shop')) == ['admin']
+    assert names(index.search('停用')) == ['admin', 'shop']
+    # 域名子串：关键字是域名的一部分
+    assert set(names(index.search('example.com'))) == {'admin', 'sales'}
+
+    index.on_remove(200)
+    index.on_remove(201)
+    assert index.search('@shop.') == []
+    assert index.search('example.com') == []
@@ -0,0 +1,62 @@
+import types
+
+import pytest
+
+from services.cache import MailboxCache
+from services.shared_state import LocalSharedState, SharedSite, SharedState, SQLiteSharedState
+
+
+def make_site(state: SharedState):
+    cache = MailboxCache(ttl=60)
+    service = types.SimpleNamespace(site_name='test', cache=cache, _token_refreshed_at=0.0)
+    return SharedSite(service, state), cache
+
+
+@pytest.fixture(params=['local', 'sqlite'])
+def states(request, tmp_path):
+    """两个工作进程各自打开的共享状态"""
+    if request.param == 'local':
+        state = LocalSharedState()
+        return state, state
+    path = str(tmp_path / 'shared.db')
+    return SQLiteSharedState(path), SQLiteSharedState(path)
+
+
+def test_changes_replay_to_other_workers_only(states):
+    site_a, cache_a = make_site(states[0])
+    site_b, cache_b = make_site(states[1])
+    for cache in (cache_a, cache_b):
+        cache.put([{'id': 1}])
+    site_a.sync()
+    site_b.sync()
+    version_a, version_b = cache_a.version, cache_b.version
+
+    cache_a.upsert({'id': 2})
+    cache_a.remove(1)
+    site_a.sync()
+    site_b.sync()
+
+    assert [record['id'] for record in cache_b.peek()] == [2]
+    assert cache_b.version == version_b + 2
+    # 本进程的变更不会再被同步线程重复应用
+    assert cache_a.version == version_a + 2
+    assert not site_a._own_seqs
+
+
+def test_backend_missing_methods_fails_on_construction():
+    class Incomplete(SharedState):
+        def info(self, key):
+            return None
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_lease_excludes_other_owner(tmp_path):
+    path = str(tmp_path / 'shared.db')
+    first, second = SQLiteSharedState(path), SQLiteSharedState(path)
+    with first.lease('fill:test', ttl=30) as acquired:
+        assert acquired
+        assert second.held('fill:test')
+        assert not second.acquire('fill:test', ttl=30)
+    assert second.acquire('fill:test', ttl=30)